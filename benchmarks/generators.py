@@ -0,0 +1,143 @@
+"""Deterministic synthetic price data for the benchmarks
+
+All generators return `SeriesStoreData`, i.e. a dict mapping (num0, num1) edges to lists of (time, price)
+observations, and only depend on their arguments (including the seed).
+"""
+
+import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rhizopus.broker_simulator import SeriesStoreData
+
+START_TIME = datetime.datetime(2000, 1, 3)
+TICK = datetime.timedelta(days=1)
+YEAR = datetime.timedelta(days=365.25)
+
+
+def get_numeraires(num_numeraires: int, prefix: str = 'N') -> List[str]:
+    return [f'{prefix}{i:03d}' for i in range(num_numeraires)]
+
+
+def get_times(num_ticks: int, start_time: datetime.datetime = START_TIME, tick=TICK):
+    return [start_time + i * tick for i in range(num_ticks)]
+
+
+def gbm_paths(
+    num_paths: int,
+    num_ticks: int,
+    seed: int,
+    volatility: float = 0.1,
+    tick: datetime.timedelta = TICK,
+) -> np.ndarray:
+    """Driftless geometric Brownian motions starting at random levels, shape (num_ticks, num_paths)"""
+    rng = np.random.default_rng(seed)
+    dt = tick / YEAR
+    start = np.exp(rng.uniform(-3.0, 3.0, num_paths))
+    log_returns = rng.normal(
+        -0.5 * volatility**2 * dt, volatility * np.sqrt(dt), (num_ticks, num_paths)
+    )
+    log_returns[0] = 0.0
+    return start * np.exp(np.cumsum(log_returns, axis=0))
+
+
+def gbm_fx_data(
+    num_numeraires: int,
+    num_ticks: int,
+    seed: int = 0,
+    base: str = 'EUR',
+    spread: float = 0.0005,
+    num_cross_edges: int = 0,
+) -> SeriesStoreData:
+    """Star-shaped FX market: every numeraire is quoted against `base` in both directions
+
+    Prices of (num0, num1) are the number of num1 units paid for one num0 unit, bid/ask spreads are
+    applied on both sides. `num_cross_edges` random non-base pairs are quoted in addition, consistently with
+    the base rates.
+    """
+    numeraires = get_numeraires(num_numeraires)
+    times = get_times(num_ticks)
+    # rates[t, i]: units of numeraire i per base unit
+    rates = gbm_paths(num_numeraires, num_ticks, seed)
+    bid = 1.0 - spread
+    data = {}
+    for i, num in enumerate(numeraires):
+        data[(base, num)] = list(zip(times, (rates[:, i] * bid).tolist()))
+        data[(num, base)] = list(zip(times, (bid / rates[:, i]).tolist()))
+    rng = np.random.default_rng(seed + 1)
+    pairs = set()
+    while len(pairs) < min(num_cross_edges, num_numeraires * (num_numeraires - 1) // 2):
+        i, j = sorted(rng.choice(num_numeraires, 2, replace=False).tolist())
+        pairs.add((i, j))
+    for i, j in sorted(pairs):
+        cross = rates[:, j] / rates[:, i]
+        data[(numeraires[i], numeraires[j])] = list(zip(times, (cross * bid).tolist()))
+        data[(numeraires[j], numeraires[i])] = list(zip(times, (bid / cross).tolist()))
+    return data
+
+
+def chain_fx_data(
+    num_chains: int,
+    depth: int,
+    num_ticks: int,
+    seed: int = 0,
+    base: str = 'EUR',
+    spread: float = 0.0005,
+) -> SeriesStoreData:
+    """FX market made of chains base - C0 - C1 - ... of `depth` numeraires
+
+    Only neighbours in a chain are quoted, so valuing the last numeraire of a chain in `base` requires a
+    conversion path with `depth` edges.
+    """
+    rates = gbm_paths(num_chains * depth, num_ticks, seed)
+    times = get_times(num_ticks)
+    bid = 1.0 - spread
+    data = {}
+    for c in range(num_chains):
+        prev = base
+        for d in range(depth):
+            num = f'C{c:03d}_{d}'
+            x = rates[:, c * depth + d]
+            data[(prev, num)] = list(zip(times, (x * bid).tolist()))
+            data[(num, prev)] = list(zip(times, (bid / x).tolist()))
+            prev = num
+    return data
+
+
+def sparse_calendar(
+    data: SeriesStoreData,
+    missing_fraction: float = 0.05,
+    seed: int = 0,
+    skip_weekends: bool = True,
+) -> SeriesStoreData:
+    """Drop weekend observations and a random fraction of the remaining observations of every edge"""
+    rng = np.random.default_rng(seed)
+    sparse = {}
+    for edge in sorted(data):
+        series = data[edge]
+        keep = rng.random(len(series)) >= missing_fraction
+        sparse[edge] = [
+            obs
+            for obs, k in zip(series, keep.tolist())
+            if k and not (skip_weekends and obs[0].weekday() >= 5)
+        ]
+    return sparse
+
+
+def drop_edges(
+    data: SeriesStoreData,
+    fraction: float,
+    seed: int = 0,
+    keep: Optional[Sequence[Tuple[str, str]]] = None,
+) -> SeriesStoreData:
+    """Remove a random fraction of the edges, except the ones listed in `keep`"""
+    rng = np.random.default_rng(seed)
+    keep = set(keep or [])
+    edges = sorted(data)
+    dropped = rng.random(len(edges)) < fraction
+    return {edge: data[edge] for edge, d in zip(edges, dropped.tolist()) if not d or edge in keep}
+
+
+def num_observations(data: SeriesStoreData) -> Dict[str, int]:
+    return {'edges': len(data), 'observations': sum(len(series) for series in data.values())}
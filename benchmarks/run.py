@@ -0,0 +1,203 @@
+"""Run the benchmark scenarios and compare the results with a baseline
+
+    python -m benchmarks.run                                  # quick size, print the results
+    python -m benchmarks.run --compare-ref main               # compare with a fresh run of main
+    python -m benchmarks.run --save benchmarks/baseline.json  # record a local baseline
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+Every scenario runs in a fresh interpreter, so the peak resident set size is the one of that scenario
+alone. Throughput is the best of `--repeat` runs, the per-phase times come from the PhaseProfiler of the
+best run. With --compare or --compare-ref the exit code is 1 if a scenario is slower or uses more memory
+than the baseline allows.
+
+Absolute throughput depends on the host, so baselines are not committed. --compare-ref runs the
+benchmarks of a git revision in a temporary worktree on the same host, right before the current tree.
+Only the scenarios present in both are compared.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.scenarios import SCENARIOS, SIZES
+from rhizopus.profiling import PhaseProfiler
+
+# allowed relative deterioration of the throughput and of the peak memory
+DEFAULT_TOLERANCE = 0.25
+
+BenchmarkResult = Dict[str, Any]
+
+
+def get_peak_rss_mb() -> float:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak_rss / 2**20 if sys.platform == 'darwin' else peak_rss / 2**10
+
+
+def measure(name: str, size: str, repeat: int) -> BenchmarkResult:
+    """Run a scenario `repeat` times in the current process"""
+    scenario = SCENARIOS[name](**SIZES[size][name])
+    scenario.generate()
+    best: Optional[BenchmarkResult] = None
+    for _ in range(repeat):
+        gc.collect()
+        profiler = PhaseProfiler()
+        start = time.perf_counter()
+        scenario.build(profiler)
+        build_s = time.perf_counter() - start
+        num_ticks = scenario.run()
+        run_s = time.perf_counter() - start - build_s
+        if best is None or run_s < best['run_s']:
+            best = {
+                'ticks': num_ticks,
+                'build_s': build_s,
+                'run_s': run_s,
+                'ticks_per_s': num_ticks / run_s,
+                'phases_s': {p: s['total_s'] for p, s in profiler.summary().items()},
+            }
+    best.update(scenario.get_info())
+    best['peak_rss_mb'] = get_peak_rss_mb()
+    return best
+
+
+def measure_in_subprocess(name: str, size: str, repeat: int) -> BenchmarkResult:
+    cmd = [sys.executable, '-m', 'benchmarks.run', '--worker', name, '--size', size]
+    cmd += ['--repeat', str(repeat)]
+    output = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output)
+
+
+def measure_ref(ref: str, size: str, repeat: int) -> Dict[str, BenchmarkResult]:
+    """Run all benchmarks of the git revision `ref` in a temporary worktree"""
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory(prefix='rhizopus_bench_') as tmp_dir:
+        worktree = os.path.join(tmp_dir, 'worktree')
+        git = ['git', '-C', repo_dir, 'worktree']
+        subprocess.run(
+            git + ['add', '--detach', worktree, ref], check=True, stdout=subprocess.DEVNULL
+        )
+        try:
+            results_path = os.path.join(tmp_dir, 'results.json')
+            cmd = [sys.executable, '-m', 'benchmarks.run', '--size', size, '--repeat', str(repeat)]
+            cmd += ['--save', results_path]
+            env = dict(os.environ, PYTHONPATH=worktree)
+            subprocess.run(cmd, cwd=worktree, env=env, check=True, stdout=subprocess.DEVNULL)
+            with open(results_path) as f:
+                return json.load(f)['scenarios']
+        finally:
+            subprocess.run(git + ['remove', '--force', worktree], check=True)
+
+
+def get_environment() -> Dict[str, str]:
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'system': platform.system(),
+    }
+
+
+def compare(
+    results: Dict[str, BenchmarkResult], baseline: Dict[str, BenchmarkResult], tolerance: float
+) -> List[str]:
+    """Return a description of every regression with respect to the baseline"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if result['ticks_per_s'] < base['ticks_per_s'] * (1.0 - tolerance):
+            regressions.append(
+                f'{name}: {result["ticks_per_s"]:.1f} ticks/s, baseline {base["ticks_per_s"]:.1f}'
+            )
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1.0 + tolerance):
+            regressions.append(
+                f'{name}: peak RSS {result["peak_rss_mb"]:.1f} MB, baseline {base["peak_rss_mb"]:.1f}'
+            )
+    return regressions
+
+
+def format_results(
+    results: Dict[str, BenchmarkResult], baseline: Optional[Dict[str, BenchmarkResult]] = None
+) -> str:
+    lines = [f'{"scenario":<20}{"ticks":>8}{"ticks/s":>12}{"change":>10}{"rss MB":>10}  top phases']
+    for name, result in results.items():
+        change = ''
+        if baseline is not None and name in baseline:
+            change = f'{result["ticks_per_s"] / baseline[name]["ticks_per_s"] - 1.0:+.1%}'
+        phases = sorted(result['phases_s'].items(), key=lambda p: -p[1])[:3]
+        top = ', '.join(f'{p} {s / result["ticks"] * 1e6:.0f}us' for p, s in phases)
+        lines.append(
+            f'{name:<20}{result["ticks"]:>8d}{result["ticks_per_s"]:>12.1f}{change:>10}'
+            f'{result["peak_rss_mb"]:>10.1f}  {top}'
+        )
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the rhizopus simulator core')
+    parser.add_argument('scenarios', nargs='*', help=f'default: all of {", ".join(SCENARIOS)}')
+    parser.add_argument('--size', choices=list(SIZES), default='quick')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', metavar='PATH', help='save the results as a new baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare the results with a baseline')
+    parser.add_argument(
+        '--compare-ref',
+        metavar='REF',
+        help='compare the results with a fresh run of a git revision',
+    )
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--worker', choices=list(SCENARIOS), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+    logging.basicConfig(level=logging.ERROR)
+    if args.worker is not None:
+        print(json.dumps(measure(args.worker, args.size, args.repeat)))
+        return 0
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            data = json.load(f)
+        if data['size'] != args.size:
+            raise ValueError(f'Baseline size "{data["size"]}" differs from "{args.size}"')
+        baseline = data['scenarios']
+    if args.compare_ref is not None:
+        if baseline is not None:
+            parser.error('--compare and --compare-ref are mutually exclusive')
+        baseline = measure_ref(args.compare_ref, args.size, args.repeat)
+
+    results = {}
+    for name in args.scenarios or list(SCENARIOS):
+        results[name] = measure_in_subprocess(name, args.size, args.repeat)
+    print(format_results(results, baseline))
+
+    if args.save is not None:
+        data = {'size': args.size, 'environment': get_environment(), 'scenarios': results}
+        with open(args.save, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
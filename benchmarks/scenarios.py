@@ -0,0 +1,286 @@
+"""Backtest scenarios exercising different parts of the simulator core
+
+A scenario generates its price data once in `generate()`, builds a fresh broker in `build()`, and runs the
+backtest in `run()`, which returns the number of ticks. Only `build()` and `run()` are timed.
+"""
+
+from typing import Dict, List, Optional, Type
+
+from benchmarks import generators
+from rhizopus.broker import Broker, ValidationLevel
+from rhizopus.broker_observer import BrokerObserver
+from rhizopus.broker_simulator import (
+    BrokerSimulator,
+    SeriesStoreColumnar,
+    SeriesStoreData,
+    SeriesStoreFromDict,
+    TransactionCostFilter,
+)
+from rhizopus.orders import CreateAccountOrder, InterestOrder, Order
+from rhizopus.profiling import PhaseProfiler
+from rhizopus.strategy import Strategy
+from rhizopus.vectorized import run_target_weights
+
+BASE = 'EUR'
+INITIAL_CASH = 1.0e6
+
+
+class ConstantMixStrategy(Strategy):
+    """Equally weighted portfolio of all non-base numeraires, counting its ticks"""
+
+    def __init__(self, broker: Broker, observer: BrokerObserver, **kwargs):
+        super().__init__(broker, observer, **kwargs)
+        weight = 0.9 / len(self.asset_numeraires)
+        self.target_allocation = {num: weight for num in self.asset_numeraires}
+        self.num_ticks = 0
+
+    def get_target_allocation(self) -> Dict[str, float]:
+        return self.target_allocation
+
+    def end_of_day(self):
+        self.num_ticks += 1
+
+
+class Scenario:
+    """Base class of the benchmark scenarios: a broker with an observer stepping through all ticks"""
+
+    name = ''
+
+    def __init__(self, num_ticks: int, seed: int = 0):
+        self.num_ticks = num_ticks
+        self.seed = seed
+        self.data: SeriesStoreData = {}
+        self.broker: Optional[Broker] = None
+        self.observer: Optional[BrokerObserver] = None
+
+    def generate(self) -> None:
+        raise NotImplementedError
+
+    def get_numeraires(self) -> List[str]:
+        return sorted({num for edge in self.data for num in edge} - {BASE})
+
+    def get_initial_orders(self) -> List[Order]:
+        orders: List[Order] = [CreateAccountOrder(num, (0.0, num)) for num in self.get_numeraires()]
+        orders.append(CreateAccountOrder(BASE, (INITIAL_CASH, BASE)))
+        return orders
+
+    def build(self, profiler: Optional[PhaseProfiler] = None) -> None:
+        store = SeriesStoreFromDict(self.data)
+        filters = [TransactionCostFilter(BASE, 1.0, 'transaction_costs', [])]
+        simulator = BrokerSimulator(store, filters, BASE, silent=True, profiler=profiler)
+        # measure the simulator, not the self-check of the broker state
+        self.broker = Broker(
+            simulator,
+            self.get_initial_orders(),
+            silent=True,
+            validation_level=ValidationLevel.INVARIANTS,
+            profiler=profiler,
+        )
+        self.observer = BrokerObserver(self.broker, profiler=profiler)
+
+    def run(self) -> int:
+        num_ticks = 0
+        while True:
+            self.observer.update()
+            num_ticks += 1
+            if self.broker.next() is None:
+                return num_ticks
+
+    def get_info(self) -> Dict[str, int]:
+        return generators.num_observations(self.data)
+
+
+class ConstantMix(Scenario):
+    """Constant-mix strategy rebalancing on every tick in a star-shaped FX market with transaction costs"""
+
+    name = 'constant_mix'
+
+    def __init__(self, num_ticks: int, num_numeraires: int, seed: int = 0):
+        super().__init__(num_ticks, seed)
+        self.num_numeraires = num_numeraires
+        self.strategy: Optional[ConstantMixStrategy] = None
+
+    def generate(self) -> None:
+        self.data = generators.gbm_fx_data(self.num_numeraires, self.num_ticks, self.seed)
+
+    def build(self, profiler: Optional[PhaseProfiler] = None) -> None:
+        super().build(profiler)
+        # the tiny threshold triggers a reallocation on every tick
+        self.strategy = ConstantMixStrategy(
+            self.broker, self.observer, max_rel_alloc_deviation=1e-9, profiler=profiler
+        )
+
+    def run(self) -> int:
+        self.strategy.run(self.broker.get_time(), self.num_ticks)
+        return self.strategy.num_ticks
+
+
+class VectorizedConstantMix(ConstantMix):
+    """The constant-mix backtest of `constant_mix` run by the vectorized engine, see rhizopus.vectorized"""
+
+    name = 'vectorized_mix'
+
+    def __init__(self, num_ticks: int, num_numeraires: int, seed: int = 0):
+        super().__init__(num_ticks, num_numeraires, seed)
+        self.store: Optional[SeriesStoreColumnar] = None
+
+    def build(self, profiler: Optional[PhaseProfiler] = None) -> None:
+        self.store = SeriesStoreColumnar.from_dict(self.data)
+
+    def run(self) -> int:
+        assets = self.get_numeraires()
+        result = run_target_weights(
+            self.store,
+            BASE,
+            assets,
+            [0.9 / len(assets)] * len(assets),
+            INITIAL_CASH,
+            max_rel_alloc_deviation=1e-9,
+            transaction_cost_filter=TransactionCostFilter(BASE, 1.0, 'transaction_costs', []),
+        )
+        return len(result.nav)
+
+
+class InterestQueue(Scenario):
+    """Many deposit accounts with tiered interest rates, i.e. a large queue of permanently active orders"""
+
+    name = 'interest_queue'
+
+    def __init__(self, num_ticks: int, num_accounts: int, num_tiers: int, seed: int = 0):
+        super().__init__(num_ticks, seed)
+        self.num_accounts = num_accounts
+        self.num_tiers = num_tiers
+
+    def generate(self) -> None:
+        self.data = generators.gbm_fx_data(4, self.num_ticks, self.seed)
+
+    def get_initial_orders(self) -> List[Order]:
+        orders = super().get_initial_orders()
+        deposit = 1000.0
+        tier_size = self.num_accounts * deposit / self.num_tiers
+        for i in range(self.num_accounts):
+            account = f'deposit{i:04d}'
+            orders.append(CreateAccountOrder(account, ((i + 1) * deposit, BASE)))
+            for tier in range(self.num_tiers):
+                rate = 0.001 * (tier + 1)
+                orders.append(
+                    InterestOrder(account, rate, tier * tier_size, (tier + 1) * tier_size)
+                )
+        return orders
+
+
+class DeepCrossRates(Scenario):
+    """Positions valued through long conversion paths in a market with a sparse calendar and missing edges"""
+
+    name = 'deep_cross_rates'
+
+    def __init__(
+        self,
+        num_ticks: int,
+        num_chains: int,
+        depth: int,
+        missing_fraction: float = 0.05,
+        missing_edges: float = 0.3,
+        seed: int = 0,
+    ):
+        super().__init__(num_ticks, seed)
+        self.num_chains = num_chains
+        self.depth = depth
+        self.missing_fraction = missing_fraction
+        self.missing_edges = missing_edges
+
+    def generate(self) -> None:
+        data = generators.chain_fx_data(self.num_chains, self.depth, self.num_ticks, self.seed)
+        # keep the edges pointing towards the base numeraire, so all positions can be valued
+        towards_base = [edge for edge in data if edge[1] == BASE or edge[0] > edge[1]]
+        data = generators.drop_edges(data, self.missing_edges, self.seed, keep=towards_base)
+        self.data = generators.sparse_calendar(data, self.missing_fraction, self.seed)
+
+    def get_initial_orders(self) -> List[Order]:
+        orders: List[Order] = [
+            CreateAccountOrder(num, (100.0, num)) for num in self.get_numeraires()
+        ]
+        orders.append(CreateAccountOrder(BASE, (INITIAL_CASH, BASE)))
+        return orders
+
+
+class LargeObserver(Scenario):
+    """Observer recording prices, account values and weights, and custom evaluators of many accounts"""
+
+    name = 'large_observer'
+
+    def __init__(
+        self,
+        num_ticks: int,
+        num_numeraires: int,
+        num_cross_edges: int,
+        num_evaluators: int,
+        seed: int = 0,
+    ):
+        super().__init__(num_ticks, seed)
+        self.num_numeraires = num_numeraires
+        self.num_cross_edges = num_cross_edges
+        self.num_evaluators = num_evaluators
+
+    def generate(self) -> None:
+        self.data = generators.gbm_fx_data(
+            self.num_numeraires, self.num_ticks, self.seed, num_cross_edges=self.num_cross_edges
+        )
+
+    def get_initial_orders(self) -> List[Order]:
+        orders: List[Order] = [
+            CreateAccountOrder(num, (10.0, num)) for num in self.get_numeraires()
+        ]
+        orders.append(CreateAccountOrder(BASE, (INITIAL_CASH, BASE)))
+        return orders
+
+    def build(self, profiler: Optional[PhaseProfiler] = None) -> None:
+        super().build(profiler)
+        numeraires = self.get_numeraires()
+        for i in range(self.num_evaluators):
+            account, num = numeraires[i % len(numeraires)], numeraires[(i + 1) % len(numeraires)]
+            self.observer.add_evaluator(
+                ('value', account, num, str(i)),
+                lambda broker, account=account, num=num: broker.get_value_account(account, num),
+            )
+
+    def run(self) -> int:
+        num_ticks = super().run()
+        recorder = self.observer.recorder
+        for key in recorder.keys():
+            recorder.get_t_x(key)
+        return num_ticks
+
+
+SCENARIOS: Dict[str, Type[Scenario]] = {
+    s.name: s
+    for s in [ConstantMix, VectorizedConstantMix, InterestQueue, DeepCrossRates, LargeObserver]
+}
+
+# scenario parameters for each benchmark size
+SIZES = {
+    'quick': {
+        'constant_mix': {'num_ticks': 250, 'num_numeraires': 10},
+        'vectorized_mix': {'num_ticks': 250, 'num_numeraires': 10},
+        'interest_queue': {'num_ticks': 250, 'num_accounts': 100, 'num_tiers': 4},
+        'deep_cross_rates': {'num_ticks': 250, 'num_chains': 16, 'depth': 3},
+        'large_observer': {
+            'num_ticks': 250,
+            'num_numeraires': 50,
+            'num_cross_edges': 50,
+            'num_evaluators': 50,
+        },
+    },
+    'full': {
+        'constant_mix': {'num_ticks': 2500, 'num_numeraires': 30},
+        'vectorized_mix': {'num_ticks': 2500, 'num_numeraires': 30},
+        'interest_queue': {'num_ticks': 2500, 'num_accounts': 500, 'num_tiers': 4},
+        'deep_cross_rates': {'num_ticks': 2500, 'num_chains': 40, 'depth': 3},
+        'large_observer': {
+            'num_ticks': 2500,
+            'num_numeraires': 200,
+            'num_cross_edges': 200,
+            'num_evaluators': 200,
+        },
+    },
+}
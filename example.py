@@ -169,13 +169,7 @@ def main():
 
 def get_observer_df(observer: BrokerObserver, keys: Optional[Sequence[str]] = None) -> pd.DataFrame:
     """Extracts observer data into a pandas DataFrame"""
-    ss = []
-    for key in keys or observer.keys():
-        data = observer.get_history(key)
-        key_name = key if isinstance(key, str) else '_'.join(key)
-        s = pd.DataFrame.from_records(data=data, columns=['DateTime', key_name], index='DateTime')
-        ss.append(s)
-    return pd.concat(ss, axis=1, join='outer')
+    return observer.to_frame(keys)
 
 
 def plot_normalized_asset_performance(
@@ -0,0 +1,254 @@
+import asyncio
+from abc import ABC
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
+
+from rhizopus.broker import BrokerBase, BrokerState, ValidationLevel
+from rhizopus.broker_simulator import BrokerSimulator
+from rhizopus.orders import Order
+from rhizopus.primitives import Time
+from rhizopus.profiling import PhaseProfiler
+
+# a price update pushed by a venue: time and the new prices of some edges
+PriceUpdate = Tuple[Time, Dict[Tuple[str, str], float]]
+
+
+class AsyncBrokerConn(ABC):
+    """Asynchronous counterpart of AbstractBrokerConn for venues reached over the network"""
+
+    async def next(self, broker_state: BrokerState) -> Optional[Time]:
+        """Advance the time by one tick. Updates prices, executes orders, etc"""
+
+    async def fill_orders(self, orders: Sequence[Order], broker_state: BrokerState) -> None:
+        """Send a batch of orders and wait for the acknowledgement"""
+
+    def stream_prices(self) -> Optional[AsyncIterator[PriceUpdate]]:
+        """Return an iterator over the price updates pushed by the venue, or None if not supported"""
+        return None
+
+    def get_default_numeraire(self) -> Optional[str]:
+        """Returns the default numeraire"""
+
+
+class AsyncBroker(BrokerBase):
+    """Broker talking to an AsyncBrokerConn
+
+    The valuation and query methods are shared with Broker through BrokerBase, next() and the fill methods are
+    coroutines. An AsyncBroker is not a Broker, so it can not be passed to code calling the synchronous
+    methods, e.g. Strategy. The initial orders are executed by the first call of next(), which has to be
+    awaited before trading.
+
+    Orders sent with submit_orders() are acknowledged in the background while the strategy keeps running,
+    e.g. consuming price updates from subscribe_prices(). next() waits for all outstanding acknowledgements
+    before advancing the time, so an order submitted at tick t is always known to the venue at t+1.
+    """
+
+    def __init__(
+        self,
+        broker_conn: AsyncBrokerConn,
+        initial_orders: List[Order],
+        broker_state: Optional[BrokerState] = None,
+        silent: bool = False,
+        validation_level: Optional[ValidationLevel] = None,
+        validation_interval: int = 10,
+        validation_seed: Optional[int] = None,
+        profiler: Optional[PhaseProfiler] = None,
+    ):
+        super().__init__(
+            broker_conn,
+            initial_orders,
+            broker_state,
+            silent,
+            validation_level,
+            validation_interval,
+            validation_seed,
+            profiler,
+        )
+        self.live_time: Optional[Time] = None
+        self.live_prices: Dict[Tuple[str, str], float] = {}
+        self._pending_fills: Set[asyncio.Future] = set()
+        self._subscribers: List[asyncio.Queue] = []
+        self._price_task: Optional[asyncio.Future] = None
+
+    async def next(self) -> Optional[Time]:
+        await self.wait_for_fills()
+        profiler = self.profiler
+        if profiler is None:
+            return self._after_next(await self._broker_conn.next(self._broker_state))
+        start_ns = profiler.now()
+        result = await self._broker_conn.next(self._broker_state)
+        profiler.lap('broker.next', start_ns)
+        return self._after_next(result)
+
+    async def fill_order(self, order: Order) -> None:
+        profiler = self.profiler
+        start_ns = profiler.now() if profiler is not None else 0
+        await self.submit_orders([order])
+        if profiler is not None:
+            profiler.lap('broker.fill_order', start_ns)
+
+    async def fill_orders(self, orders: Sequence[Order]) -> None:
+        """Send a batch of orders and wait for the acknowledgement"""
+        profiler = self.profiler
+        start_ns = profiler.now() if profiler is not None else 0
+        await self.submit_orders(orders)
+        if profiler is not None:
+            profiler.lap('broker.fill_orders', start_ns)
+
+    def submit_orders(self, orders: Sequence[Order]) -> asyncio.Future:
+        """Send a batch of orders without waiting for the acknowledgement"""
+        self._activate_orders(orders)
+        fill = asyncio.ensure_future(self._broker_conn.fill_orders(orders, self._broker_state))
+        self._pending_fills.add(fill)
+        fill.add_done_callback(self._on_fill_done)
+        return fill
+
+    def _on_fill_done(self, fill: asyncio.Future) -> None:
+        self._pending_fills.discard(fill)
+        self.invalidate_valuations()
+
+    async def wait_for_fills(self) -> None:
+        """Wait until all submitted orders are acknowledged"""
+        if self._pending_fills:
+            await asyncio.gather(*self._pending_fills)
+
+    def start_price_stream(self) -> None:
+        """Consume the price updates of the broker connection in a background task"""
+        if self._price_task is not None:
+            raise ValueError('Price stream already started')
+        stream = self._broker_conn.stream_prices()
+        if stream is None:
+            raise ValueError('Broker connection does not stream prices')
+        self._price_task = asyncio.ensure_future(self._consume_prices(stream))
+
+    async def _consume_prices(self, stream: AsyncIterator[PriceUpdate]) -> None:
+        try:
+            async for now, prices in stream:
+                self.live_time = now
+                self.live_prices.update(prices)
+                for queue in self._subscribers:
+                    queue.put_nowait((now, prices))
+        finally:
+            for queue in self._subscribers:
+                queue.put_nowait(None)
+
+    def subscribe_prices(self) -> AsyncIterator[PriceUpdate]:
+        """Return an iterator over all price updates received from now on
+
+        The iteration stops when the price stream of the broker connection ends or the broker is closed.
+        """
+        queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        return self._iter_subscription(queue)
+
+    async def _iter_subscription(self, queue: asyncio.Queue) -> AsyncIterator[PriceUpdate]:
+        try:
+            while True:
+                update = await queue.get()
+                if update is None:
+                    return
+                yield update
+        finally:
+            self._subscribers.remove(queue)
+
+    async def close(self) -> None:
+        """Wait for outstanding acknowledgements and stop the price stream"""
+        await self.wait_for_fills()
+        if self._price_task is not None:
+            self._price_task.cancel()
+            try:
+                await self._price_task
+            except asyncio.CancelledError:
+                pass
+            self._price_task = None
+
+
+class LocalExchange:
+    """In-process fake trading venue executing orders with a BrokerSimulator
+
+    Requests are served one at a time after `latency` seconds, like a venue with a single order gateway.
+    The prices of every tick are pushed to all open price streams. The broker state is shared with the
+    client instead of being sent over the wire, so the execution semantics are exactly the ones of the
+    simulator.
+    """
+
+    def __init__(self, simulator: BrokerSimulator, latency: float = 0.0):
+        self.simulator = simulator
+        self.latency = latency
+        self._requests: Optional[asyncio.Queue] = None
+        self._server: Optional[asyncio.Future] = None
+        self._streams: List[asyncio.Queue] = []
+
+    async def request(self, method: str, *args):
+        """Send a request to the exchange and wait for the response"""
+        if self._server is None:
+            self._requests = asyncio.Queue()
+            self._server = asyncio.ensure_future(self._serve())
+        response = asyncio.get_running_loop().create_future()
+        await self._requests.put((method, args, response))
+        return await response
+
+    async def _serve(self) -> None:
+        while True:
+            method, args, response = await self._requests.get()
+            if self.latency > 0.0:
+                await asyncio.sleep(self.latency)
+            if response.cancelled():
+                continue
+            try:
+                result = getattr(self, f'_handle_{method}')(*args)
+            except Exception as e:
+                response.set_exception(e)
+            else:
+                response.set_result(result)
+
+    def _handle_next(self, broker_state: BrokerState) -> Optional[Time]:
+        now = self.simulator.next(broker_state)
+        update = None if now is None else (now, dict(broker_state.current_prices))
+        for stream in self._streams:
+            stream.put_nowait(update)
+        return now
+
+    def _handle_fill_orders(self, orders: Sequence[Order], broker_state: BrokerState) -> None:
+        self.simulator.fill_orders(orders, broker_state)
+
+    def open_price_stream(self) -> asyncio.Queue:
+        """Queue receiving the price updates of every tick and None after the last tick"""
+        stream = asyncio.Queue()
+        self._streams.append(stream)
+        return stream
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.cancel()
+            try:
+                await self._server
+            except asyncio.CancelledError:
+                pass
+            self._server = None
+
+
+class LocalExchangeConn(AsyncBrokerConn):
+    """AsyncBrokerConn for a LocalExchange"""
+
+    def __init__(self, exchange: LocalExchange):
+        self.exchange = exchange
+
+    async def next(self, broker_state: BrokerState) -> Optional[Time]:
+        return await self.exchange.request('next', broker_state)
+
+    async def fill_orders(self, orders: Sequence[Order], broker_state: BrokerState) -> None:
+        await self.exchange.request('fill_orders', list(orders), broker_state)
+
+    def stream_prices(self) -> AsyncIterator[PriceUpdate]:
+        return self._iter_stream(self.exchange.open_price_stream())
+
+    @staticmethod
+    async def _iter_stream(stream: asyncio.Queue) -> AsyncIterator[PriceUpdate]:
+        while True:
+            update = await stream.get()
+            if update is None:
+                return
+            yield update
+
+    def get_default_numeraire(self) -> Optional[str]:
+        return self.exchange.simulator.get_default_numeraire()
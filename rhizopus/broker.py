@@ -1,3 +1,4 @@
+import bisect
 import collections
 import datetime
 import logging
@@ -5,13 +6,27 @@ import math
 import random
 import importlib
 from abc import ABC
-from collections import deque
 from enum import Enum, auto
 from types import MappingProxyType
-from typing import Dict, KeysView, List, Mapping, Optional, Tuple, Union, Iterable, Any
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    KeysView,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    Iterable,
+    Iterator,
+    Set,
+    Any,
+)
 
 from rhizopus.enums import enum_member_from_name
-from rhizopus.price_graph import calc_path_price, get_price_from_dict, price_graph_is_full
+from rhizopus.ledger import ExecutionLedger
+from rhizopus.price_graph import PriceGraph, get_price_from_dict, price_graph_is_full
 from rhizopus.primitives import (
     Time,
     Amount,
@@ -28,6 +43,11 @@ from rhizopus.primitives import (
     maybe_deserialize_time,
     maybe_serialize_time,
 )
+from rhizopus.profiling import PhaseProfiler
+
+if TYPE_CHECKING:
+    from rhizopus.async_broker import AsyncBrokerConn
+    from rhizopus.snapshot import SnapshotReader, SnapshotWriter
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +68,16 @@ class BrokerStateError(BrokerError):
     pass
 
 
+class ValidationLevel(Enum):
+    """How thoroughly BrokerState.check() validates the state"""
+
+    OFF = auto()
+    INVARIANTS = auto()  # cheap checks of default_numeraire, time_index and now
+    ROUND_TRIP = auto()  # invariants plus a JSON round trip every `validation_interval` checks
+    # invariants plus a JSON round trip with probability 1/validation_interval
+    SAMPLED_ROUND_TRIP = auto()
+
+
 class BrokerState:
     """Encapsulates the state of the abstract broker.
 
@@ -63,17 +93,30 @@ class BrokerState:
     default_numeraire: str
     now: Optional[Time]
     time_index: int
+    ledger: ExecutionLedger
 
     MAX_NUM_ACTIVE_ORDERS = 50000
     MAX_NUM_EXECUTED_ORDERS = 100000
     MAX_NUM_REJECTED_ORDERS = 5000
+    # the round trip levels are meant for tests, see set_validation()
+    DEFAULT_VALIDATION_LEVEL = ValidationLevel.INVARIANTS
 
     def __init__(
         self,
         default_numeraire: str,
         accounts: Optional[Dict[str, Amount]] = None,
         variables: Optional[Dict[str, Union[float, str]]] = None,
+        ledger: Optional[ExecutionLedger] = None,
+        executed_orders_window: int = 0,
     ):
+        """
+        :param ledger: Execution ledger recording all finished orders. An in-memory ledger spilling to a
+            temporary directory is used by default. The ledger is an audit log and not part of the
+            serialized state.
+        :param executed_orders_window: Number of the most recent executed orders kept as objects in
+            executed_orders, in addition to the ledger rows, at most MAX_NUM_EXECUTED_ORDERS. No objects
+            are kept by default.
+        """
         if not default_numeraire:
             raise BrokerStateError("Numeraire has to be a non-empty string")
         self.default_numeraire = default_numeraire
@@ -88,27 +131,93 @@ class BrokerState:
 
         self.now = None
         self.time_index = 0
-        self.active_orders = deque(maxlen=self.MAX_NUM_ACTIVE_ORDERS)
-        self.executed_orders = deque(maxlen=self.MAX_NUM_EXECUTED_ORDERS)
-        self.rejected_orders = deque(maxlen=self.MAX_NUM_REJECTED_ORDERS)
+        self.active_orders = AgeOrderedOrderBook(maxlen=self.MAX_NUM_ACTIVE_ORDERS)
+        if not (type(executed_orders_window) == int and executed_orders_window >= 0):
+            raise BrokerStateError(f'Wrong executed orders window: {executed_orders_window}')
+        self.executed_orders_window = min(executed_orders_window, self.MAX_NUM_EXECUTED_ORDERS)
+        # finished orders are not queried, so they are kept in plain deques without indexes
+        self.executed_orders = collections.deque(maxlen=self.executed_orders_window)
+        self.rejected_orders = collections.deque(maxlen=self.MAX_NUM_REJECTED_ORDERS)
+        # orders executed in the tick `_tick_time_index`, not serialized
+        self._tick_executed_orders: List['Order'] = []
+        self._tick_time_index: Optional[int] = None
+        self.ledger = ledger if ledger is not None else ExecutionLedger()
+        self.set_validation(self.DEFAULT_VALIDATION_LEVEL)
+
+    def record_execution(self, order: 'Order') -> None:
+        """Log a finished (executed or rejected) order in the execution ledger"""
+        self.record_executions([order])
+
+    def record_executions(self, orders: Sequence['Order']) -> None:
+        """Log the orders finished in the current tick in the execution ledger
+
+        The ledger keeps all of them. Only the most recent rejected orders and, if executed_orders_window is
+        set, the most recent executed orders are kept as objects as well.
+        """
+        if self._tick_time_index != self.time_index:
+            self._tick_time_index = self.time_index
+            self._tick_executed_orders = []
+        for order in orders:
+            if order.status != OrderStatus.EXECUTED:
+                self.rejected_orders.append(order)
+                continue
+            self._tick_executed_orders.append(order)
+            if self.executed_orders_window:
+                self.executed_orders.append(order)
+        self.ledger.append_batch(orders, self.time_index)
+
+    def get_tick_executed_orders(self) -> List['Order']:
+        """Orders executed in the current tick, independently of executed_orders_window"""
+        if self._tick_time_index != self.time_index:
+            return []
+        return list(self._tick_executed_orders)
+
+    def set_validation(
+        self, level: ValidationLevel, interval: int = 10, seed: Optional[int] = None
+    ) -> None:
+        """Configure the self-check
+
+        :param level: Validation level used by check()
+        :param interval: Run the JSON round trip every `interval` checks (on average for SAMPLED_ROUND_TRIP)
+        :param seed: Seed of the random generator used by SAMPLED_ROUND_TRIP
+        """
+        if not (type(interval) == int and interval > 0):
+            raise ValueError(f'Validation interval must be a positive int: {interval}')
+        self.validation_level = level
+        self.validation_interval = interval
+        self.validation_seed = seed
+        self._num_checks = 0
+        self._validation_rng = random.Random(seed)
 
     def check(self):
         """Self-check
 
+        The amount of work depends on the validation level set with set_validation(). The default level only
+        checks the invariants, because a JSON round trip on every tick dominates the run time of a backtest.
+        Tests can enable the round trip levels, production backtests can switch the check off. The settings
+        are persisted by to_json() and to_snapshot().
+
         More checks to implement:
-        * Check if price graphs are arbitrage free
         * Add properties for default_numeraire, now, and time_index to make sure they are set properly. This is
           cheaper than checking every iteration.
         """
+        if self.validation_level == ValidationLevel.OFF:
+            return
         if not (type(self.default_numeraire) == str and self.default_numeraire):
             raise BrokerStateError(f'Wrong default numeraire: {self.default_numeraire}')
         if not (type(self.time_index) == int and self.time_index >= 0):
             raise BrokerStateError(f'Wrong time index: {self.time_index}')
         raise_for_time(self.now)
 
-        if random.uniform(0.0, 1.0) > 0.9:  # TODO Wrap in a with block
-            other_self = self.from_json(self.to_json())
-            assert self == other_self
+        self._num_checks += 1
+        if self.validation_level == ValidationLevel.ROUND_TRIP:
+            round_trip = self._num_checks % self.validation_interval == 0
+        elif self.validation_level == ValidationLevel.SAMPLED_ROUND_TRIP:
+            round_trip = self._validation_rng.random() * self.validation_interval < 1.0
+        else:
+            round_trip = False
+        if round_trip and self != self.from_json(self.to_json()):
+            raise BrokerStateError('Broker state changed in a serialization round trip')
 
     def to_json(self) -> Dict[str, Any]:
         """Serialize to JSON"""
@@ -116,6 +225,12 @@ class BrokerState:
             'default_numeraire': self.default_numeraire,
             'now': '' if self.now is None else maybe_serialize_time(self.now),
             'time_index': self.time_index,
+            'executed_orders_window': self.executed_orders_window,
+            'validation': [
+                self.validation_level.name,
+                self.validation_interval,
+                self.validation_seed,
+            ],
             'accounts': {acc: list(amount) for acc, amount in self.accounts.items()}
             if self.accounts
             else {},
@@ -140,7 +255,16 @@ class BrokerState:
     def from_json(cls, data: Dict[str, Any]) -> 'BrokerState':
         """Deserialize from JSON"""
 
-        broker_state = BrokerState(data['default_numeraire'])
+        # checkpoints without a window kept all of their executed orders as objects
+        window = data.get('executed_orders_window')
+        if window is None:
+            window = min(len(data['executed_orders']), cls.MAX_NUM_EXECUTED_ORDERS)
+        broker_state = BrokerState(data['default_numeraire'], executed_orders_window=window)
+        if 'validation' in data:
+            level, interval, seed = data['validation']
+            broker_state.set_validation(
+                enum_member_from_name(ValidationLevel, level), interval, seed
+            )
         broker_state.now = datetime.datetime.fromisoformat(data['now']) if data['now'] else None
         broker_state.time_index = checked_int_id(data['time_index'])
         broker_state.accounts = {
@@ -155,17 +279,62 @@ class BrokerState:
             (num0, num1): checked_real(num0 + num1, price, 0.0)
             for num0, num1, price in data['recent_prices']
         }
-        broker_state.active_orders = deque(
-            (Order.from_json(o) for o in data['active_orders']), maxlen=cls.MAX_NUM_ACTIVE_ORDERS
-        )
-        broker_state.executed_orders = deque(
-            (Order.from_json(o) for o in data['executed_orders']),
-            maxlen=cls.MAX_NUM_EXECUTED_ORDERS,
-        )
-        broker_state.rejected_orders = deque(
-            (Order.from_json(o) for o in data['rejected_orders']),
-            maxlen=cls.MAX_NUM_REJECTED_ORDERS,
-        )
+        broker_state.active_orders.extend(Order.from_json(o) for o in data['active_orders'])
+        broker_state.executed_orders.extend(Order.from_json(o) for o in data['executed_orders'])
+        broker_state.rejected_orders.extend(Order.from_json(o) for o in data['rejected_orders'])
+        return broker_state
+
+    def to_snapshot(self, writer: 'SnapshotWriter') -> None:
+        """Write to a binary snapshot, see rhizopus.snapshot"""
+        writer.write_str('BrokerState')
+        writer.write_str(self.default_numeraire)
+        writer.write_time(self.now)
+        writer.write_i64(self.time_index)
+        writer.write_u32(self.executed_orders_window)
+        writer.write_str(self.validation_level.name)
+        writer.write_u32(self.validation_interval)
+        writer.write_value(self.validation_seed)
+        writer.write_u32(len(self.accounts))
+        for acc, (value, num) in self.accounts.items():
+            writer.write_str(acc)
+            writer.write_f64(value)
+            writer.write_str(num)
+        writer.write_value(self.variables)
+        for prices in (self.current_prices, self.recent_prices):
+            writer.write_u32(len(prices))
+            for (num0, num1), price in prices.items():
+                writer.write_str(num0)
+                writer.write_str(num1)
+                writer.write_f64(price)
+        writer.write_orders(self.active_orders)
+        writer.write_orders(self.executed_orders)
+        writer.write_orders(self.rejected_orders)
+
+    @classmethod
+    def from_snapshot(cls, reader: 'SnapshotReader') -> 'BrokerState':
+        """Read from a binary snapshot, see rhizopus.snapshot"""
+        reader.expect_str('BrokerState')
+        default_numeraire = reader.read_str()
+        now = reader.read_time()
+        time_index = checked_int_id(reader.read_i64())
+        broker_state = BrokerState(default_numeraire, executed_orders_window=reader.read_u32())
+        level = enum_member_from_name(ValidationLevel, reader.read_str())
+        interval = reader.read_u32()
+        broker_state.set_validation(level, interval, reader.read_value())
+        broker_state.now = now
+        broker_state.time_index = time_index
+        for _ in range(reader.read_u32()):
+            acc = reader.read_str()
+            value = reader.read_f64()
+            broker_state.accounts[acc] = checked_amount((value, reader.read_str()))
+        broker_state.variables = reader.read_value()
+        for prices in (broker_state.current_prices, broker_state.recent_prices):
+            for _ in range(reader.read_u32()):
+                num0, num1 = reader.read_str(), reader.read_str()
+                prices[(num0, num1)] = checked_real(num0 + num1, reader.read_f64(), 0.0)
+        broker_state.active_orders.extend(reader.read_orders())
+        broker_state.executed_orders.extend(reader.read_orders())
+        broker_state.rejected_orders.extend(reader.read_orders())
         return broker_state
 
     def __eq__(self, other: 'BrokerState') -> bool:
@@ -233,8 +402,11 @@ class Order:
 
     An order is not allowed to have variable state which must be stored in BrokerState.
     The execute() method is invoked only by the BrokerSimulator.
+    The order classes in rhizopus.orders define __slots__ to keep large order books small.
     """
 
+    __slots__ = ('age', 'status', 'status_time_stamp', 'status_comment', 'transaction_id', 'gid')
+
     def __init__(
         self,
         age: int = 0,
@@ -316,6 +488,153 @@ class Order:
         return order_class.from_json(data)
 
 
+def _order_accounts(order: Order) -> Set[str]:
+    """Accounts an order refers to"""
+    accounts = {getattr(order, attr, None) for attr in ('account_name', 'acc0', 'acc1')}
+    accounts.discard(None)
+    return accounts
+
+
+class OrderBook:
+    """Insertion-ordered order container with secondary indexes
+
+    Orders are indexed by gid, by account (the acc0, acc1, and account_name attributes) and by class name
+    when they are added, so lookups, removals, and class counts don't scan the whole book. The index keys
+    are remembered, so an order changed after it was added (e.g. a new gid) is still removed cleanly, but
+    it stays indexed under its old keys.
+
+    Eviction: a book with `maxlen` that is full drops the order that was appended first among the orders
+    still in the book, before appending the new one, and logs a warning. The order of iteration (e.g. by
+    age in AgeOrderedOrderBook) does not matter for the eviction.
+    """
+
+    def __init__(self, orders: Iterable[Order] = (), maxlen: Optional[int] = None):
+        self.maxlen = maxlen
+        self._orders: Dict[int, Order] = {}
+        # index keys of every order as computed in append(), so later changes of an order don't matter
+        self._order_index_keys: Dict[int, Tuple[Tuple[Dict, Any], ...]] = {}
+        self._by_gid: Dict[int, Dict[int, Order]] = collections.defaultdict(dict)
+        self._by_account: Dict[str, Dict[int, Order]] = collections.defaultdict(dict)
+        self._by_class: Dict[str, Dict[int, Order]] = collections.defaultdict(dict)
+        self.extend(orders)
+
+    def _index_keys(self, order: Order):
+        yield self._by_gid, order.gid
+        yield self._by_class, type(order).__name__
+        for account in _order_accounts(order):
+            yield self._by_account, account
+
+    def append(self, order: Order) -> None:
+        key = id(order)
+        if key in self._orders:
+            raise ValueError(f'Order already in the order book: {order}')
+        if self.maxlen is not None and len(self._orders) >= self.maxlen:
+            evicted = next(iter(self._orders.values()))
+            logger.warning(f'Order book full ({self.maxlen} orders), dropping {evicted}')
+            self.remove(evicted)
+        self._orders[key] = order
+        index_keys = tuple(self._index_keys(order))
+        self._order_index_keys[key] = index_keys
+        for index, index_key in index_keys:
+            index[index_key][key] = order
+
+    def extend(self, orders: Iterable[Order]) -> None:
+        for order in orders:
+            self.append(order)
+
+    def remove(self, order: Order) -> None:
+        key = id(order)
+        if self._orders.pop(key, None) is None:
+            raise ValueError(f'Order not in the order book: {order}')
+        for index, index_key in self._order_index_keys.pop(key):
+            orders = index[index_key]
+            del orders[key]
+            if not orders:
+                del index[index_key]
+
+    def clear(self) -> None:
+        self._orders.clear()
+        self._order_index_keys.clear()
+        self._by_gid.clear()
+        self._by_account.clear()
+        self._by_class.clear()
+
+    def get_by_gid(self, gid: int) -> List[Order]:
+        return list(self._by_gid[gid].values()) if gid in self._by_gid else []
+
+    def get_by_account(self, account: str) -> List[Order]:
+        return list(self._by_account[account].values()) if account in self._by_account else []
+
+    def get_by_class(self, class_name: str) -> List[Order]:
+        return list(self._by_class[class_name].values()) if class_name in self._by_class else []
+
+    def count_by_class(self) -> Dict[str, int]:
+        return {class_name: len(orders) for class_name, orders in self._by_class.items()}
+
+    def __contains__(self, order: Order) -> bool:
+        return id(order) in self._orders
+
+    def __iter__(self) -> Iterator[Order]:
+        return iter(self._orders.values())
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({list(self)}, maxlen={self.maxlen})'
+
+
+class AgeOrderedOrderBook(OrderBook):
+    """OrderBook iterated in the order of increasing order age
+
+    Orders of equal age keep their insertion order. The orders are kept in buckets by age, so the book stays
+    ordered without sorting when all orders age by one tick at once (see increment_ages()).
+    """
+
+    def __init__(self, orders: Iterable[Order] = (), maxlen: Optional[int] = None):
+        # bucket keys are ages minus the number of increment_ages() calls
+        self._age_shift = 0
+        self._buckets: Dict[int, Dict[int, Order]] = {}
+        self._bucket_keys: List[int] = []
+        self._order_bucket_keys: Dict[int, int] = {}
+        super().__init__(orders, maxlen)
+
+    def append(self, order: Order) -> None:
+        super().append(order)
+        key = order.age - self._age_shift
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = {}
+            bisect.insort(self._bucket_keys, key)
+        bucket[id(order)] = order
+        self._order_bucket_keys[id(order)] = key
+
+    def remove(self, order: Order) -> None:
+        super().remove(order)
+        key = self._order_bucket_keys.pop(id(order))
+        bucket = self._buckets[key]
+        del bucket[id(order)]
+        if not bucket:
+            del self._buckets[key]
+            del self._bucket_keys[bisect.bisect_left(self._bucket_keys, key)]
+
+    def clear(self) -> None:
+        super().clear()
+        self._buckets.clear()
+        self._bucket_keys.clear()
+        self._order_bucket_keys.clear()
+
+    def increment_ages(self) -> None:
+        """Increase the age of all orders by one without reordering the book"""
+        for order in self._orders.values():
+            order.age += 1
+        self._age_shift += 1
+
+    def __iter__(self) -> Iterator[Order]:
+        for key in self._bucket_keys:
+            yield from self._buckets[key].values()
+
+
 class AbstractBrokerConn(ABC):
     def next(self, broker_state: BrokerState) -> Optional[Time]:
         """Advance the time by one tick. Updates prices, executes orders, etc"""
@@ -323,6 +642,11 @@ class AbstractBrokerConn(ABC):
     def fill_order(self, order: Order, broker_state: BrokerState) -> None:
         """Add an order to the queue"""
 
+    def fill_orders(self, orders: Sequence[Order], broker_state: BrokerState) -> None:
+        """Add a batch of orders to the queue. Connections supporting bulk requests should override this."""
+        for order in orders:
+            self.fill_order(order, broker_state)
+
     def get_default_numeraire(self) -> Optional[str]:
         """Returns the default numeraire"""
 
@@ -346,76 +670,135 @@ class NullBrokerConn(AbstractBrokerConn):
         return self.default_numeraire
 
 
-class Broker:
-    """Wrapper class defining the broker interface
+class BrokerBase:
+    """Broker state, valuations and queries shared by Broker and AsyncBroker
 
-    Trading strategies talk to this class.
+    Subclasses add next() and the fill methods, synchronous ones in Broker and coroutines in AsyncBroker.
+    Code that only reads the broker, like BrokerObserver, accepts a BrokerBase.
 
-    TODOs:
-    * Add property caching
+    Account values are cached per (time_index, account, numeraire) and portfolio values per (time_index,
+    numeraire). Only the requested values are calculated. The caches are dropped whenever the broker state
+    may have changed, i.e. in next() and fill_order(), so any number of readers per tick share one valuation.
+    The price graph only depends on the recent prices and is kept until next().
     """
 
     _broker_state: BrokerState
 
     def __init__(
         self,
-        broker_conn: AbstractBrokerConn,
+        broker_conn: Union[AbstractBrokerConn, 'AsyncBrokerConn'],
         initial_orders: List[Order],
         broker_state: Optional[BrokerState] = None,
         silent: bool = False,
+        validation_level: Optional[ValidationLevel] = None,
+        validation_interval: int = 10,
+        validation_seed: Optional[int] = None,
+        profiler: Optional[PhaseProfiler] = None,
     ):
+        """
+        :param validation_level: If set, configures the self-check of the broker state run on every tick. See
+            BrokerState.set_validation() for the meaning of the validation parameters.
+        :param profiler: Time the 'broker.*' phases, see rhizopus.profiling
+        """
         self._broker_conn = broker_conn
         self._no_postponed_orders_threshold = 8
         self._broker_state = (
             broker_state if broker_state else BrokerState(broker_conn.get_default_numeraire())
         )
+        if validation_level is not None:
+            self._broker_state.set_validation(
+                validation_level, validation_interval, validation_seed
+            )
         self.silent = silent
+        self.profiler = profiler
+        self._price_graph: Optional[PriceGraph] = None
+        self._value_cache: Dict[Tuple[int, str, str], Optional[float]] = {}
+        self._nav_cache: Dict[Tuple[int, str], Optional[float]] = {}
         self._broker_state.active_orders.extend(initial_orders)
-        if broker_state is None:
-            self.next()  # initialize the broker_state and execute initial orders, if not initialized already
 
-    def next(self) -> Optional[Time]:
-        """Note that this class is not an iterator because independent iterations are not supported"""
-        result = self._broker_conn.next(self._broker_state)
-        self._broker_state.check()
+    def _after_next(self, result: Optional[Time]) -> Optional[Time]:
+        """Bookkeeping after the broker connection advanced the time"""
+        self.invalidate_caches()
+        profiler = self.profiler
+        if profiler is None:
+            self._broker_state.check()
+        else:
+            start_ns = profiler.now()
+            self._broker_state.check()
+            profiler.lap('broker.check', start_ns)
         if result is None:
             return None
 
         self._broker_state.recent_prices.update(self._broker_state.current_prices)
         # This reports the queue status if orders start piling up in the queue
         if len(self._broker_state.active_orders) > self._no_postponed_orders_threshold:
-            classes = [type(o).__name__ for o in self._broker_state.active_orders]
-            summary = ' '.join(f'{c}:{i}' for c, i in collections.Counter(classes).items())
+            class_counts = self._broker_state.active_orders.count_by_class()
+            summary = ' '.join(f'{c}:{i}' for c, i in class_counts.items())
             logger.warning(
                 f'More than {self._no_postponed_orders_threshold} orders postponed: {summary}'
             )
             self._no_postponed_orders_threshold *= 2
         return self._broker_state.now
 
-    def fill_order(self, order: Order) -> None:
+    def _activate_orders(self, orders: Sequence[Order]) -> None:
         assert self._broker_state.default_numeraire, 'Default numeraire not set'
         assert self._broker_state.now, 'Now is not set'
 
         if not self.silent:
+            class_counts = collections.Counter(type(o).__name__ for o in orders)
+            summary = ' '.join(f'{c}:{i}' for c, i in class_counts.items())
             logger.info(
-                f'T{self._broker_state.time_index} {self._broker_state.now}: Fill: {str(order)}'
+                f'T{self._broker_state.time_index} {self._broker_state.now}: '
+                f'Fill {len(orders)} orders: {summary}'
             )
-        order.set_status(OrderStatus.ACTIVE, self.get_time())
-        self._broker_conn.fill_order(order, self._broker_state)
+        now = self.get_time()
+        for order in orders:
+            order.set_status(OrderStatus.ACTIVE, now)
+
+    def invalidate_caches(self) -> None:
+        """Drop cached prices and valuations
+
+        Call this after modifying the broker state outside of next() and fill_order().
+        """
+        self._price_graph = None
+        self.invalidate_valuations()
+
+    def invalidate_valuations(self) -> None:
+        """Drop cached valuations but keep the price graph, e.g. after orders changed the accounts"""
+        self._value_cache.clear()
+        self._nav_cache.clear()
+
+    def _get_value_account(self, acc: str, num0: str) -> Optional[float]:
+        """Return the cached value of an account in num0"""
+        key = (self._broker_state.time_index, acc, num0)
+        try:
+            return self._value_cache[key]
+        except KeyError:
+            value = self._value_cache[key] = self._calc_value_account(acc, num0)
+            return value
+
+    def _get_values(self, num0: str) -> Dict[str, Optional[float]]:
+        return {acc: self._get_value_account(acc, num0) for acc in self._broker_state.accounts}
 
     def get_value_portfolio(self, num0: str = '') -> Optional[float]:
         """Sum all recent account values"""
         if num0 == '':
             num0 = self.get_default_numeraire()
-        account_values = self.get_value_all_accounts(num0)
-        if any([value is None for value in account_values.values()]):
-            return None
-        return sum(account_values.values())
+        key = (self._broker_state.time_index, num0)
+        if key in self._nav_cache:
+            return self._nav_cache[key]
+        values = self._get_values(num0).values()
+        nav = None if any(value is None for value in values) else sum(values)
+        self._nav_cache[key] = nav
+        return nav
 
     def get_value_account(self, acc: str, num0: str = '') -> Optional[float]:
         """Calc recent value of an account"""
         if num0 == '':
             num0 = self.get_default_numeraire()
+        return self._get_value_account(acc, num0)
+
+    def _calc_value_account(self, acc: str, num0: str) -> Optional[float]:
         if acc not in self.accounts:
             return None
         acc_value, acc_num = self.accounts[acc]
@@ -423,10 +806,12 @@ class Broker:
             abs(acc_value) < EPS_FINANCIAL
         ):  # this returns the (vanishing) acc value even if no prices are available
             return 0.0
+        price_graph = self.get_price_graph()
         if acc_value < 0.0:
-            last_price = 1.0 / calc_path_price(self.get_recent_prices(), num0, acc_num)
+            last_price = price_graph.get_price(num0, acc_num)
+            last_price = None if last_price is None else 1.0 / last_price
         else:
-            last_price = calc_path_price(self.get_recent_prices(), acc_num, num0)
+            last_price = price_graph.get_price(acc_num, num0)
         if last_price is None or not math.isfinite(last_price):
             return None
         return acc_value * last_price
@@ -439,8 +824,7 @@ class Broker:
         """Calc recent value for all accounts using recent prices"""
         if num0 == '':
             num0 = self.get_default_numeraire()
-        values = {acc: self.get_value_account(acc, num0) for acc in self.accounts}
-        return values
+        return self._get_values(num0)
 
     @property
     def recent_weights_all_accounts(self) -> Dict[str, Optional[float]]:
@@ -448,8 +832,9 @@ class Broker:
 
     def get_weight_all_accounts(self) -> Dict[str, Optional[float]]:
         """Calc recent weights for all accounts"""
-        position_values = self.get_value_all_accounts()
-        portfolio_value = self.get_value_portfolio()
+        num0 = self.get_default_numeraire()
+        position_values = self._get_values(num0)
+        portfolio_value = self.get_value_portfolio(num0)
         if portfolio_value is None or portfolio_value < NEGLIGIBLE_POSITIVE_PORTFOLIO_NAV:
             return {key: None for key in position_values.keys()}
         return {
@@ -467,11 +852,58 @@ class Broker:
         return list(self._broker_state.active_orders)
 
     def get_executed_orders(self) -> List[Order]:
+        """Most recent executed orders, at most executed_orders_window of BrokerState
+
+        The window is 0 by default, so this returns an empty list unless the broker state was created with
+        an executed_orders_window. All finished orders are recorded in the execution ledger, see
+        get_execution_ledger().
+        """
         return list(self._broker_state.executed_orders)
 
+    def get_tick_executed_orders(self) -> List[Order]:
+        """Orders executed in the current tick, e.g. to calculate the traded value"""
+        return self._broker_state.get_tick_executed_orders()
+
+    def get_execution_ledger(self) -> ExecutionLedger:
+        return self._broker_state.ledger
+
+    def find_active_orders(
+        self,
+        gid: Optional[int] = None,
+        account: Optional[str] = None,
+        class_name: Optional[str] = None,
+    ) -> List[Order]:
+        """Return the active orders matching all given criteria, using the order book indexes"""
+        active_orders = self._broker_state.active_orders
+        if gid is not None:
+            orders = active_orders.get_by_gid(gid)
+        elif account is not None:
+            orders = active_orders.get_by_account(account)
+        elif class_name is not None:
+            orders = active_orders.get_by_class(class_name)
+        else:
+            return list(active_orders)
+        if account is not None:
+            orders = [o for o in orders if account in _order_accounts(o)]
+        if class_name is not None:
+            orders = [o for o in orders if type(o).__name__ == class_name]
+        return orders
+
+    def cancel_order(self, order: Order) -> bool:
+        """Move an active order to the rejected orders. Returns False if the order is not active."""
+        if order not in self._broker_state.active_orders:
+            return False
+        self._broker_state.active_orders.remove(order)
+        order.set_status(OrderStatus.REJECTED, self.get_time(), 'Cancelled')
+        self._broker_state.record_execution(order)
+        return True
+
     def get_current_price(self, num0: str, num1: str) -> Optional[float]:
         return get_price_from_dict(self._broker_state.current_prices, num0, num1)
 
+    def get_current_prices(self) -> Mapping[Tuple[str, str], float]:
+        return MappingProxyType(self._broker_state.current_prices)
+
     @property
     def recent_prices(self):
         return MappingProxyType(self._broker_state.recent_prices)
@@ -479,6 +911,16 @@ class Broker:
     def get_recent_prices(self) -> Mapping[Tuple[str, str], float]:
         return MappingProxyType(self._broker_state.recent_prices)
 
+    def get_price_graph(self) -> PriceGraph:
+        """Conversion rates derived from recent prices
+
+        The graph is built on first use and reused until the next call of next(), since only next() changes
+        the recent prices. Filling orders keeps the graph.
+        """
+        if self._price_graph is None:
+            self._price_graph = PriceGraph(self._broker_state.recent_prices)
+        return self._price_graph
+
     def current_price_graph_is_full(
         self, cash_nums: Iterable[str], asset_nums: Iterable[str]
     ) -> bool:
@@ -532,3 +974,75 @@ class Broker:
 
     def state_to_json(self) -> Dict[str, Any]:
         return self._broker_state.to_json()
+
+    def state_to_snapshot(self, writer: 'SnapshotWriter') -> None:
+        self._broker_state.to_snapshot(writer)
+
+
+class Broker(BrokerBase):
+    """Wrapper class defining the broker interface
+
+    Trading strategies talk to this class.
+    """
+
+    def __init__(
+        self,
+        broker_conn: AbstractBrokerConn,
+        initial_orders: List[Order],
+        broker_state: Optional[BrokerState] = None,
+        silent: bool = False,
+        validation_level: Optional[ValidationLevel] = None,
+        validation_interval: int = 10,
+        validation_seed: Optional[int] = None,
+        profiler: Optional[PhaseProfiler] = None,
+    ):
+        super().__init__(
+            broker_conn,
+            initial_orders,
+            broker_state,
+            silent,
+            validation_level,
+            validation_interval,
+            validation_seed,
+            profiler,
+        )
+        if broker_state is None:
+            self.next()  # initialize the broker_state and execute initial orders, if not initialized already
+
+    def next(self) -> Optional[Time]:
+        """Note that this class is not an iterator because independent iterations are not supported"""
+        profiler = self.profiler
+        if profiler is None:
+            return self._after_next(self._broker_conn.next(self._broker_state))
+        start_ns = profiler.now()
+        result = self._broker_conn.next(self._broker_state)
+        profiler.lap('broker.next', start_ns)
+        return self._after_next(result)
+
+    def fill_order(self, order: Order) -> None:
+        assert self._broker_state.default_numeraire, 'Default numeraire not set'
+        assert self._broker_state.now, 'Now is not set'
+
+        profiler = self.profiler
+        start_ns = profiler.now() if profiler is not None else 0
+        if not self.silent:
+            logger.info(
+                f'T{self._broker_state.time_index} {self._broker_state.now}: Fill: {str(order)}'
+            )
+        order.set_status(OrderStatus.ACTIVE, self.get_time())
+        self._broker_conn.fill_order(order, self._broker_state)
+        self.invalidate_valuations()
+        if profiler is not None:
+            profiler.lap('broker.fill_order', start_ns)
+
+    def fill_orders(self, orders: Sequence[Order]) -> None:
+        """Fill a batch of orders with a single call to the broker connection"""
+        if not orders:
+            return
+        profiler = self.profiler
+        start_ns = profiler.now() if profiler is not None else 0
+        self._activate_orders(orders)
+        self._broker_conn.fill_orders(orders, self._broker_state)
+        self.invalidate_valuations()
+        if profiler is not None:
+            profiler.lap('broker.fill_orders', start_ns)
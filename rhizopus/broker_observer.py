@@ -1,8 +1,12 @@
 import logging
 import datetime
+import math
+from collections import deque
 from typing import (
     Callable,
     Dict,
+    FrozenSet,
+    Iterable,
     List,
     Mapping,
     Optional,
@@ -10,30 +14,137 @@ from typing import (
     Tuple,
     Union,
     Any,
+    TYPE_CHECKING,
 )
 
-from rhizopus.broker import Broker
-from rhizopus.primitives import Time, raise_for_key, maybe_serialize_time
+import numpy as np
+
+from rhizopus.broker import BrokerBase
+from rhizopus.price_graph import ArbitrageDetector
+from rhizopus.primitives import (
+    NEGLIGIBLE_POSITIVE_PORTFOLIO_NAV,
+    Time,
+    raise_for_key,
+    maybe_serialize_time,
+)
+from rhizopus.profiling import PhaseProfiler
 from rhizopus.series_recorder import SeriesRecorder
 
+if TYPE_CHECKING:
+    from rhizopus.snapshot import SnapshotReader, SnapshotWriter
+
 # prefixes are namespaces
 PORTFOLIO_PREFIX = 'portfolio'
 ACCOUNT_PREFIX = 'account'
 VARIABLE_PREFIX = 'var'
+PRICE_GRAPH_PREFIX = 'price_graph'
 EVALUATOR_PREFIX = 'var'  # TODO change to 'eval'
+VOLATILITY_WINDOW = 20
 
 logger = logging.getLogger(__name__)
 
 
+class PortfolioStats:
+    """Running portfolio statistics updated in O(1) per NAV observation
+
+    The volatility is the sample standard deviation of the simple NAV returns over the last `window`
+    observations (not annualized). The mean and the sum of squared deviations of the window are updated
+    with Welford's method when a return enters or leaves the window, which stays accurate in long runs. The turnover of a tick is recorded by BrokerObserver, see
+    BrokerObserver.get_traded_value().
+    """
+
+    def __init__(self, window: int = VOLATILITY_WINDOW):
+        if window < 2:
+            raise ValueError(f'Volatility window must be at least 2: {window}')
+        self.window = window
+        self.num_obs = 0
+        self.initial_nav: Optional[float] = None
+        self.last_nav: Optional[float] = None
+        self.max_nav: Optional[float] = None
+        self.drawdown = 0.0
+        self.max_drawdown = 0.0
+        self.returns = deque()
+        self.mean_return = 0.0
+        self.sq_deviations = 0.0
+
+    def update_nav(self, nav: float) -> None:
+        self.num_obs += 1
+        if self.initial_nav is None:
+            self.initial_nav = nav
+            self.max_nav = nav
+        if self.last_nav is not None and self.last_nav > 0.0:
+            ret = nav / self.last_nav - 1.0
+            self.returns.append(ret)
+            self._add_return(ret)
+            if len(self.returns) > self.window:
+                self._remove_return(self.returns.popleft())
+        self.last_nav = nav
+        self.max_nav = max(self.max_nav, nav)
+        self.drawdown = 1.0 - nav / self.max_nav if self.max_nav > 0.0 else 0.0
+        self.max_drawdown = max(self.max_drawdown, self.drawdown)
+
+    def _add_return(self, ret: float) -> None:
+        """Welford update after `ret` was appended to the window"""
+        delta = ret - self.mean_return
+        self.mean_return += delta / len(self.returns)
+        self.sq_deviations += delta * (ret - self.mean_return)
+
+    def _remove_return(self, ret: float) -> None:
+        """Inverse Welford update after `ret` was removed from the window"""
+        n = len(self.returns)
+        if n == 0:
+            self.mean_return = self.sq_deviations = 0.0
+            return
+        delta = ret - self.mean_return
+        self.mean_return -= delta / n
+        self.sq_deviations = max(self.sq_deviations - delta * (ret - self.mean_return), 0.0)
+
+    def get_volatility(self) -> Optional[float]:
+        n = len(self.returns)
+        if n < 2:
+            return None
+        return math.sqrt(self.sq_deviations / (n - 1))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'window': self.window,
+            'num_obs': self.num_obs,
+            'initial_nav': self.initial_nav,
+            'last_nav': self.last_nav,
+            'max_nav': self.max_nav,
+            'drawdown': self.drawdown,
+            'max_drawdown': self.max_drawdown,
+            'returns': list(self.returns),
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> 'PortfolioStats':
+        stats = PortfolioStats(data['window'])
+        stats.num_obs = data['num_obs']
+        stats.initial_nav = data['initial_nav']
+        stats.last_nav = data['last_nav']
+        stats.max_nav = data['max_nav']
+        stats.drawdown = data['drawdown']
+        stats.max_drawdown = data['max_drawdown']
+        stats.returns = deque()
+        for ret in data['returns']:
+            stats.returns.append(ret)
+            stats._add_return(ret)
+        return stats
+
+
 class BrokerObserver:
     now: Optional[Time]
 
     def __init__(
         self,
-        broker: Broker,
+        broker: BrokerBase,
         rec_acc_weights: bool = True,
         rec_acc_navs: bool = True,
         rec_vars: bool = True,
+        volatility_window: int = VOLATILITY_WINDOW,
+        detect_arbitrage: bool = False,
+        profiler: Optional[PhaseProfiler] = None,
     ):
         self.rec_vars = rec_vars
         self.rec_acc_navs = rec_acc_navs
@@ -42,10 +153,15 @@ class BrokerObserver:
         self.now = None
 
         self.recorder = SeriesRecorder()
+        self.stats = PortfolioStats(volatility_window)
         self.evaluators = dict()
+        self.arbitrage_detector = ArbitrageDetector() if detect_arbitrage else None
+        self.profiler = profiler
+        self.arbitrage_cycles: List[Tuple[Tuple[str, ...], float]] = []
+        self._arbitrage_cycle_set: FrozenSet[Tuple[str, ...]] = frozenset()
 
     def add_evaluator(
-        self, key: Union[str, Sequence[str]], func: Callable[[Broker], Optional[float]]
+        self, key: Union[str, Sequence[str]], func: Callable[[BrokerBase], Optional[float]]
     ):
         raise_for_key(key)
         if key in self.evaluators:
@@ -69,6 +185,15 @@ class BrokerObserver:
         self.recorder.save(self.now, key, value, min_allowed, max_allowed, allow_nans)
 
     def update(self):
+        profiler = self.profiler
+        if profiler is None:
+            self._update()
+            return
+        start_ns = profiler.now()
+        self._update()
+        profiler.lap('observer.update', start_ns)
+
+    def _update(self):
         new_now = self.broker.get_time()
         if new_now is None:
             return
@@ -80,26 +205,13 @@ class BrokerObserver:
             price = self.broker.get_current_price(*key)
             if price is not None:
                 self.recorder.save(self.now, key, price)
+        if self.arbitrage_detector is not None:
+            self._update_arbitrage()
 
         nav = self.broker.get_value_portfolio()
         if nav is not None:
-            nav_key = (PORTFOLIO_PREFIX, 'nav')
-            self.recorder.save(self.now, nav_key, nav, 0.0)
-            nav_history = self.get_dict(nav_key)
-            if len(nav_history) > 2:
-                if abs(nav_history[min(nav_history.keys())]) > 1e-8:
-                    total_return = (
-                        nav / nav_history[min(nav_history.keys())] - 1.0
-                    )  # ugly but cheap
-                    self.recorder.save(self.now, (PORTFOLIO_PREFIX, 'total_return'), total_return)
-                else:
-                    logger.warning(
-                        'NAV history starts with zero. Relative perf measures not available.'
-                    )
-            if self.rec_acc_weights:
-                for account, weight in self.broker.get_weight_all_accounts().items():
-                    if isinstance(weight, float):
-                        self.recorder.save(self.now, (ACCOUNT_PREFIX, account, 'weight'), weight)
+            self.recorder.save(self.now, (PORTFOLIO_PREFIX, 'nav'), nav, 0.0)
+            self._update_stats(nav)
 
         if self.rec_acc_navs:
             for account, position_nav in self.broker.get_value_all_accounts().items():
@@ -115,6 +227,77 @@ class BrokerObserver:
             if isinstance(value, float):
                 self.recorder.save(self.now, evaluator_key, float(value))
 
+    def _update_arbitrage(self) -> None:
+        """Record the number of profitable price cycles and the gain of the best one"""
+        cycles = self.arbitrage_detector.find_cycles(self.broker.get_current_prices())
+        self.arbitrage_cycles = cycles
+        self.recorder.save(self.now, (PRICE_GRAPH_PREFIX, 'arbitrage_cycles'), float(len(cycles)))
+        max_gain = cycles[0][1] - 1.0 if cycles else 0.0
+        self.recorder.save(self.now, (PRICE_GRAPH_PREFIX, 'max_cycle_gain'), max_gain)
+        # persistent cycles are logged at the debug level, only a change of the cycle set is a warning
+        cycle_set = frozenset(nums for nums, _ in cycles)
+        log = logger.warning if cycle_set != self._arbitrage_cycle_set else logger.debug
+        self._arbitrage_cycle_set = cycle_set
+        for nums, product in cycles:
+            log(f'{self.now}: Arbitrage cycle {"->".join(nums + nums[:1])}: {product}')
+
+    def get_arbitrage_cycles(self) -> List[Tuple[Tuple[str, ...], float]]:
+        """Profitable price cycles found in the most recent update, see ArbitrageDetector"""
+        return list(self.arbitrage_cycles)
+
+    def _update_stats(self, nav: float) -> None:
+        stats = self.stats
+        stats.update_nav(nav)
+        if stats.num_obs > 2:
+            if abs(stats.initial_nav) > 1e-8:
+                total_return = nav / stats.initial_nav - 1.0
+                self.recorder.save(self.now, (PORTFOLIO_PREFIX, 'total_return'), total_return)
+            else:
+                logger.warning(
+                    'NAV history starts with zero. Relative perf measures not available.'
+                )
+        self.recorder.save(self.now, (PORTFOLIO_PREFIX, 'max_nav'), stats.max_nav)
+        self.recorder.save(self.now, (PORTFOLIO_PREFIX, 'drawdown'), stats.drawdown)
+        self.recorder.save(self.now, (PORTFOLIO_PREFIX, 'max_drawdown'), stats.max_drawdown)
+        volatility = stats.get_volatility()
+        if volatility is not None:
+            self.recorder.save(self.now, (PORTFOLIO_PREFIX, 'volatility'), volatility)
+
+        if self.rec_acc_weights:
+            for account, weight in self.broker.get_weight_all_accounts().items():
+                if isinstance(weight, float):
+                    self.recorder.save(self.now, (ACCOUNT_PREFIX, account, 'weight'), weight)
+        traded_value = self.get_traded_value()
+        if traded_value is not None and nav >= NEGLIGIBLE_POSITIVE_PORTFOLIO_NAV:
+            self.recorder.save(self.now, (PORTFOLIO_PREFIX, 'turnover'), traded_value / nav)
+
+    def get_traded_value(self) -> Optional[float]:
+        """Value of the transfers executed in the current tick in the default numeraire
+
+        Every executed order transferring an amount between two accounts counts once with the absolute value
+        of its amount, so price moves of the positions do not contribute to the turnover. Returns None if an
+        amount can not be valued.
+
+        TransferAllOrder is not counted: it does not keep the amount it moved, and a persistent one stays
+        active, so its transfers never show up among the executed orders. Strategies sweeping accounts with
+        it have to account for that turnover themselves.
+        """
+        num0 = self.broker.get_default_numeraire()
+        price_graph = None
+        traded_value = 0.0
+        for order in self.broker.get_tick_executed_orders():
+            amount = getattr(order, 'amount', None)
+            if amount is None or getattr(order, 'acc1', None) is None:
+                continue
+            value, num = amount
+            if price_graph is None:
+                price_graph = self.broker.get_price_graph()
+            price = price_graph.get_price(num, num0)
+            if price is None or not math.isfinite(price):
+                return None
+            traded_value += abs(value) * price
+        return traded_value
+
     def get_dict(self, key: Union[str, Sequence[str]]) -> Optional[Mapping[Time, float]]:
         return self.recorder.get_dict(key)
 
@@ -129,7 +312,8 @@ class BrokerObserver:
         self,
         key: Union[str, Sequence[str]],
         starting_with: Time = Time.min,
-    ) -> Tuple[Sequence[Time], Sequence[float]]:
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Observation times as a datetime64[ns] array and values as a float64 array"""
         return self.recorder.get_t_x(key, starting_with)
 
     def get_history(self, key) -> Optional[Sequence[Tuple[Time, float]]]:
@@ -156,6 +340,17 @@ class BrokerObserver:
     def times(self) -> List[Time]:
         return self.recorder.times()
 
+    def to_frame(self, keys: Optional[Iterable[Union[str, Sequence[str]]]] = None):
+        """Return the recorded series as a pandas DataFrame indexed by observation time
+
+        Tuple keys are joined with '_' to form the column names.
+        """
+        import pandas as pd
+
+        times, keys, values = self.recorder.to_arrays(keys)
+        columns = [key if isinstance(key, str) else '_'.join(key) for key in keys]
+        return pd.DataFrame(values, index=pd.DatetimeIndex(times, name='DateTime'), columns=columns)
+
     def to_json(self) -> Dict[str, Any]:
         if self.evaluators:
             raise ValueError(
@@ -166,15 +361,56 @@ class BrokerObserver:
             'rec_acc_weights': self.rec_acc_weights,
             'rec_acc_navs': self.rec_acc_navs,
             'rec_vars': self.rec_vars,
+            'detect_arbitrage': self.arbitrage_detector is not None,
             'time_series': self.recorder.to_json(),
+            'portfolio_stats': self.stats.to_json(),
         }
 
     @classmethod
-    def from_json(cls, broker: Broker, data: Dict[str, Any]) -> 'BrokerObserver':
+    def from_json(cls, broker: BrokerBase, data: Dict[str, Any]) -> 'BrokerObserver':
         observer = BrokerObserver(
-            broker, data['rec_acc_weights'], data['rec_acc_weights'], data['rec_acc_weights']
+            broker,
+            data['rec_acc_weights'],
+            data['rec_acc_navs'],
+            data['rec_vars'],
+            detect_arbitrage=data.get('detect_arbitrage', False),
         )
         now = data['now']
         observer.now = datetime.datetime.fromisoformat(now) if now else None
         observer.recorder = SeriesRecorder.from_json(data['time_series'])
+        if 'portfolio_stats' in data:
+            observer.stats = PortfolioStats.from_json(data['portfolio_stats'])
+        return observer
+
+    def to_snapshot(self, writer: 'SnapshotWriter') -> None:
+        """Write to a binary snapshot, see rhizopus.snapshot"""
+        if self.evaluators:
+            raise ValueError(
+                f'An observer running custom evaluators can not be serialized: {list(self.evaluators)}'
+            )
+        writer.write_str('BrokerObserver')
+        writer.write_time(self.now)
+        writer.write_value(
+            [
+                self.rec_acc_weights,
+                self.rec_acc_navs,
+                self.rec_vars,
+                self.arbitrage_detector is not None,
+            ]
+        )
+        writer.write_value(self.stats.to_json())
+        self.recorder.to_snapshot(writer)
+
+    @classmethod
+    def from_snapshot(cls, broker: BrokerBase, reader: 'SnapshotReader') -> 'BrokerObserver':
+        """Read from a binary snapshot, see rhizopus.snapshot"""
+        reader.expect_str('BrokerObserver')
+        now = reader.read_time()
+        rec_acc_weights, rec_acc_navs, rec_vars, detect_arbitrage = reader.read_value()
+        observer = BrokerObserver(
+            broker, rec_acc_weights, rec_acc_navs, rec_vars, detect_arbitrage=detect_arbitrage
+        )
+        observer.now = now
+        observer.stats = PortfolioStats.from_json(reader.read_value())
+        observer.recorder = SeriesRecorder.from_snapshot(reader)
         return observer
@@ -1,12 +1,31 @@
+import bisect
 import datetime
+import heapq
 import itertools
+import json
 import logging
+import math
 import operator
+import os
 from collections import deque, defaultdict
-from typing import Optional, List, Union, Iterable, Tuple, Set, Dict, Sequence
-
-from rhizopus.primitives import Time, MIN_TIME, checked_time, checked_str_id
-from rhizopus.broker import AbstractBrokerConn, BrokerError, BrokerState, OrderStatus
+from typing import Any, Optional, List, Union, Iterable, Iterator, Tuple, Set, Dict, Sequence
+
+import numpy as np
+
+from rhizopus.primitives import (
+    Time,
+    MIN_TIME,
+    MAX_TIME,
+    checked_time,
+    checked_int_id,
+    checked_str_id,
+    maybe_deserialize_time,
+    maybe_serialize_time,
+    time_to_ns,
+    ns_to_time,
+)
+from rhizopus.broker import AbstractBrokerConn, BrokerError, BrokerState, OrderBook, OrderStatus
+from rhizopus.profiling import PhaseProfiler
 from rhizopus.orders import (
     AddToAccountBalanceOrder,
     AddToVariableOrder,
@@ -40,6 +59,20 @@ class SeriesStoreBase:
         """Return the last time for which we have at least one observation"""
         raise NotImplementedError
 
+    def iter_series(
+        self, edge: Tuple[str, str], start_time: Time = MIN_TIME
+    ) -> Iterator[Tuple[datetime.datetime, float]]:
+        """Iterate over the observations of an edge, starting with the first one not before start_time"""
+        series = self[edge] or []
+        i = bisect.bisect_left(series, (start_time,))
+        return itertools.islice(series, i, None)
+
+    def iter_series_ns(
+        self, edge: Tuple[str, str], start_time: Time = MIN_TIME
+    ) -> Iterator[Tuple[int, float]]:
+        """Like iter_series(), but with observation times in nanoseconds since the epoch"""
+        return ((time_to_ns(t), x) for t, x in self.iter_series(edge, start_time))
+
 
 class SeriesStoreFromDict(SeriesStoreBase):
     def __init__(self, init_data: SeriesStoreData):
@@ -79,13 +112,343 @@ class SeriesStoreFromDict(SeriesStoreBase):
         return max(self._data[k][-1][0] for k in self.edges())
 
 
+class SeriesStoreColumnar(SeriesStoreBase):
+    """Price series aligned on a common time grid
+
+    Observation times are stored as a sorted int64 array of nanoseconds since the epoch, prices as a 2-D
+    float64 matrix with one column per edge. Missing observations are NaN.
+    """
+
+    def __init__(
+        self,
+        times: Sequence[int],
+        edges: Sequence[Tuple[str, str]],
+        prices: Sequence[Sequence[float]],
+    ):
+        self._set_data(times, edges, prices)
+
+    def _set_data(
+        self,
+        times: Sequence[int],
+        edges: Sequence[Tuple[str, str]],
+        prices: Sequence[Sequence[float]],
+    ) -> None:
+        self._times = np.array(times, dtype=np.int64)
+        self._prices = np.array(prices, dtype=np.float64).reshape(len(self._times), len(edges))
+        self._edges = [tuple(edge) for edge in edges]
+        self._edge_index = {edge: i for i, edge in enumerate(self._edges)}
+        if len(self._edge_index) != len(self._edges):
+            raise ValueError(f'Duplicate edges provided: {self._edges}')
+        if len(self._times) > 1 and not np.all(np.diff(self._times) > 0):
+            raise ValueError('Observation times must be strictly increasing')
+
+    @classmethod
+    def from_dict(cls, data: SeriesStoreData) -> 'SeriesStoreColumnar':
+        edges = list(data)
+        series_ns = {
+            edge: {time_to_ns(checked_time(t)): x for t, x in data[edge]} for edge in edges
+        }
+        times = np.array(sorted(set().union(*series_ns.values())), dtype=np.int64)
+        prices = np.full((len(times), len(edges)), np.nan)
+        for j, edge in enumerate(edges):
+            if not series_ns[edge]:
+                continue
+            edge_times = np.fromiter(series_ns[edge].keys(), dtype=np.int64)
+            edge_prices = np.fromiter(series_ns[edge].values(), dtype=np.float64)
+            prices[np.searchsorted(times, edge_times), j] = edge_prices
+        return cls(times, edges, prices)
+
+    @classmethod
+    def from_series_store(cls, series_store: SeriesStoreBase) -> 'SeriesStoreColumnar':
+        if isinstance(series_store, SeriesStoreColumnar):
+            return series_store
+        return cls.from_dict({edge: series_store[edge] for edge in series_store.edges()})
+
+    @property
+    def times(self) -> np.ndarray:
+        """Observation times in nanoseconds since the epoch"""
+        return self._times
+
+    @property
+    def prices(self) -> np.ndarray:
+        """Price matrix: one row per observation time, one column per edge"""
+        return self._prices
+
+    def edge_list(self) -> List[Tuple[str, str]]:
+        """Edges in column order"""
+        return list(self._edges)
+
+    def __getitem__(self, key: Tuple[str, str]) -> Optional[List[Tuple[datetime.datetime, float]]]:
+        j = self._edge_index.get(key)
+        if j is None:
+            return None
+        column = self._prices[:, j]
+        observed = ~np.isnan(column)
+        times = self._times[observed].tolist()
+        return list(zip((ns_to_time(t) for t in times), column[observed].tolist()))
+
+    def __setitem__(self, edge: Tuple[str, str], series: Iterable[Tuple[datetime.datetime, float]]):
+        data = {e: self[e] for e in self._edges}
+        data[edge] = list(series)
+        other = self.from_dict(data)
+        self._set_data(other._times, other._edges, other._prices)
+
+    def edges(self) -> Iterable[Tuple[str, str]]:
+        """Return all tradeable edges (numeraire pairs)"""
+        return set(self._edges)
+
+    def vertices(self) -> Set[str]:
+        return set([edge[0] for edge in self._edges] + [edge[1] for edge in self._edges])
+
+    def add_inverse_series(self) -> None:
+        """For every numeraire pair (num0, num1) generate prices for (num1, num0) under zero-spread assumption"""
+        inverse_edges = []
+        inverse_columns = []
+        for j, (num0, num1) in enumerate(self._edges):
+            key = (num1, num0)
+            if key not in self._edge_index and key not in inverse_edges:
+                inverse_edges.append(key)
+                inverse_columns.append(1.0 / self._prices[:, j])
+        if not inverse_edges:
+            return
+        prices = np.column_stack([self._prices] + inverse_columns)
+        self._set_data(self._times, self._edges + inverse_edges, prices)
+
+    def get_min_time(self) -> datetime.datetime:
+        """Return the earliest time for which we have at least one observation"""
+        observed = np.flatnonzero(~np.all(np.isnan(self._prices), axis=1))
+        return ns_to_time(int(self._times[observed[0]]))
+
+    def get_max_time(self) -> datetime.datetime:
+        """Return the last time for which we have at least one observation"""
+        observed = np.flatnonzero(~np.all(np.isnan(self._prices), axis=1))
+        return ns_to_time(int(self._times[observed[-1]]))
+
+    def iter_series(
+        self, edge: Tuple[str, str], start_time: Time = MIN_TIME
+    ) -> Iterator[Tuple[datetime.datetime, float]]:
+        """Iterate over the observations of an edge, starting with the first one not before start_time"""
+        return ((ns_to_time(t), x) for t, x in self.iter_series_ns(edge, start_time))
+
+    def iter_series_ns(
+        self, edge: Tuple[str, str], start_time: Time = MIN_TIME
+    ) -> Iterator[Tuple[int, float]]:
+        """Like iter_series(), but with observation times in nanoseconds since the epoch"""
+        j = self._edge_index.get(edge)
+        if j is None:
+            return iter(())
+        i = int(np.searchsorted(self._times, time_to_ns(start_time)))
+        column = self._prices[i:, j]
+        observed = ~np.isnan(column)
+        return zip(self._times[i:][observed].tolist(), column[observed].tolist())
+
+
+class SeriesStoreMemmap(SeriesStoreBase):
+    """Price series stored on disk and accessed through memory maps
+
+    Every edge is stored in two `.npy` files in the store directory: int64 observation times (nanoseconds
+    since the epoch) and float64 prices. The file `index.json` lists the edges together with their number of
+    observations and time bounds, so that the store can be opened without touching the series data.
+
+    The series are paged in by the operating system only when they are read, so `get_window()` and
+    `iter_series()` touch only the pages covering the requested time range. Several processes opening the
+    same store share the page cache.
+    """
+
+    INDEX_FILE_NAME = 'index.json'
+    FORMAT_VERSION = 1
+    CHUNK_SIZE = 4096
+
+    def __init__(self, path: str):
+        self._path = path
+        index_path = os.path.join(path, self.INDEX_FILE_NAME)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+            if index['version'] != self.FORMAT_VERSION:
+                raise ValueError(f'Unsupported series store format version: {index["version"]}')
+        else:
+            os.makedirs(path, exist_ok=True)
+            index = {'version': self.FORMAT_VERSION, 'edges': []}
+        self._index: Dict[Tuple[str, str], Dict] = {
+            (entry['num0'], entry['num1']): entry for entry in index['edges']
+        }
+        self._arrays: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __getstate__(self) -> Dict:
+        # don't pickle memory maps, they are reopened lazily (e.g. by worker processes)
+        state = dict(self.__dict__)
+        state['_arrays'] = {}
+        return state
+
+    @classmethod
+    def create(cls, path: str, series_store: SeriesStoreBase) -> 'SeriesStoreMemmap':
+        """Write all series from another store to path"""
+        store = cls(path)
+        for edge in series_store.edges():
+            store[edge] = series_store[edge]
+        return store
+
+    def _write_index(self) -> None:
+        index = {'version': self.FORMAT_VERSION, 'edges': list(self._index.values())}
+        tmp_path = os.path.join(self._path, self.INDEX_FILE_NAME + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp_path, os.path.join(self._path, self.INDEX_FILE_NAME))
+
+    def _load(self, edge: Tuple[str, str]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        if edge not in self._index:
+            return None
+        if edge not in self._arrays:
+            entry = self._index[edge]
+            times = np.load(os.path.join(self._path, entry['times_file']), mmap_mode='r')
+            prices = np.load(os.path.join(self._path, entry['prices_file']), mmap_mode='r')
+            self._arrays[edge] = (times, prices)
+        return self._arrays[edge]
+
+    def __getitem__(self, key: Tuple[str, str]) -> Optional[List[Tuple[datetime.datetime, float]]]:
+        if key not in self._index:
+            return None
+        return list(self.iter_series(key))
+
+    def __setitem__(self, edge: Tuple[str, str], series: Iterable[Tuple[datetime.datetime, float]]):
+        series = sorted(series, key=operator.itemgetter(0))
+        times = np.array([time_to_ns(checked_time(t)) for t, _ in series], dtype=np.int64)
+        prices = np.array([x for _, x in series], dtype=np.float64)
+
+        entry = self._index.get(edge)
+        if entry is None:
+            file_id = len(self._index)
+            entry = {
+                'num0': edge[0],
+                'num1': edge[1],
+                'times_file': f'{file_id}.times.npy',
+                'prices_file': f'{file_id}.prices.npy',
+            }
+        self._arrays.pop(edge, None)
+        np.save(os.path.join(self._path, entry['times_file']), times)
+        np.save(os.path.join(self._path, entry['prices_file']), prices)
+        entry['size'] = len(times)
+        entry['min_time'] = int(times[0]) if len(times) else None
+        entry['max_time'] = int(times[-1]) if len(times) else None
+        self._index[edge] = entry
+        self._write_index()
+
+    def edges(self) -> Iterable[Tuple[str, str]]:
+        """Return all tradeable edges (numeraire pairs)"""
+        return set(self._index)
+
+    def vertices(self) -> Set[str]:
+        return set([edge[0] for edge in self._index] + [edge[1] for edge in self._index])
+
+    def add_inverse_series(self) -> None:
+        """For every numeraire pair (num0, num1) generate prices for (num1, num0) under zero-spread assumption"""
+        for num0, num1 in list(self._index):
+            if (num1, num0) not in self._index:
+                self[(num1, num0)] = [(t, 1.0 / w) for t, w in self.iter_series((num0, num1))]
+
+    def get_min_time(self) -> datetime.datetime:
+        """Return the earliest time for which we have at least one observation"""
+        return ns_to_time(min(e['min_time'] for e in self._index.values() if e['size']))
+
+    def get_max_time(self) -> datetime.datetime:
+        """Return the last time for which we have at least one observation"""
+        return ns_to_time(max(e['max_time'] for e in self._index.values() if e['size']))
+
+    def get_window(
+        self, edge: Tuple[str, str], start_time: Time = MIN_TIME, end_time: Time = MAX_TIME
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return read-only views of observation times (ns) and prices in [start_time, end_time]"""
+        arrays = self._load(edge)
+        if arrays is None:
+            raise KeyError(f'Edge not found: {edge}')
+        times, prices = arrays
+        i = int(np.searchsorted(times, time_to_ns(start_time), side='left'))
+        j = int(np.searchsorted(times, time_to_ns(end_time), side='right'))
+        return times[i:j], prices[i:j]
+
+    def iter_series(
+        self, edge: Tuple[str, str], start_time: Time = MIN_TIME
+    ) -> Iterator[Tuple[datetime.datetime, float]]:
+        """Iterate over the observations of an edge, starting with the first one not before start_time"""
+        for t, x in self.iter_series_ns(edge, start_time):
+            yield ns_to_time(t), x
+
+    def iter_series_ns(
+        self, edge: Tuple[str, str], start_time: Time = MIN_TIME
+    ) -> Iterator[Tuple[int, float]]:
+        """Like iter_series(), but with observation times in nanoseconds since the epoch"""
+        arrays = self._load(edge)
+        if arrays is None:
+            return
+        times, prices = arrays
+        i = int(np.searchsorted(times, time_to_ns(start_time)))
+        for j in range(i, len(times), self.CHUNK_SIZE):
+            yield from zip(
+                times[j : j + self.CHUNK_SIZE].tolist(), prices[j : j + self.CHUNK_SIZE].tolist()
+            )
+
+
 class Filter:
-    """Filter consumes an Order and produces arbitrary number of Orders"""
+    """Filter consumes an Order and produces arbitrary number of Orders
+
+    While a filter runs, `broker_state.active_orders` is a read-only OrderChainView of the resting orders
+    followed by the orders of the current batch. It supports iteration, len(), `in`, indexing and the
+    lookups of OrderBook (get_by_gid, get_by_account, get_by_class, count_by_class), but no modifications.
+    Filters emit new orders by returning them.
+    """
 
     def __call__(self, broker_state: BrokerState, order: Order) -> Union[Order, Iterable[Order]]:
         pass
 
 
+class OrderChainView:
+    """Read-only view of several order collections, iterated one after another without copying
+
+    The lookups of OrderBook use the indexes of OrderBook parts and scan the other parts, which only hold
+    the orders of one batch.
+    """
+
+    def __init__(self, *parts: Iterable[Order]):
+        self._parts = parts
+
+    def _books(self) -> Iterator[OrderBook]:
+        for part in self._parts:
+            yield part if isinstance(part, OrderBook) else OrderBook(part)
+
+    def get_by_gid(self, gid: int) -> List[Order]:
+        return [order for book in self._books() for order in book.get_by_gid(gid)]
+
+    def get_by_account(self, account: str) -> List[Order]:
+        return [order for book in self._books() for order in book.get_by_account(account)]
+
+    def get_by_class(self, class_name: str) -> List[Order]:
+        return [order for book in self._books() for order in book.get_by_class(class_name)]
+
+    def count_by_class(self) -> Dict[str, int]:
+        counts = defaultdict(int)
+        for book in self._books():
+            for class_name, count in book.count_by_class().items():
+                counts[class_name] += count
+        return dict(counts)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Order, List[Order]]:
+        if isinstance(index, int) and index >= 0:
+            for order in itertools.islice(self, index, None):
+                return order
+            raise IndexError('OrderChainView index out of range')
+        return list(self)[index]
+
+    def __iter__(self) -> Iterator[Order]:
+        return itertools.chain.from_iterable(self._parts)
+
+    def __len__(self) -> int:
+        return sum(len(part) for part in self._parts)
+
+    def __contains__(self, order: Order) -> bool:
+        return any(order in part for part in self._parts)
+
+
 class TransactionCostFilter(Filter):
     def __init__(self, cost_account: str, cost: float, cost_var: str, excluded_accounts: List[str]):
         self.cost_account = cost_account
@@ -116,6 +479,11 @@ class BrokerSimulator(AbstractBrokerConn):
         start_time_not_before: datetime.datetime = MIN_TIME,
         additional_times: Optional[Sequence[Time]] = None,
         silent: bool = False,
+        columnar: bool = False,
+        streaming: bool = False,
+        end_time_not_after: datetime.datetime = MAX_TIME,
+        cursor_state: Optional[Dict[str, Any]] = None,
+        profiler: Optional[PhaseProfiler] = None,
     ):
         """
         Trading times: By default, the simulator calculates the time grid from observation times of all available
@@ -126,117 +494,320 @@ class BrokerSimulator(AbstractBrokerConn):
         * Submit orders before the trading starts.
         * Submit and execute order that do not require market data to do so, e.g. `CreateAccountOrder`.
 
+        Times are kept as int64 nanoseconds since the epoch internally (see `primitives.time_to_ns`) and are
+        converted to datetimes only when they are handed to the broker state.
+
+        Columnar mode: If a `SeriesStoreColumnar` is passed or `columnar` is set, the prices are kept in a
+        single matrix and every tick fills `current_prices` from one row of it, instead of looking up
+        every edge in a dict.
+
+        Streaming mode: The time grid is not materialised. Instead, the per-edge iterators returned by
+        `SeriesStoreBase.iter_series()` are merged lazily (k-way heap merge), starting at
+        `start_time_not_before`. Memory use is bounded by the number of edges. The time index counts from the
+        earliest observation like in the other modes, so the observation times before `start_time_not_before`
+        (or before a resumed cursor) are merged once at startup, without their prices.
+
         :param silent: Suppress logging messages
+        :param columnar: Convert the series store to a `SeriesStoreColumnar` and use the columnar mode
+        :param streaming: Use the streaming mode
+        :param end_time_not_after: Supremum for the trading times grid
+        :param cursor_state: Resume at a time cursor saved with `get_cursor_state()`. The simulator is positioned
+            at the saved tick, so it can be used with a `Broker` restored from the broker state saved at that tick.
+        :param profiler: Time the 'simulator.*' phases, see rhizopus.profiling
         """
         self.filters = filters
         self._default_numeraire = checked_str_id(default_numeraire)
         self._start_time = checked_time(start_time_not_before)
-        self._prices = {}
+        self._end_time = checked_time(end_time_not_after)
+        self._start_ns = time_to_ns(self._start_time)
+        self._end_ns = time_to_ns(self._end_time)
+        self._prices: Dict[Tuple[str, str], Dict[int, float]] = {}
+        self._columnar_store: Optional[SeriesStoreColumnar] = None
+        self._streaming = streaming
+        self._time_index = 0
+        self._group_id = 0
+        self.silent = silent
+        self.profiler = profiler
+
+        resume_time = None
+        if cursor_state is not None:
+            resume_time = maybe_deserialize_time(cursor_state['now'])
+            self._group_id = checked_int_id(cursor_state['group_id'])
+
+        if streaming:
+            start_time = resume_time or self._start_time
+            self._init_streaming(series_store, additional_times, start_time)
+            self._time_index = self._count_grid_times_before(
+                series_store, additional_times, time_to_ns(start_time)
+            )
+            if resume_time is not None:
+                # drop the observations of the saved tick, they are already in the broker state
+                resume_ns = time_to_ns(resume_time)
+                if (
+                    self._time_index != cursor_state['time_index']
+                    or self._pop_stream_tick() != resume_ns
+                ):
+                    raise ValueError(f'Cursor state does not match the time grid: {cursor_state}')
+                return
+            # the grid position before the first tick, like in the materialised modes below
+            if self._pop_stream_tick() is None:
+                raise ValueError('Generated an empty time grid')
+            return
+        if columnar or isinstance(series_store, SeriesStoreColumnar):
+            self._init_columnar(
+                SeriesStoreColumnar.from_series_store(series_store), additional_times
+            )
+        else:
+            self._init_dict(series_store, additional_times)
+        grid = self._time_grid[: np.searchsorted(self._time_grid, self._end_ns, side='right')]
+        if len(grid) == 0 or self._start_ns > grid[-1]:
+            raise ValueError('Generated an empty time grid')
+        self._time_grid: np.ndarray = grid
+
+        if resume_time is not None:
+            resume_ns = time_to_ns(resume_time)
+            self._time_index = int(np.searchsorted(grid, resume_ns))
+            if (
+                self._time_index != cursor_state['time_index']
+                or self._time_index >= len(grid)
+                or grid[self._time_index] != resume_ns
+            ):
+                raise ValueError(f'Cursor state does not match the time grid: {cursor_state}')
+            return
+        self._time_index = int(np.searchsorted(grid, self._start_ns))
 
+    def _init_dict(
+        self, series_store: SeriesStoreBase, additional_times: Optional[Sequence[Time]]
+    ) -> None:
+        time_ns: Dict[Time, int] = {}
         for num_pair in series_store.edges():
             num0 = num_pair[0]
             num1 = num_pair[1]
-            series = series_store[num_pair]
-            self._prices[(num0, num1)] = dict(series)
+            series = series_store[num_pair] or []
+            # edges share most of their observation times, so every time is converted once
+            missing = [t for t, _ in series if t not in time_ns]
+            time_ns.update((t, time_to_ns(t)) for t in missing)
+            self._prices[(num0, num1)] = {time_ns[t]: x for t, x in series}
 
-        self._time_grid = set()
-        for key in self._prices:
-            for times in self._prices[key]:
-                self._time_grid.add(times)
+        grid = set(time_ns.values())
         if additional_times:
-            for t in additional_times:
-                self._time_grid.add(checked_time(t))
-        if self._start_time > max(self._time_grid):
-            raise ValueError('Generated an empty time grid')
-        self._time_grid = list(sorted(self._time_grid))
-        self._time_index = 0
-        self._group_id = 0
-        self.silent = silent
-
-        for self._time_index in range(len(self._time_grid)):
-            if self._time_grid[self._time_index] >= self._start_time:
-                break
+            grid.update(time_to_ns(checked_time(t)) for t in additional_times)
+        self._time_grid = np.array(sorted(grid), dtype=np.int64)
+
+    def _init_columnar(
+        self, series_store: SeriesStoreColumnar, additional_times: Optional[Sequence[Time]]
+    ) -> None:
+        self._columnar_store = series_store
+        store_times = series_store.times
+        grid = store_times
+        if additional_times:
+            extra = np.array(
+                [time_to_ns(checked_time(t)) for t in additional_times], dtype=np.int64
+            )
+            grid = np.union1d(store_times, extra)
+        # row cursor: maps time grid indices to price matrix rows, -1 for times without observations
+        rows = np.searchsorted(store_times, grid)
+        in_store = rows < len(store_times)
+        in_store[in_store] = store_times[rows[in_store]] == grid[in_store]
+        self._rows = np.where(in_store, rows, -1)
+        self._edge_array = np.empty(len(series_store.edge_list()), dtype=object)
+        self._edge_array[:] = series_store.edge_list()
+        self._time_grid = grid
+
+    def _init_streaming(
+        self,
+        series_store: SeriesStoreBase,
+        additional_times: Optional[Sequence[Time]],
+        start_time: Time,
+    ) -> None:
+        self._stream_edges = sorted(series_store.edges())
+        self._streams = [
+            series_store.iter_series_ns(edge, start_time) for edge in self._stream_edges
+        ]
+        if additional_times:
+            extra = sorted(time_to_ns(checked_time(t)) for t in additional_times if t >= start_time)
+            self._streams.append(((t, math.nan) for t in extra))
+        self._stream_heap = []
+        for i in range(len(self._streams)):
+            self._push_stream(i)
+        self._stream_prices: Dict[Tuple[str, str], float] = {}
+        self._stream_exhausted = False
+
+    def _count_grid_times_before(
+        self,
+        series_store: SeriesStoreBase,
+        additional_times: Optional[Sequence[Time]],
+        time_ns: int,
+    ) -> int:
+        """Number of distinct observation and additional times before time_ns, i.e. its time grid index"""
+        streams = [
+            itertools.takewhile(
+                lambda t: t < time_ns, (t for t, _ in series_store.iter_series_ns(edge))
+            )
+            for edge in self._stream_edges
+        ]
+        if additional_times:
+            extra = (time_to_ns(checked_time(t)) for t in additional_times)
+            streams.append(iter(sorted(t for t in extra if t < time_ns)))
+        count, last = 0, None
+        for t in heapq.merge(*streams):
+            if t != last:
+                count, last = count + 1, t
+        return count
+
+    def _push_stream(self, i: int) -> None:
+        observation = next(self._streams[i], None)
+        if observation is not None:
+            heapq.heappush(self._stream_heap, (observation[0], i, observation[1]))
+
+    def _pop_stream_tick(self) -> Optional[int]:
+        """Pop all observations with the earliest time from the merged streams and return that time"""
+        if not self._stream_heap or self._stream_heap[0][0] > self._end_ns:
+            return None
+        now = self._now_ns = self._stream_heap[0][0]
+        self._stream_prices = {}
+        num_edges = len(self._stream_edges)
+        while self._stream_heap and self._stream_heap[0][0] == now:
+            _, i, x = heapq.heappop(self._stream_heap)
+            if i < num_edges:
+                self._stream_prices[self._stream_edges[i]] = x
+            self._push_stream(i)
+        return now
 
     def get_default_numeraire(self) -> Optional[str]:
         return self._default_numeraire
 
+    def get_cursor_state(self) -> Dict[str, Any]:
+        """Serializable position of the simulator, see the `cursor_state` constructor parameter"""
+        if self._streaming:
+            now_ns = self._now_ns
+        else:
+            now_ns = int(self._time_grid[min(self._time_index, len(self._time_grid) - 1)])
+        return {
+            'time_index': self._time_index,
+            'group_id': self._group_id,
+            'now': maybe_serialize_time(ns_to_time(now_ns)),
+        }
+
     def next(self, broker_state: BrokerState) -> Optional[Time]:
         self._time_index += 1
-        if len(self._time_grid) < self._time_index:
-            raise BrokerError('Backtest end of time reached')
-        if len(self._time_grid) == self._time_index:
-            return None
+        if self._streaming:
+            if self._stream_exhausted:
+                raise BrokerError('Backtest end of time reached')
+            now_ns = self._pop_stream_tick()
+            if now_ns is None:
+                self._stream_exhausted = True
+                return None
+        else:
+            if len(self._time_grid) < self._time_index:
+                raise BrokerError('Backtest end of time reached')
+            if len(self._time_grid) == self._time_index:
+                return None
+            now_ns = int(self._time_grid[self._time_index])
         broker_state.time_index = self._time_index
-        broker_state.now = self._time_grid[self._time_index]
+        broker_state.now = ns_to_time(now_ns)
         broker_state.default_numeraire = self._default_numeraire
 
-        self._update_current_prices(broker_state)
+        profiler = self.profiler
+        start_ns = profiler.now() if profiler is not None else 0
+        self._update_current_prices(broker_state, now_ns)
+        if profiler is not None:
+            start_ns = profiler.lap('simulator.update_prices', start_ns)
         self._process_orders(broker_state)
+        if profiler is not None:
+            profiler.lap('simulator.process_orders', start_ns)
         return broker_state.now
 
-    def _update_current_prices(self, broker_state: BrokerState) -> None:
+    def _update_current_prices(self, broker_state: BrokerState, now_ns: int) -> None:
         broker_state.current_prices.clear()
-        for key in self._prices:
-            if broker_state.now in self._prices[key]:
-                broker_state.current_prices[key] = self._prices[key][broker_state.now]
+        if self._streaming:
+            broker_state.current_prices.update(self._stream_prices)
+            return
+        if self._columnar_store is not None:
+            row = self._rows[self._time_index]
+            if row < 0:
+                return
+            values = self._columnar_store.prices[row]
+            observed = np.flatnonzero(~np.isnan(values))
+            broker_state.current_prices.update(
+                zip(self._edge_array[observed].tolist(), values[observed].tolist())
+            )
+            return
+        for key, series in self._prices.items():
+            price = series.get(now_ns)
+            if price is not None:
+                broker_state.current_prices[key] = price
 
     def _process_orders(self, broker_state: BrokerState) -> None:
-        postponed_orders = []
-        for order in sorted(broker_state.active_orders, key=lambda o: o.age):
+        """Execute the active orders, oldest first. Postponed orders age by one tick."""
+        active_orders = broker_state.active_orders
+        time_str = None if self.silent else broker_state.now.strftime('%Y-%m-%d %H:%M:%S')
+        finished_orders = []
+        for order in list(active_orders):
             new_status = order.execute(broker_state)
-            time_str = broker_state.now.strftime('%Y-%m-%d %H:%M:%S')
             if new_status == OrderStatus.EXECUTED:
-                broker_state.executed_orders.append(order)
+                active_orders.remove(order)
+                finished_orders.append(order)
                 if not self.silent:
                     logger.info(f"{time_str} T{broker_state.time_index} : Exec: {str(order)}")
             elif new_status == OrderStatus.ACTIVE:
-                order.age += 1
-                if order.age % 128 == 0 and not self.silent:
+                if (order.age + 1) % 128 == 0 and not self.silent:
                     logger.debug(f"{time_str} T{broker_state.time_index}: Delay: {str(order)}")
-                postponed_orders.append(order)
             else:
-                broker_state.rejected_orders.append(order)
-
-        broker_state.active_orders.clear()
-        broker_state.active_orders.extend(postponed_orders)
+                active_orders.remove(order)
+                finished_orders.append(order)
+        broker_state.record_executions(finished_orders)
+        active_orders.increment_ages()
 
     def fill_order(self, order, broker_state: BrokerState) -> None:
-        """Applies filters to filled orders and appends the result to active_orders queue
+        """Applies filters to a filled order and appends the result to active_orders queue"""
+        self.fill_orders([order], broker_state)
+
+    def fill_orders(self, orders: Sequence[Order], broker_state: BrokerState) -> None:
+        """Applies filters to a batch of filled orders and appends the result to active_orders queue
 
-        As the orders pass through the filter chain, they need to be dynamically added
-        and removed from the active_orders queue. This is necessary because filters use that
-        queue.
+        Every order gets its own group id. The batch passes through the filter chain at once: each
+        filter processes all orders emitted by the previous one. While a filter runs, active_orders is
+        a read-only OrderChainView of the resting orders followed by the batch orders waiting for, and
+        already emitted by, the current filter.
         """
-        order.gid = self._get_group_id()
+        profiler = self.profiler
+        if profiler is None:
+            self._run_filter_chain(orders, broker_state)
+            return
+        start_ns = profiler.now()
+        self._run_filter_chain(orders, broker_state)
+        profiler.lap('simulator.fill_orders', start_ns)
+
+    def _run_filter_chain(self, orders: Sequence[Order], broker_state: BrokerState) -> None:
+        for order in orders:
+            order.gid = self._get_group_id()
+        active_orders = broker_state.active_orders
         if not self.filters:
-            broker_state.active_orders.append(order)
+            active_orders.extend(orders)
             return
 
-        active_orders_snapshot = list(broker_state.active_orders)
-        filter_input_orders = deque()
-        filter_input_orders.append(order)
-        for f in self.filters:
-            filter_output_orders = deque()
-            while filter_input_orders:
-                input_order = filter_input_orders.popleft()
-                broker_state.active_orders = list(
-                    itertools.chain(
-                        active_orders_snapshot,
-                        filter_input_orders,
-                        filter_output_orders,
-                    )
+        filter_input_orders = deque(orders)
+        try:
+            for f in self.filters:
+                filter_output_orders = deque()
+                broker_state.active_orders = OrderChainView(
+                    active_orders, filter_input_orders, filter_output_orders
                 )
-                output_orders = f(broker_state, input_order)
-
-                if not output_orders:
-                    continue
-                try:
-                    filter_output_orders.extend(output_orders)
-                except TypeError:
-                    filter_output_orders.append(output_orders)
-            filter_input_orders = filter_output_orders
-        broker_state.active_orders = deque(active_orders_snapshot, maxlen=1000)
-        broker_state.active_orders.extend(filter_input_orders)
+                while filter_input_orders:
+                    input_order = filter_input_orders.popleft()
+                    output_orders = f(broker_state, input_order)
+
+                    if not output_orders:
+                        continue
+                    try:
+                        filter_output_orders.extend(output_orders)
+                    except TypeError:
+                        filter_output_orders.append(output_orders)
+                filter_input_orders = filter_output_orders
+        finally:
+            broker_state.active_orders = active_orders
+        active_orders.extend(filter_input_orders)
 
     def _get_group_id(self) -> int:
         self._group_id += 1
@@ -0,0 +1,188 @@
+import json
+import math
+import os
+import tempfile
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rhizopus.primitives import time_to_ns
+
+# column name -> array typecode
+LEDGER_COLUMNS = {
+    'time_index': 'q',
+    'time': 'q',  # nanoseconds since the epoch
+    'gid': 'q',
+    'status': 'b',  # OrderStatus value
+    'class_id': 'i',
+    'acc0_id': 'i',
+    'acc1_id': 'i',
+    'amount': 'd',
+    'amount_num_id': 'i',
+    'rec_price_a': 'd',
+    'rec_price_b': 'd',
+    'comment_id': 'i',
+}
+NO_STRING_ID = -1
+# columns filled from the orders, in the order of the values returned by _order_row()
+ROW_COLUMNS = tuple(name for name in LEDGER_COLUMNS if name != 'time_index')
+STRING_COLUMNS = frozenset(('class_id', 'acc0_id', 'acc1_id', 'amount_num_id', 'comment_id'))
+# in-memory chunks are written to disk beyond this number of bytes
+DEFAULT_MEMORY_BUDGET = 64 * 2**20
+
+
+class ExecutionLedger:
+    """Append-only columnar log of executed and rejected orders
+
+    Every finished order becomes one row. Strings (order class names, accounts, numeraires, status comments)
+    are stored as ids into the `strings` table, NO_STRING_ID marks a missing value. The orders of a tick are
+    appended as one batch to typed arrays, which are moved to numpy chunks once `chunk_size` rows are
+    buffered. The chunks are kept in memory until they exceed `memory_budget` bytes, then all chunks are
+    written to `spill_dir`, or to a temporary directory removed together with the ledger if `spill_dir` is
+    not set. With a `spill_dir` every chunk is written to disk right away, so the history is not bounded by
+    memory.
+    """
+
+    STRINGS_FILE_NAME = 'strings.json'
+
+    def __init__(
+        self,
+        spill_dir: Optional[str] = None,
+        chunk_size: int = 65536,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    ):
+        if chunk_size < 1:
+            raise ValueError(f'Chunk size must be positive: {chunk_size}')
+        self.spill_dir = spill_dir
+        self.chunk_size = chunk_size
+        self.memory_budget = memory_budget
+        self.strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._buffer = {name: array(typecode) for name, typecode in LEDGER_COLUMNS.items()}
+        self._chunks: List[Dict[str, np.ndarray]] = []
+        self._chunk_bytes = 0
+        self._num_spilled_chunks = 0
+        self._num_rows = 0
+        self._tmp_dir: Optional[tempfile.TemporaryDirectory] = None
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _string_id(self, s: Optional[str]) -> int:
+        if s is None:
+            return NO_STRING_ID
+        string_id = self._string_ids.get(s)
+        if string_id is None:
+            string_id = self._string_ids[s] = len(self.strings)
+            self.strings.append(s)
+        return string_id
+
+    def append(self, order, time_index: int) -> None:
+        """Record a finished order"""
+        self.append_batch([order], time_index)
+
+    def append_batch(self, orders: Sequence, time_index: int) -> None:
+        """Record the orders finished in one tick"""
+        if not orders:
+            return
+        rows = [_order_row(order) for order in orders]
+        buffer = self._buffer
+        buffer['time_index'].extend([time_index] * len(rows))
+        for name, values in zip(ROW_COLUMNS, zip(*rows)):
+            if name == 'time':
+                # orders finished in one tick share a few time stamps
+                time_ns = {t: time_to_ns(t) for t in set(values)}
+                values = [time_ns[t] for t in values]
+            elif name in STRING_COLUMNS:
+                values = [self._string_id(v) for v in values]
+            buffer[name].extend(values)
+        self._num_rows += len(rows)
+        if len(buffer['gid']) >= self.chunk_size:
+            self._move_buffer_to_chunk()
+
+    def _move_buffer_to_chunk(self) -> None:
+        if not self._buffer['gid']:
+            return
+        chunk = {name: np.array(column) for name, column in self._buffer.items()}
+        self._buffer = {name: array(typecode) for name, typecode in LEDGER_COLUMNS.items()}
+        self._chunks.append(chunk)
+        self._chunk_bytes += sum(column.nbytes for column in chunk.values())
+        if self.spill_dir is None and self._chunk_bytes > self.memory_budget:
+            self._tmp_dir = tempfile.TemporaryDirectory(prefix='rhizopus_ledger_')
+            self.spill_dir = self._tmp_dir.name
+        if self.spill_dir is not None:
+            self._spill_chunks()
+
+    def _spill_chunks(self) -> None:
+        for chunk in self._chunks:
+            np.savez(self._chunk_path(self._num_spilled_chunks), **chunk)
+            self._num_spilled_chunks += 1
+        self._chunks.clear()
+        self._chunk_bytes = 0
+        self._write_strings()
+
+    def _chunk_path(self, i: int) -> str:
+        return os.path.join(self.spill_dir, f'chunk_{i:06d}.npz')
+
+    def _write_strings(self) -> None:
+        with open(os.path.join(self.spill_dir, self.STRINGS_FILE_NAME), 'w') as f:
+            json.dump({'strings': self.strings, 'num_chunks': self._num_spilled_chunks}, f)
+
+    def flush(self) -> None:
+        """Write all buffered rows to the spill directory"""
+        if self.spill_dir is None:
+            raise ValueError('Ledger without spill directory can not be flushed')
+        self._move_buffer_to_chunk()
+        self._spill_chunks()
+
+    @classmethod
+    def load(cls, spill_dir: str) -> 'ExecutionLedger':
+        """Open a flushed ledger for reading and further appends"""
+        with open(os.path.join(spill_dir, cls.STRINGS_FILE_NAME)) as f:
+            index = json.load(f)
+        ledger = ExecutionLedger(spill_dir)
+        for s in index['strings']:
+            ledger._string_id(s)
+        ledger._num_spilled_chunks = index['num_chunks']
+        for i in range(ledger._num_spilled_chunks):
+            with np.load(ledger._chunk_path(i)) as chunk:
+                ledger._num_rows += len(chunk['gid'])
+        return ledger
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Return all rows as one numpy array per column"""
+        chunks = []
+        for i in range(self._num_spilled_chunks):
+            with np.load(self._chunk_path(i)) as chunk:
+                chunks.append({name: chunk[name] for name in LEDGER_COLUMNS})
+        chunks.extend(self._chunks)
+        chunks.append({name: np.array(column) for name, column in self._buffer.items()})
+        return {
+            name: np.concatenate([chunk[name] for chunk in chunks]).astype(typecode, copy=False)
+            for name, typecode in LEDGER_COLUMNS.items()
+        }
+
+    def __len__(self) -> int:
+        return self._num_rows
+
+
+def _order_row(order) -> Tuple:
+    """Column values of a finished order, strings are not converted to ids yet"""
+    amount, amount_num = getattr(order, 'amount', (getattr(order, 'value', math.nan), None))
+    return (
+        order.status_time_stamp,
+        order.gid,
+        order.status.value,
+        type(order).__name__,
+        getattr(order, 'acc0', None) or getattr(order, 'account_name', None),
+        getattr(order, 'acc1', None),
+        float(amount) if isinstance(amount, (int, float)) else math.nan,
+        amount_num,
+        _price_or_nan(getattr(order, 'rec_price_a', None)),
+        _price_or_nan(getattr(order, 'rec_price_b', None)),
+        order.status_comment or None,
+    )
+
+
+def _price_or_nan(price: Optional[float]) -> float:
+    return math.nan if price is None else float(price)
@@ -1,4 +1,5 @@
 import math
+import sys
 from typing import Dict, Union, Any
 
 from rhizopus.broker import BrokerError, BrokerState, Order, OrderStatus
@@ -6,7 +7,7 @@ from rhizopus.price_graph import get_price_from_dict
 from rhizopus.primitives import (
     Amount,
     checked_amount,
-    checked_str_id,
+    interned_str_id,
     checked_real,
     Time,
     MIN_TIME,
@@ -19,10 +20,17 @@ from rhizopus.primitives import (
 )
 
 
+def _interned_amount(amount: Amount) -> Amount:
+    value, num = checked_amount(tuple(amount))
+    return value, sys.intern(num)
+
+
 class ObserveInstrumentOrder(Order):
+    __slots__ = ('instrument',)
+
     def __init__(self, instrument: str, **kwargs):
         super().__init__(**kwargs)
-        self.instrument = checked_str_id(instrument)
+        self.instrument = interned_str_id(instrument)
 
     def execute(self, broker_state: BrokerState) -> OrderStatus:
         raise NotImplementedError
@@ -39,10 +47,12 @@ class ObserveInstrumentOrder(Order):
 
 
 class CreateAccountOrder(Order):
+    __slots__ = ('account_name', 'amount')
+
     def __init__(self, account_name: str, amount: Amount, **kwargs):
         super().__init__(**kwargs)
-        self.account_name = checked_str_id(account_name)
-        self.amount = checked_amount(tuple(amount))
+        self.account_name = interned_str_id(account_name)
+        self.amount = _interned_amount(amount)
 
     def execute(self, broker_state: BrokerState) -> OrderStatus:
         if self.account_name in broker_state.accounts.keys():
@@ -79,9 +89,11 @@ class CreateAccountOrder(Order):
 
 
 class DeleteAccountOrder(Order):
+    __slots__ = ('account_name',)
+
     def __init__(self, account_name: str, **kwargs):
         super().__init__(**kwargs)
-        self.account_name = checked_str_id(account_name)
+        self.account_name = interned_str_id(account_name)
 
     def execute(self, broker_state: BrokerState) -> OrderStatus:
         """Order will wait until the target account is defunded and delete it"""
@@ -120,11 +132,13 @@ class DeleteAccountOrder(Order):
 
 
 class TransferAllOrder(Order):
+    __slots__ = ('acc0', 'acc1', 'persistent')
+
     def __init__(self, acc0: str, acc1: str, persistent: bool = False, **kwargs):
         """Transfer all wealth from acc0 to acc1"""
         super().__init__(**kwargs)
-        self.acc0 = checked_str_id(acc0)
-        self.acc1 = checked_str_id(acc1)
+        self.acc0 = interned_str_id(acc0)
+        self.acc1 = interned_str_id(acc1)
         if self.acc0 == self.acc1:
             raise ValueError(f'Source and destination accounts must be different: {self.acc0}')
         self.persistent = persistent
@@ -181,6 +195,8 @@ class TransferAllOrder(Order):
 
 
 class BackwardTransferOrder(Order):
+    __slots__ = ('acc0', 'acc1', 'amount', 'rec_price_a', 'rec_price_b')
+
     def __init__(
         self,
         acc0: str,
@@ -192,11 +208,11 @@ class BackwardTransferOrder(Order):
     ):
         """Transfer wealth from acc0 to acc1 and target the specified amount change in acc1"""
         super().__init__(**kwargs)
-        self.acc0 = checked_str_id(acc0)
-        self.acc1 = checked_str_id(acc1)
+        self.acc0 = interned_str_id(acc0)
+        self.acc1 = interned_str_id(acc1)
         if self.acc0 == self.acc1:
             raise ValueError(f'Source and destination accounts must be different: {self.acc0}')
-        self.amount = checked_amount(tuple(amount))
+        self.amount = _interned_amount(amount)
         # record prices used for execution
         self.rec_price_a, self.rec_price_b = rec_price_a, rec_price_b
 
@@ -259,6 +275,8 @@ class BackwardTransferOrder(Order):
 
 
 class ForwardTransferOrder(Order):
+    __slots__ = ('acc0', 'acc1', 'amount', 'rec_price_a', 'rec_price_b')
+
     def __init__(
         self,
         acc0: str,
@@ -270,11 +288,11 @@ class ForwardTransferOrder(Order):
     ):
         """Transfer wealth from acc0 to acc1 and target the specified amount change in acc0"""
         super().__init__(**kwargs)
-        self.acc0 = checked_str_id(acc0)
-        self.acc1 = checked_str_id(acc1)
+        self.acc0 = interned_str_id(acc0)
+        self.acc1 = interned_str_id(acc1)
         if self.acc0 == self.acc1:
             raise ValueError(f'Source and destination accounts must be different: {self.acc0}')
-        self.amount = checked_amount(tuple(amount))
+        self.amount = _interned_amount(amount)
         # record prices used for execution
         self.rec_price_a, self.rec_price_b = rec_price_a, rec_price_b
 
@@ -348,9 +366,11 @@ def transfer_order_comparator(o1, o2):
 
 
 class AddToVariableOrder(Order):
+    __slots__ = ('variable_name', 'value')
+
     def __init__(self, variable_name: str, value: float, **kwargs):
         super().__init__(**kwargs)
-        self.variable_name = checked_str_id(variable_name)
+        self.variable_name = interned_str_id(variable_name)
         value = checked_real(self.variable_name, value)
         self.value = value
 
@@ -388,6 +408,8 @@ class AddToVariableOrder(Order):
 
 
 class UpdateVariablesOrder(Order):
+    __slots__ = ('vars_update',)
+
     def __init__(self, vars_update: Dict[str, Union[float, str]], **kwargs):
         super().__init__(**kwargs)
         # TODO check vars_update keys and values more precisely
@@ -409,9 +431,11 @@ class UpdateVariablesOrder(Order):
 
 
 class AddToAccountBalanceOrder(Order):
+    __slots__ = ('account_name', 'value')
+
     def __init__(self, account_name: str, value: float, **kwargs):
         super().__init__(**kwargs)
-        self.account_name = checked_str_id(account_name)
+        self.account_name = interned_str_id(account_name)
         self.value = checked_real(self.account_name, value)
 
     def execute(self, broker_state: BrokerState) -> OrderStatus:
@@ -460,6 +484,19 @@ class InterestOrder(Order):
     Reference: Brigo, Mercurio: Interest Rate Models
     """
 
+    __slots__ = (
+        'account_name',
+        'interest_rate',
+        'value_lower_bound',
+        'value_upper_bound',
+        'accrual_start_time',
+        'accrual_end_time',
+        'internal_saved_value',
+        'internal_saved_num',
+        'internal_saved_value_time_stamp',
+        'internal_variable_key',
+    )
+
     SECONDS_IN_A_YEAR = 60 * 60 * 24 * 365.25
     VARIABLE_PREFIX = 'interest_'
 
@@ -478,7 +515,7 @@ class InterestOrder(Order):
         **kwargs,
     ):
         super().__init__(**kwargs)
-        self.account_name = checked_str_id(account_name)
+        self.account_name = interned_str_id(account_name)
         self.interest_rate = checked_real(self.account_name, interest_rate, -1.0, 1.0)
         self.value_lower_bound = checked_real(
             self.account_name, value_lower_bound, -math.inf, math.inf
@@ -498,13 +535,13 @@ class InterestOrder(Order):
             )
 
         self.internal_saved_value = internal_saved_value
-        self.internal_saved_num = internal_saved_num
+        self.internal_saved_num = sys.intern(internal_saved_num)
         self.internal_saved_value_time_stamp: Time = maybe_deserialize_time(
             internal_saved_value_time_stamp
         )
-        self.internal_variable_key = self.VARIABLE_PREFIX + self.account_name
-        if internal_variable_key:
-            self.internal_variable_key = internal_variable_key
+        self.internal_variable_key = sys.intern(
+            internal_variable_key or self.VARIABLE_PREFIX + self.account_name
+        )
 
     def __eq__(self, other: 'InterestOrder') -> bool:
         tmp = []
@@ -582,13 +619,15 @@ class InterestOrder(Order):
 
 
 class CfdOpenOrder(Order):
+    __slots__ = ('num0', 'num1', 'units')
+
     def execute(self, broker_state: BrokerState) -> OrderStatus:
         raise NotImplementedError
 
     def __init__(self, num0: str, num1: str, units: float, **kwargs):
         super().__init__(**kwargs)
-        self.num0 = checked_str_id(num0)
-        self.num1 = checked_str_id(num1)
+        self.num0 = interned_str_id(num0)
+        self.num1 = interned_str_id(num1)
         if self.num0 == self.num1:
             raise ValueError(f'Please specify two different numeraires: {self.num0}')
         self.units = checked_real(f'{num0} {num1}', units)
@@ -622,13 +661,15 @@ class CfdOpenOrder(Order):
 
 
 class CfdCloseOrder(Order):
+    __slots__ = ('acc0', 'acc1')
+
     def execute(self, broker_state: BrokerState) -> OrderStatus:
         raise NotImplementedError
 
     def __init__(self, acc0: str, acc1: str, **kwargs):
         super().__init__(**kwargs)
-        self.acc0 = checked_str_id(acc0)
-        self.acc1 = checked_str_id(acc1)
+        self.acc0 = interned_str_id(acc0)
+        self.acc1 = interned_str_id(acc1)
         if self.acc0 == self.acc1:
             raise ValueError(f'Source and destination accounts must be different: {self.acc0}')
 
@@ -653,6 +694,8 @@ class CfdCloseOrder(Order):
 
 
 class CfdReduceOrder(Order):
+    __slots__ = ('acc0', 'acc1', 'units0')
+
     def execute(self, broker_state: BrokerState) -> OrderStatus:
         raise NotImplementedError
 
@@ -663,8 +706,8 @@ class CfdReduceOrder(Order):
         The meaning of the parameters corresponds to that of the CfdOpenOrder
         """
         super().__init__(**kwargs)
-        self.acc0 = checked_str_id(acc0)
-        self.acc1 = checked_str_id(acc1)
+        self.acc0 = interned_str_id(acc0)
+        self.acc1 = interned_str_id(acc1)
         if self.acc0 == self.acc1:
             raise ValueError(f'Source and destination accounts must be different: {self.acc0}')
 
@@ -1,7 +1,12 @@
 import itertools
 from functools import reduce
 from operator import mul
-from typing import Iterable, List, Mapping, Optional, Set, Tuple
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+import numpy as np
+
+# maximal number of edges in a conversion path
+MAX_PATH_DEPTH = 3
 
 
 def get_numeraires_from_prices(prices: Mapping[Tuple[str, str], float]) -> Set[str]:
@@ -22,7 +27,7 @@ def find_path(
     traversed_path: List[Tuple[str, str]],
     start_num: str,
     target_num: str,
-    max_depth: int = 3,
+    max_depth: int = MAX_PATH_DEPTH,
 ):
     """Find a path in a graph (collection of edges)"""
     if max_depth == 0:
@@ -75,6 +80,245 @@ def calc_path_price(
     return reduce(mul, [prices[pair] for pair in path])
 
 
+class PriceGraph:
+    """Conversion rates for a fixed price graph
+
+    The graph is built from a price mapping (e.g. `BrokerState.recent_prices`) and answers cross-rate
+    queries. Direct edges are always used as they are, just like in `calc_path_price`.
+
+    For pairs without a direct edge the rate of the best path with at most `max_depth` edges is used. Since
+    the price of a path is the product of its edge prices, this is a shortest path problem in log space
+    (edge weight -log(price)). All rates into a target numeraire are found at once by a bounded, vectorized
+    Bellman-Ford relaxation in the equivalent (max, *) semiring. The edge arrays are built on the first
+    query of a rate without a direct edge and every target column is calculated on first use.
+
+    Note that `calc_path_price` uses the first path found by its depth-first search instead of the best
+    one. Both agree if there is only one path or if all paths have the same product. With bid/ask spreads
+    the best path can be better than the first one. With inconsistent quotes (a profitable cycle, see
+    ArbitrageDetector) and a `max_depth` above three, the best path can run through the cycle, so the rate
+    contains a phantom profit. For `max_depth` up to three this can't happen since direct edges take
+    precedence.
+    """
+
+    def __init__(self, prices: Mapping[Tuple[str, str], float], max_depth: int = MAX_PATH_DEPTH):
+        self.prices: Dict[Tuple[str, str], float] = dict(prices)
+        self.max_depth = max_depth
+        self._numeraires: Optional[List[str]] = None
+        self._index: Dict[str, int] = {}
+        self._columns: Dict[int, np.ndarray] = {}
+        self._edge_src: Optional[np.ndarray] = None
+        self._edge_dst = np.zeros(0, dtype=np.intp)
+        self._edge_price = np.zeros(0)
+        self._seg_starts = np.zeros(0, dtype=np.intp)
+        self._seg_src = np.zeros(0, dtype=np.intp)
+
+    def _build_index(self) -> None:
+        self._numeraires = sorted(get_numeraires_from_prices(self.prices))
+        self._index = {num: i for i, num in enumerate(self._numeraires)}
+
+    @property
+    def numeraires(self) -> List[str]:
+        if self._numeraires is None:
+            self._build_index()
+        return self._numeraires
+
+    @property
+    def index(self) -> Dict[str, int]:
+        """Maps numeraires to their positions in `numeraires`"""
+        if self._numeraires is None:
+            self._build_index()
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self.numeraires)
+
+    def __contains__(self, num: str) -> bool:
+        return num in self.index
+
+    def _build_edges(self) -> None:
+        index = self.index
+        positive = [(edge, price) for edge, price in self.prices.items() if price > 0.0]
+        src = np.array([index[num0] for (num0, _), _ in positive], dtype=np.intp)
+        dst = np.array([index[num1] for (_, num1), _ in positive], dtype=np.intp)
+        price = np.array([p for _, p in positive], dtype=float)
+        # edges grouped by the source vertex, so one relaxation round is a segmented maximum
+        order = np.argsort(src, kind='stable')
+        self._edge_src = src[order]
+        self._edge_dst = dst[order]
+        self._edge_price = price[order]
+        is_start = np.ones(len(order), dtype=bool)
+        is_start[1:] = self._edge_src[1:] != self._edge_src[:-1]
+        self._seg_starts = np.flatnonzero(is_start)
+        self._seg_src = self._edge_src[self._seg_starts]
+
+    def _get_column(self, j: int) -> np.ndarray:
+        """Best rates of all numeraires into numeraire j, zero if there is no path"""
+        column = self._columns.get(j)
+        if column is not None:
+            return column
+        if self._edge_src is None:
+            self._build_edges()
+        column = np.zeros(len(self.numeraires))
+        column[j] = 1.0
+        if len(self._seg_starts) > 0:
+            for _ in range(self.max_depth):
+                candidates = self._edge_price * column[self._edge_dst]
+                best = np.maximum.reduceat(candidates, self._seg_starts)
+                new_column = column.copy()
+                new_column[self._seg_src] = np.maximum(column[self._seg_src], best)
+                # paths end at the first visit of the target
+                new_column[j] = 1.0
+                if np.array_equal(new_column, column):
+                    break
+                column = new_column
+        self._columns[j] = column
+        return column
+
+    def get_price(self, num0: Optional[str], num1: Optional[str]) -> Optional[float]:
+        """Return the num0num1 rate or None if num0 can't be converted into num1"""
+        if num0 is None or num1 is None:
+            return None
+        if num0 == num1:
+            return 1.0
+        price = self.prices.get((num0, num1))
+        if price is not None:
+            return price
+        i = self.index.get(num0)
+        j = self.index.get(num1)
+        if i is None or j is None:
+            return None
+        price = self._get_column(j)[i]
+        if price == 0.0:
+            return None
+        return float(price)
+
+
+class ArbitrageDetector:
+    """Finds price cycles with a product greater than one, i.e. conversion loops with a phantom profit
+
+    A cycle num0 -> num1 -> ... -> num0 is profitable iff it is a negative cycle in the graph with edge
+    weights -log(price). The detector runs a vectorized Bellman-Ford relaxation from a virtual source
+    connected to all vertices. Numeraires are interned to indices that stay fixed between calls and the
+    distances of the last arbitrage free graph are used as the starting point of the next call, so slowly
+    moving prices converge after a few relaxation rounds.
+
+    Cycles with a product below 1 + `tolerance` per edge (rounding errors of inverse quotes) are ignored.
+    """
+
+    def __init__(self, tolerance: float = 1e-9, max_cycles: int = 16):
+        if tolerance < 0.0:
+            raise ValueError(f'Tolerance must not be negative: {tolerance}')
+        self.tolerance = tolerance
+        self.max_cycles = max_cycles
+        self.numeraires: List[str] = []
+        self.index: Dict[str, int] = {}
+        self._dist = np.zeros(0)
+        self._edge_keys: List[Tuple[str, str]] = []
+        self._src = np.zeros(0, dtype=np.intp)
+        self._dst = np.zeros(0, dtype=np.intp)
+        self._order = np.zeros(0, dtype=np.intp)
+        self._seg_starts = np.zeros(0, dtype=np.intp)
+        self._seg_dst = np.zeros(0, dtype=np.intp)
+
+    def _intern(self, num: str) -> int:
+        i = self.index.get(num)
+        if i is None:
+            i = self.index[num] = len(self.numeraires)
+            self.numeraires.append(num)
+        return i
+
+    def _update_edges(self, prices: Mapping[Tuple[str, str], float]) -> None:
+        edge_keys = list(prices.keys())
+        if edge_keys == self._edge_keys:
+            return
+        self._edge_keys = edge_keys
+        src = np.array([self._intern(num0) for num0, _ in edge_keys], dtype=np.intp)
+        dst = np.array([self._intern(num1) for _, num1 in edge_keys], dtype=np.intp)
+        # edges grouped by the target vertex, so one round is a segmented minimum
+        self._order = np.argsort(dst, kind='stable')
+        self._src = src[self._order]
+        self._dst = dst[self._order]
+        is_start = np.ones(len(self._dst), dtype=bool)
+        is_start[1:] = self._dst[1:] != self._dst[:-1]
+        self._seg_starts = np.flatnonzero(is_start)
+        self._seg_dst = self._dst[self._seg_starts]
+        n = len(self.numeraires)
+        if len(self._dist) < n:
+            self._dist = np.concatenate([self._dist, np.zeros(n - len(self._dist))])
+
+    def find_cycles(
+        self, prices: Mapping[Tuple[str, str], float]
+    ) -> List[Tuple[Tuple[str, ...], float]]:
+        """Return profitable cycles as (numeraires, product of prices) pairs
+
+        Every cycle starts with its lexicographically smallest numeraire, the first numeraire is not
+        repeated at the end. At most `max_cycles` cycles are returned, the most profitable first.
+        """
+        self._update_edges(prices)
+        n = len(self.numeraires)
+        if n == 0 or not self._edge_keys:
+            return []
+        price = np.fromiter(prices.values(), dtype=float, count=len(self._edge_keys))[self._order]
+        weights = np.full(len(price), np.inf)
+        positive = price > 0.0
+        weights[positive] = -np.log(price[positive]) + self.tolerance
+
+        src, dst, seg_starts, seg_dst = self._src, self._dst, self._seg_starts, self._seg_dst
+        dist = self._dist.copy()
+        pred = np.full(n + 1, n, dtype=np.intp)  # n is the virtual source
+        for i in range(n):
+            candidates = dist[src] + weights
+            seg_min = np.minimum.reduceat(candidates, seg_starts)
+            improved = seg_min < dist[seg_dst]
+            if not improved.any():
+                self._dist = dist
+                return []
+            new_dist = dist.copy()
+            new_dist[seg_dst[improved]] = seg_min[improved]
+            relaxed = (candidates == new_dist[dst]) & (candidates < dist[dst])
+            pred[dst[relaxed]] = src[relaxed]
+            dist = new_dist
+            if i % 4 == 3 or i == n - 1:
+                cycle_vertices = self._find_pred_cycle_vertices(pred)
+                if len(cycle_vertices) > 0:
+                    break
+        else:
+            self._dist = np.zeros(n)
+            return []
+
+        # distances are unbounded now, start the next graph from scratch
+        self._dist = np.zeros(n)
+        cycles = []
+        visited = set()
+        for v in cycle_vertices:
+            if v in visited:
+                continue
+            cycle = [v]
+            u = pred[v]
+            while u != v:
+                cycle.append(u)
+                u = pred[u]
+            visited.update(cycle)
+            cycle.reverse()
+            nums = [self.numeraires[k] for k in cycle]
+            product = reduce(mul, [prices[(a, b)] for a, b in zip(nums, nums[1:] + nums[:1])])
+            if product > (1.0 + self.tolerance) ** len(nums):
+                start = nums.index(min(nums))
+                cycles.append((tuple(nums[start:] + nums[:start]), float(product)))
+        cycles.sort(key=lambda c: -c[1])
+        return cycles[: self.max_cycles]
+
+    @staticmethod
+    def _find_pred_cycle_vertices(pred: np.ndarray) -> List[int]:
+        """Vertices on cycles of the predecessor graph. The last entry of pred is the virtual source."""
+        n = len(pred) - 1
+        ancestors = pred
+        # after k doublings ancestors[v] is the 2**k-th predecessor of v
+        for _ in range(max(1, int(n).bit_length())):
+            ancestors = ancestors[ancestors]
+        return sorted(set(ancestors[:n][ancestors[:n] != n].tolist()))
+
+
 def calc_total_nav(
     prices: Mapping[Tuple[str, str], float],
     accounts: Mapping[str, Tuple[float, str]],
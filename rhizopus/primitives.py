@@ -2,8 +2,9 @@ import datetime
 import logging
 import math
 import sys
+from contextlib import contextmanager
 from numbers import Real
-from typing import Tuple, Union, Iterable, Sequence
+from typing import Iterator, Set, Tuple, Union, Iterable, Sequence
 
 Time = datetime.datetime
 Observation = Tuple[Time, float]
@@ -13,18 +14,59 @@ Amount = Tuple[float, str]
 NEGLIGIBLE_POSITIVE_PORTFOLIO_NAV = 1e-2
 EPS_FINANCIAL = 1e-8
 MIN_TIME, MAX_TIME = datetime.datetime(1970, 1, 1), datetime.datetime(2100, 1, 1)
+EPOCH = datetime.datetime(1970, 1, 1)
 DATE_FORMAT = '%Y-%m-%d'
 MAX_INT_ID = 1000000000
 MAX_KEY_LEN = 255
 MIN_OBS_VALUE = -1e24
 MAX_OBS_VALUE = 1e24
 MULTI_KEY_SEP = '|'  # this character is used to convert Tuple[str] keys to str keys
+MAX_VALIDATED_CACHE_SIZE = 100000
 
 
 logger = logging.getLogger(__name__)
 
+# keys and str ids that passed the validation once; validity doesn't depend on anything but the value
+_validated_keys: Set[Union[str, Tuple[str, ...]]] = set()
+_validated_str_ids: Set[str] = set()
+# skip the checks of times, keys, ids, and values, see trusted_validation()
+_trusted = False
+
+
+def set_trusted_validation(trusted: bool) -> None:
+    """Switch the validation of times, keys, string ids, and values on or off globally"""
+    global _trusted
+    _trusted = bool(trusted)
+
+
+def is_trusted_validation() -> bool:
+    return _trusted
+
+
+@contextmanager
+def trusted_validation(trusted: bool = True) -> Iterator[None]:
+    """Skip the raise_for_* checks inside the context
+
+    Meant for hot loops fed with data that was validated before, e.g. re-running a backtest. Note that
+    the orders created inside the context are not checked either.
+    """
+    previous = _trusted
+    set_trusted_validation(trusted)
+    try:
+        yield
+    finally:
+        set_trusted_validation(previous)
+
+
+def _remember_valid(cache: set, value) -> None:
+    if len(cache) >= MAX_VALIDATED_CACHE_SIZE:
+        cache.clear()
+    cache.add(value)
+
 
 def raise_for_time(t: Time) -> None:
+    if _trusted:
+        return
     if type(t) != Time:
         raise TypeError(f'Wrong time provided: {t}')
     if t.tzinfo is not None:
@@ -36,7 +78,16 @@ def raise_for_time(t: Time) -> None:
 
 
 def raise_for_key(key: Union[str, Iterable[str]]) -> None:
-    if type(key) == tuple:
+    if _trusted:
+        return
+    key_type = type(key)
+    if key_type == tuple or key_type == str:
+        try:
+            if key in _validated_keys:
+                return
+        except TypeError:  # unhashable key parts are reported below
+            pass
+    if key_type == tuple:
         if not (1 < len(key) < MAX_KEY_LEN):
             raise ValueError(f'Provided key has wrong length: {key}')
         if len(key) > 10:
@@ -50,8 +101,6 @@ def raise_for_key(key: Union[str, Iterable[str]]) -> None:
                 )
             if not k.isprintable():
                 logger.warning(f'Non-printable characters detected in key: "{k}"')
-            if MULTI_KEY_SEP in k:
-                raise ValueError(f'')
     elif type(key) == str:
         if not (0 < len(key) < MAX_KEY_LEN):
             raise ValueError(f'Passed key has wrong size: {key}')
@@ -61,6 +110,7 @@ def raise_for_key(key: Union[str, Iterable[str]]) -> None:
             logger.warning(f'Non-printable characters detected in key: "{key}"')
     else:
         raise TypeError(f'Passed key has wrong type: {key} ({type(key)})')
+    _remember_valid(_validated_keys, key)
 
 
 def raise_for_value(
@@ -70,9 +120,16 @@ def raise_for_value(
     max_allowed: float = 1e24,
     allow_nans: bool = False,
 ) -> None:
-    if not isinstance(value, Real):
-        raise TypeError(f'Only Real values for {key} are allowed: {value}')
-    value = float(value)
+    if _trusted:
+        return
+    if type(value) != float:
+        # the ABC check is slow, so floats skip it
+        if not isinstance(value, Real):
+            raise TypeError(f'Only Real values for {key} are allowed: {value}')
+        value = float(value)
+    # the common case: in range and not unusually large (this is False for NaNs)
+    if min_allowed <= value <= max_allowed and min_allowed / 2 <= value <= max_allowed / 2:
+        return
     if allow_nans:
         return
     if math.isnan(value):
@@ -90,15 +147,22 @@ def raise_for_value(
 
 def raise_for_str_id(sid: str) -> None:
     """Check string identifiers"""
+    if _trusted:
+        return
+    if type(sid) == str and sid in _validated_str_ids:
+        return
     if not (type(sid) == str and 0 < len(sid) < MAX_KEY_LEN):
         raise TypeError(f'Wrong numeraire str passed: {sid}')
     if not sid.isprintable():
         logger.warning(f'Non-printable characters detected in "{sid}"')
     if len(sid) > int(MAX_KEY_LEN):
         logger.warning(f'Unusually long str id encountered: {sid}')
+    _remember_valid(_validated_str_ids, sid)
 
 
 def raise_for_amount(amount: Amount) -> None:
+    if _trusted:
+        return
     if not (type(amount) == tuple and len(amount) == 2):
         raise TypeError(f'Wrong amount type: {amount}')
     value, num = amount
@@ -125,11 +189,27 @@ def maybe_serialize_time(t: Union[Time, str]) -> str:
     return t.isoformat(sep='T', timespec='microseconds')
 
 
+def time_to_ns(t: Time) -> int:
+    """Convert a naive datetime to integer nanoseconds since the epoch"""
+    return (t - EPOCH) // datetime.timedelta(microseconds=1) * 1000
+
+
+def ns_to_time(ns: int) -> Time:
+    """Convert integer nanoseconds since the epoch to a naive datetime (microsecond precision)"""
+    return EPOCH + datetime.timedelta(microseconds=ns // 1000)
+
+
 def checked_str_id(num: str) -> str:
     raise_for_str_id(num)
     return num
 
 
+def interned_str_id(sid: str) -> str:
+    """Check a string identifier and return its interned copy, so that equal ids share one object"""
+    raise_for_str_id(sid)
+    return sys.intern(sid)
+
+
 def checked_int_id(value: int) -> int:
     if type(value) != int:
         raise TypeError(f'Int id has wrong type: {value} ({type(value)})')
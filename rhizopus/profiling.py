@@ -0,0 +1,107 @@
+import random
+from array import array
+from contextlib import contextmanager
+from time import perf_counter_ns
+from typing import Callable, Dict, Iterator, List
+
+import numpy as np
+
+PERCENTILES = (50.0, 90.0, 99.0)
+MAX_SAMPLES = 100000
+
+# called with the phase name and the elapsed time in nanoseconds
+TimerCallback = Callable[[str, int], None]
+
+
+class PhaseProfiler:
+    """Accumulates wall times of named phases of a backtest
+
+    Broker, BrokerSimulator, BrokerObserver, and Strategy accept a `profiler` and time their phases with it,
+    e.g. 'simulator.process_orders' or 'observer.update'. Phases can be nested: 'broker.next' contains the
+    'simulator.*' phases of the tick. Without a profiler the instrumented code only pays for an `is None`
+    check per phase.
+
+    Totals and counts are exact. Percentiles are calculated from a uniform sample of at most `max_samples`
+    durations per phase. Callbacks receive every single duration, e.g. to forward them to a metrics system.
+    """
+
+    def __init__(self, max_samples: int = MAX_SAMPLES, seed: int = 0):
+        if max_samples < 1:
+            raise ValueError(f'Number of samples must be positive: {max_samples}')
+        self.max_samples = max_samples
+        self.totals: Dict[str, int] = {}
+        self.counts: Dict[str, int] = {}
+        self.samples: Dict[str, array] = {}
+        self.callbacks: List[TimerCallback] = []
+        self._rng = random.Random(seed)
+
+    @staticmethod
+    def now() -> int:
+        return perf_counter_ns()
+
+    def record(self, phase: str, elapsed_ns: int) -> None:
+        count = self.counts.get(phase, 0) + 1
+        self.counts[phase] = count
+        self.totals[phase] = self.totals.get(phase, 0) + elapsed_ns
+        samples = self.samples.get(phase)
+        if samples is None:
+            samples = self.samples[phase] = array('q')
+        if len(samples) < self.max_samples:
+            samples.append(elapsed_ns)
+        else:
+            # reservoir sampling
+            i = self._rng.randrange(count)
+            if i < self.max_samples:
+                samples[i] = elapsed_ns
+        for callback in self.callbacks:
+            callback(phase, elapsed_ns)
+
+    def lap(self, phase: str, start_ns: int) -> int:
+        """Record the time since start_ns and return the current time, so consecutive phases can be chained"""
+        end_ns = perf_counter_ns()
+        self.record(phase, end_ns - start_ns)
+        return end_ns
+
+    @contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        """Time a block of code"""
+        start_ns = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(phase, perf_counter_ns() - start_ns)
+
+    def add_callback(self, callback: TimerCallback) -> None:
+        self.callbacks.append(callback)
+
+    def reset(self) -> None:
+        self.totals.clear()
+        self.counts.clear()
+        self.samples.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per phase: count, total seconds, mean and percentiles in microseconds. Sorted by total time."""
+        summary = {}
+        for phase in sorted(self.totals, key=lambda p: -self.totals[p]):
+            count = self.counts[phase]
+            samples = np.frombuffer(self.samples[phase], dtype=np.int64) / 1000.0
+            stats = {
+                'count': count,
+                'total_s': self.totals[phase] / 1e9,
+                'mean_us': self.totals[phase] / count / 1000.0,
+            }
+            for q, x in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+                stats[f'p{q:g}_us'] = float(x)
+            stats['max_us'] = float(samples.max())
+            summary[phase] = stats
+        return summary
+
+    def report(self) -> str:
+        """Summary formatted as a table"""
+        columns = ['count', 'total_s', 'mean_us'] + [f'p{q:g}_us' for q in PERCENTILES] + ['max_us']
+        lines = [f'{"phase":<28}' + ''.join(f'{c:>12}' for c in columns)]
+        for phase, stats in self.summary().items():
+            cells = [f'{stats["count"]:>12d}', f'{stats["total_s"]:>12.4f}']
+            cells += [f'{stats[c]:>12.1f}' for c in columns[2:]]
+            lines.append(f'{phase:<28}' + ''.join(cells))
+        return '\n'.join(lines)
@@ -1,9 +1,10 @@
 import bisect
 import datetime
 import logging
-from collections import defaultdict
+from array import array
 from types import MappingProxyType
 from typing import (
+    Iterable,
     Dict,
     KeysView,
     List,
@@ -13,8 +14,11 @@ from typing import (
     Tuple,
     Union,
     Any,
+    TYPE_CHECKING,
 )
 
+import numpy as np
+
 from rhizopus.primitives import (
     Time,
     raise_for_time,
@@ -26,17 +30,27 @@ from rhizopus.primitives import (
     float_almost_equal,
     EPS_FINANCIAL,
     MULTI_KEY_SEP,
-    maybe_serialize_time,
+    time_to_ns,
+    ns_to_time,
 )
 
+if TYPE_CHECKING:
+    from rhizopus.snapshot import SnapshotReader, SnapshotWriter
+
 logger = logging.getLogger(__name__)
 
 
 class SeriesRecorder:
-    """Records numerical observations and their observation times"""
+    """Records numerical observations and their observation times
+
+    Every series is stored in two growable arrays: int64 observation times (nanoseconds since the epoch) and
+    float64 values. The union of all observation times is kept in a shared sorted int64 array. Observations
+    saved in chronological order are appended in amortized O(1); out-of-order observations fall back to a
+    sorted insertion.
+    """
 
-    _observed_times: List[Time]
-    _observed_series: Dict[Union[str, Sequence[str]], Dict[Time, float]]
+    _observed_times: array
+    _series: Dict[Union[str, Sequence[str]], Tuple[array, array]]
     _recent_observations: Dict[Union[str, Sequence[str]], float]
 
     def __init__(
@@ -45,17 +59,31 @@ class SeriesRecorder:
         observed_series: Optional[Dict[Union[str, Sequence[str]], Dict[Time, float]]] = None,
         recent_observations: Dict[Union[str, Sequence[str]], float] = None,
     ):
-        # sorted list of all observation times
-        self._observed_times = observed_times if observed_times else []
-        self._observed_series = defaultdict(dict, observed_series if observed_series else {})
+        # sorted array of all observation times
+        self._observed_times = array('q', sorted(time_to_ns(t) for t in observed_times or []))
+        self._series = {}
+        for key, series in (observed_series or {}).items():
+            raise_for_key(key)
+            observations = sorted((time_to_ns(t), x) for t, x in series.items())
+            self._series[key] = (
+                array('q', [t for t, _ in observations]),
+                array('d', [x for _, x in observations]),
+            )
         self._recent_observations = recent_observations if recent_observations else {}
+        self._last_time: Optional[Time] = None
+        self._last_time_ns = 0
 
         for key, value in self._recent_observations.items():
             raise_for_key(key)
             key_str = key if isinstance(key, str) else '_'.join(key)
             raise_for_value(key_str, value)
-        for key in self._observed_series:
-            raise_for_key(key)
+
+    def _to_ns(self, t: Time) -> int:
+        # observers save many keys for the same time in a row
+        if t != self._last_time:
+            self._last_time = t
+            self._last_time_ns = time_to_ns(t)
+        return self._last_time_ns
 
     def save(
         self,
@@ -69,26 +97,64 @@ class SeriesRecorder:
         raise_for_time(t)
         raise_for_key(key)
         value = checked_real(key, value, min_allowed, max_allowed, allow_nans)
+        t_ns = self._to_ns(t)
 
-        if t in self._observed_series[key].keys():
-            logger.warning(
-                f'Updated observation of {key} for t {t}: {self._observed_series[key][t]} -> {value}'
-            )
-        else:
-            i = bisect.bisect_left(self._observed_times, t)
-            if i == len(self._observed_times):
-                self._observed_times.append(t)
-            if i < len(self._observed_times) and self._observed_times[i] != t:
-                self._observed_times.insert(i, t)
-        self._observed_series[key][t] = value
-
-        if max(self._observed_series[key].keys()) == t:
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = (array('q'), array('d'))
+        times, values = series
+        if not times or t_ns > times[-1]:
+            times.append(t_ns)
+            values.append(value)
             self._recent_observations[key] = value
+        else:
+            i = bisect.bisect_left(times, t_ns)
+            if times[i] == t_ns:
+                logger.warning(f'Updated observation of {key} for t {t}: {values[i]} -> {value}')
+                values[i] = value
+                if i == len(times) - 1:
+                    self._recent_observations[key] = value
+            else:
+                times.insert(i, t_ns)
+                values.insert(i, value)
+
+        observed_times = self._observed_times
+        if not observed_times or t_ns > observed_times[-1]:
+            observed_times.append(t_ns)
+        else:
+            i = bisect.bisect_left(observed_times, t_ns)
+            if observed_times[i] != t_ns:
+                observed_times.insert(i, t_ns)
 
     def get_dict(self, key: Union[str, Sequence[str]]) -> Optional[Mapping[Time, float]]:
-        if key not in self._observed_series.keys():
+        if key not in self._series:
             return None
-        return MappingProxyType(self._observed_series[key])
+        times, values = self._series[key]
+        return MappingProxyType({ns_to_time(t): x for t, x in zip(times, values)})
+
+    def get_len(self, key: Union[str, Sequence[str]]) -> int:
+        """Return the number of observations of a series"""
+        if key not in self._series:
+            return 0
+        return len(self._series[key][0])
+
+    def get_first_observation(self, key: Union[str, Sequence[str]]) -> Optional[Tuple[Time, float]]:
+        if key not in self._series or not self._series[key][0]:
+            return None
+        times, values = self._series[key]
+        return ns_to_time(times[0]), values[0]
+
+    def _obs_index_range(
+        self,
+        key: Union[str, Sequence[str]],
+        starting_with: Time,
+        ending_not_later_than: Time,
+    ) -> Tuple[int, int]:
+        """Index range of the observations after starting_with and not later than ending_not_later_than"""
+        times = self._series[key][0]
+        start = bisect.bisect_right(times, time_to_ns(starting_with))
+        end = bisect.bisect_right(times, time_to_ns(ending_not_later_than))
+        return start, max(start, end)
 
     def _obs_pair_generator(
         self,
@@ -96,15 +162,10 @@ class SeriesRecorder:
         starting_with: Time = datetime.datetime.min,
         ending_not_later_than: Time = datetime.datetime.max,
     ):
-        series = self._observed_series[key]
-        for i in range(
-            bisect.bisect(self._observed_times, starting_with),
-            len(self._observed_times),
-        ):
-            t = self._observed_times[i]
-            if t in series.keys() and t <= ending_not_later_than:
-                x = series[t]
-                yield t, x
+        times, values = self._series[key]
+        start, end = self._obs_index_range(key, starting_with, ending_not_later_than)
+        for i in range(start, end):
+            yield ns_to_time(times[i]), values[i]
 
     def get_list_of_pairs(
         self,
@@ -112,7 +173,7 @@ class SeriesRecorder:
         starting_with: Time = datetime.datetime.min,
         ending_not_later_than: Time = datetime.datetime.max,
     ) -> Optional[Sequence[Tuple[Time, float]]]:
-        if key not in self._observed_series.keys():
+        if key not in self._series:
             return None
         return list(self._obs_pair_generator(key, starting_with, ending_not_later_than))
 
@@ -121,59 +182,118 @@ class SeriesRecorder:
         key: Union[str, Sequence[str]],
         starting_with: Time = datetime.datetime.min,
         ending_not_later_than: Time = datetime.datetime.max,
-    ) -> Tuple[Sequence[Time], Sequence[float]]:
-        if key not in self._observed_series.keys():
-            return [], []
-        t_list, x_list = [], []
-        for t, x in self._obs_pair_generator(key, starting_with, ending_not_later_than):
-            t_list.append(t)
-            x_list.append(x)
-        return t_list, x_list
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the observation times as a datetime64[ns] array and the values as a float64 array"""
+        if key not in self._series:
+            return np.empty(0, dtype='datetime64[ns]'), np.empty(0)
+        times, values = self._series[key]
+        start, end = self._obs_index_range(key, starting_with, ending_not_later_than)
+        return (
+            np.array(times[start:end], dtype=np.int64).view('datetime64[ns]'),
+            np.array(values[start:end], dtype=np.float64),
+        )
 
     def get_recent_observations(self) -> Mapping[Union[str, Sequence[str]], float]:
         return MappingProxyType(self._recent_observations)
 
     def keys(self) -> KeysView[Union[str, Sequence[str]]]:
-        return self._observed_series.keys()
+        return self._series.keys()
 
     def times(self) -> List[Time]:
-        return self._observed_times
+        return [ns_to_time(t) for t in self._observed_times]
+
+    def to_arrays(
+        self, keys: Optional[Iterable[Union[str, Sequence[str]]]] = None
+    ) -> Tuple[np.ndarray, List[Union[str, Sequence[str]]], np.ndarray]:
+        """Export the recorded series as a datetime64[ns] time index, a key list, and a value matrix
+
+        The value matrix has one row per observation time and one column per key; NaN marks
+        times a key was not observed at. Columns are filled straight from the internal arrays.
+        """
+        keys = list(self._series.keys()) if keys is None else list(keys)
+        # copy: a live view would block the recorder's arrays from growing
+        times = np.array(self._observed_times, dtype=np.int64)
+        values = np.full((len(times), len(keys)), np.nan, order='F')
+        for j, key in enumerate(keys):
+            if key not in self._series:
+                continue
+            key_times, key_values = self._series[key]
+            if not key_times:
+                continue
+            rows = np.searchsorted(times, np.frombuffer(key_times, dtype=np.int64))
+            values[rows, j] = np.frombuffer(key_values, dtype=np.float64)
+        return times.view('datetime64[ns]'), keys, values
 
     def to_json(self) -> Dict[str, Any]:
         series = {}
-        for key, t_v_dict in self._observed_series.items():
+        for key, (times, values) in self._series.items():
             str_key = key if isinstance(key, str) else MULTI_KEY_SEP.join(key)
-            series[str_key] = {maybe_serialize_time(t): v for t, v in t_v_dict.items()}
+            series[str_key] = dict(zip(_ns_to_iso(times), values.tolist()))
         recent_observations = {}
         for key, value in self._recent_observations.items():
             str_key = key if isinstance(key, str) else MULTI_KEY_SEP.join(key)
             recent_observations[str_key] = value
         return {
-            'observed_times': [maybe_serialize_time(t) for t in self._observed_times],
+            'observed_times': _ns_to_iso(self._observed_times),
             'observed_series': series,
             'recent_observations': recent_observations,
         }
 
     @classmethod
     def from_json(cls, data: Dict[str, Any]) -> 'SeriesRecorder':
-        observed_times = [datetime.datetime.fromisoformat(t) for t in data['observed_times']]
-        observed_series = {}
+        recorder = SeriesRecorder()
+        recorder._observed_times = array('q', np.sort(_iso_to_ns(data['observed_times'])).tobytes())
         for str_key, series in data['observed_series'].items():
             key = tuple(str_key.split(MULTI_KEY_SEP)) if MULTI_KEY_SEP in str_key else str_key
-            observed_series[key] = {
-                datetime.datetime.fromisoformat(t): v for t, v in series.items()
-            }
-        recent_observations = {}
-        for str_key, price in data['recent_observations'].items():
+            raise_for_key(key)
+            times = _iso_to_ns(list(series.keys()))
+            values = np.fromiter(series.values(), dtype=np.float64, count=len(times))
+            order = np.argsort(times, kind='stable')
+            recorder._series[key] = (
+                array('q', times[order].tobytes()),
+                array('d', values[order].tobytes()),
+            )
+        for str_key, value in data['recent_observations'].items():
             key = tuple(str_key.split(MULTI_KEY_SEP)) if MULTI_KEY_SEP in str_key else str_key
-            recent_observations[key] = float(price)
-        return SeriesRecorder(observed_times, observed_series, recent_observations)
+            raise_for_key(key)
+            raise_for_value(str_key, value)
+            recorder._recent_observations[key] = float(value)
+        return recorder
+
+    def to_snapshot(self, writer: 'SnapshotWriter') -> None:
+        """Write to a binary snapshot, see rhizopus.snapshot"""
+        writer.write_str('SeriesRecorder')
+        writer.write_array(self._observed_times)
+        writer.write_u32(len(self._series))
+        for key, (times, values) in self._series.items():
+            writer.write_value(key)
+            writer.write_array(times)
+            writer.write_array(values)
+        writer.write_u32(len(self._recent_observations))
+        for key, value in self._recent_observations.items():
+            writer.write_value(key)
+            writer.write_f64(value)
+
+    @classmethod
+    def from_snapshot(cls, reader: 'SnapshotReader') -> 'SeriesRecorder':
+        """Read from a binary snapshot, see rhizopus.snapshot"""
+        reader.expect_str('SeriesRecorder')
+        recorder = SeriesRecorder()
+        recorder._observed_times = reader.read_array('q')
+        for _ in range(reader.read_u32()):
+            key = _key_from_snapshot(reader.read_value())
+            times = reader.read_array('q')
+            recorder._series[key] = (times, reader.read_array('d'))
+        for _ in range(reader.read_u32()):
+            key = _key_from_snapshot(reader.read_value())
+            recorder._recent_observations[key] = reader.read_f64()
+        return recorder
 
     def __eq__(self, other: 'SeriesRecorder') -> bool:
         if not (
             self._observed_times == other._observed_times
             and set(self._recent_observations) == set(other._recent_observations)
-            and set(self._observed_series) == set(self._observed_series)
+            and set(self._series) == set(other._series)
         ):
             return False
         for key in self._recent_observations:
@@ -181,12 +301,28 @@ class SeriesRecorder:
                 self._recent_observations[key], other._recent_observations[key], EPS_FINANCIAL
             ):
                 return False
-        for key in self._observed_series:
-            series0 = self._observed_series[key]
-            series1 = other._observed_series[key]
-            if set(series0) != set(series1):
+        for key, (times0, values0) in self._series.items():
+            times1, values1 = other._series[key]
+            if times0 != times1:
                 return False
-            for t in series0:
-                if not float_almost_equal(series0[t], series1[t], EPS_FINANCIAL):
+            for x0, x1 in zip(values0, values1):
+                if not float_almost_equal(x0, x1, EPS_FINANCIAL):
                     return False
         return True
+
+
+def _ns_to_iso(times: Sequence[int]) -> List[str]:
+    """Vectorized maybe_serialize_time() for times in nanoseconds since the epoch"""
+    times = np.array(times, dtype=np.int64).view('datetime64[ns]')
+    return np.datetime_as_string(times.astype('datetime64[us]'), unit='us').tolist()
+
+
+def _iso_to_ns(times: Sequence[str]) -> np.ndarray:
+    """Parse ISO time strings into nanoseconds since the epoch"""
+    return np.array(times, dtype='datetime64[us]').astype('datetime64[ns]').view(np.int64)
+
+
+def _key_from_snapshot(key: Union[str, List[str]]) -> Union[str, Tuple[str, ...]]:
+    key = key if isinstance(key, str) else tuple(key)
+    raise_for_key(key)
+    return key
@@ -0,0 +1,201 @@
+import datetime
+import struct
+import sys
+from array import array
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence
+
+from rhizopus.broker import Order
+from rhizopus.primitives import Time, ns_to_time, time_to_ns
+
+MAGIC = b'RHZSNAP\x00'
+FORMAT_VERSION = 1
+
+# tags of the values written by SnapshotWriter.write_value()
+TAG_NONE, TAG_FALSE, TAG_TRUE, TAG_INT, TAG_FLOAT, TAG_STR, TAG_TIME, TAG_LIST, TAG_DICT = range(9)
+
+_U8 = struct.Struct('<B')
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+_NO_TIME = -(2**63)
+
+
+class SnapshotWriter:
+    """Writes a binary snapshot to a stream
+
+    Snapshots are written section by section, e.g. with BrokerState.to_snapshot() followed by
+    BrokerObserver.to_snapshot(), and have to be read back in the same order with a SnapshotReader.
+    Strings are interned: every distinct string is written once and referenced by its index afterwards.
+    Numbers are little-endian, times are int64 nanoseconds since the epoch.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self._strings: Dict[str, int] = {}
+        stream.write(MAGIC)
+        stream.write(_U32.pack(FORMAT_VERSION))
+
+    def write_u32(self, x: int) -> None:
+        self.stream.write(_U32.pack(x))
+
+    def write_i64(self, x: int) -> None:
+        self.stream.write(_I64.pack(x))
+
+    def write_f64(self, x: float) -> None:
+        self.stream.write(_F64.pack(x))
+
+    def write_str(self, s: str) -> None:
+        index = self._strings.get(s)
+        if index is not None:
+            self.stream.write(_U32.pack(index))
+            return
+        index = self._strings[s] = len(self._strings)
+        data = s.encode('utf-8')
+        self.stream.write(_U32.pack(index))
+        self.stream.write(_U32.pack(len(data)))
+        self.stream.write(data)
+
+    def write_time(self, t: Optional[Time]) -> None:
+        self.stream.write(_I64.pack(_NO_TIME if t is None else time_to_ns(t)))
+
+    def write_array(self, x: array) -> None:
+        """Write an array('q') or array('d')"""
+        if sys.byteorder != 'little':
+            x = array(x.typecode, x)
+            x.byteswap()
+        self.stream.write(_U32.pack(len(x)))
+        self.stream.write(x.tobytes())
+
+    def write_value(self, x: Any) -> None:
+        """Write a tagged None, bool, int, float, str, time, list, or a dict with str keys"""
+        if x is None:
+            self.stream.write(_U8.pack(TAG_NONE))
+        elif type(x) == bool:
+            self.stream.write(_U8.pack(TAG_TRUE if x else TAG_FALSE))
+        elif type(x) == int:
+            self.stream.write(_U8.pack(TAG_INT))
+            self.write_i64(x)
+        elif type(x) == float:
+            self.stream.write(_U8.pack(TAG_FLOAT))
+            self.write_f64(x)
+        elif type(x) == str:
+            self.stream.write(_U8.pack(TAG_STR))
+            self.write_str(x)
+        elif type(x) == datetime.datetime:
+            self.stream.write(_U8.pack(TAG_TIME))
+            self.write_time(x)
+        elif type(x) in (list, tuple):
+            self.stream.write(_U8.pack(TAG_LIST))
+            self.write_u32(len(x))
+            for item in x:
+                self.write_value(item)
+        elif type(x) == dict:
+            self.stream.write(_U8.pack(TAG_DICT))
+            self.write_u32(len(x))
+            for key, item in x.items():
+                self.write_str(key)
+                self.write_value(item)
+        else:
+            raise TypeError(f'Value of type {type(x)} can not be written to a snapshot: {x}')
+
+    def write_order(self, order: Order) -> None:
+        """Write an order using its to_json() fields. Time attributes are written as int64 times."""
+        data = order.to_json()
+        self.write_str(data.pop('class_name'))
+        self.write_u32(len(data))
+        for key, value in data.items():
+            attr = getattr(order, key, None)
+            self.write_str(key)
+            self.write_value(attr if type(attr) == datetime.datetime else value)
+
+    def write_orders(self, orders: Sequence[Order]) -> None:
+        self.write_u32(len(orders))
+        for order in orders:
+            self.write_order(order)
+
+
+class SnapshotReader:
+    """Reads a binary snapshot written by SnapshotWriter"""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self._strings: List[str] = []
+        if self._read(len(MAGIC)) != MAGIC:
+            raise ValueError('Not a rhizopus snapshot')
+        version = self.read_u32()
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported snapshot format version: {version}')
+
+    def _read(self, n: int) -> bytes:
+        data = self.stream.read(n)
+        if len(data) != n:
+            raise ValueError('Unexpected end of snapshot')
+        return data
+
+    def read_u32(self) -> int:
+        return _U32.unpack(self._read(4))[0]
+
+    def read_i64(self) -> int:
+        return _I64.unpack(self._read(8))[0]
+
+    def read_f64(self) -> float:
+        return _F64.unpack(self._read(8))[0]
+
+    def read_str(self) -> str:
+        index = self.read_u32()
+        if index < len(self._strings):
+            return self._strings[index]
+        if index != len(self._strings):
+            raise ValueError(f'Unknown string reference in snapshot: {index}')
+        s = self._read(self.read_u32()).decode('utf-8')
+        self._strings.append(s)
+        return s
+
+    def expect_str(self, expected: str) -> None:
+        s = self.read_str()
+        if s != expected:
+            raise ValueError(f'Unexpected snapshot section: "{s}" (expected "{expected}")')
+
+    def read_time(self) -> Optional[Time]:
+        ns = self.read_i64()
+        return None if ns == _NO_TIME else ns_to_time(ns)
+
+    def read_array(self, typecode: str) -> array:
+        n = self.read_u32()
+        x = array(typecode)
+        x.frombytes(self._read(n * x.itemsize))
+        if sys.byteorder != 'little':
+            x.byteswap()
+        return x
+
+    def read_value(self) -> Any:
+        tag = _U8.unpack(self._read(1))[0]
+        if tag == TAG_NONE:
+            return None
+        if tag == TAG_FALSE:
+            return False
+        if tag == TAG_TRUE:
+            return True
+        if tag == TAG_INT:
+            return self.read_i64()
+        if tag == TAG_FLOAT:
+            return self.read_f64()
+        if tag == TAG_STR:
+            return self.read_str()
+        if tag == TAG_TIME:
+            return self.read_time()
+        if tag == TAG_LIST:
+            return [self.read_value() for _ in range(self.read_u32())]
+        if tag == TAG_DICT:
+            return {self.read_str(): self.read_value() for _ in range(self.read_u32())}
+        raise ValueError(f'Unknown value tag in snapshot: {tag}')
+
+    def read_order(self) -> Order:
+        data = {'class_name': self.read_str()}
+        for _ in range(self.read_u32()):
+            key = self.read_str()
+            data[key] = self.read_value()
+        return Order.from_json(data)
+
+    def read_orders(self) -> List[Order]:
+        return [self.read_order() for _ in range(self.read_u32())]
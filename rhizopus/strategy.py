@@ -6,6 +6,7 @@ from typing import Optional, Dict, MutableMapping
 from rhizopus.broker import Broker
 from rhizopus.broker_observer import BrokerObserver
 from rhizopus.orders import BackwardTransferOrder
+from rhizopus.profiling import PhaseProfiler
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,7 @@ class Strategy:
         broker: Broker,
         observer: BrokerObserver,
         max_rel_alloc_deviation: float = 0.01,
+        profiler: Optional[PhaseProfiler] = None,
     ):
         self.broker = broker
         self.default_numeraire = self.broker.get_default_numeraire()
@@ -32,20 +34,33 @@ class Strategy:
 
         self.observer = observer
         self.price_cache = {}
+        self.profiler = profiler
 
     def run(self, start_time: datetime.datetime, max_iterations: int):
-        """Executes the strategy loop"""
+        """Executes the strategy loop
+
+        If a profiler is set, the time spent in the 'strategy.*' phases is recorded and the profile of all
+        phases is logged at the end.
+        """
+        profiler = self.profiler
         while self.broker.get_time() < start_time:
             self.observer.update()
             self.broker.next()
         for time_index in range(max_iterations):
             self.observer.update()
-            new_orders = self._get_orders()
-            for order in new_orders:
-                self.broker.fill_order(order)
+            start_ns = profiler.now() if profiler is not None else 0
+            orders = self._get_orders()
+            if profiler is not None:
+                profiler.lap('strategy.get_orders', start_ns)
+            self.broker.fill_orders(orders)
+            start_ns = profiler.now() if profiler is not None else 0
             self.end_of_day()
+            if profiler is not None:
+                profiler.lap('strategy.end_of_day', start_ns)
             if self.broker.next() is None:
                 break
+        if profiler is not None:
+            logger.info(f'Profile:\n{profiler.report()}')
 
     def end_of_day(self):
         """Postprocessing step to run custom analytics."""
@@ -0,0 +1,137 @@
+import datetime
+import itertools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+from rhizopus.broker_observer import BrokerObserver, PORTFOLIO_PREFIX
+from rhizopus.broker_simulator import SeriesStoreBase
+from rhizopus.strategy import Strategy
+
+logger = logging.getLogger(__name__)
+
+# Builds a strategy (together with its Broker, BrokerSimulator and BrokerObserver) for one parameter set
+StrategyFactory = Callable[[SeriesStoreBase, Mapping[str, Any]], Strategy]
+ObserverSummary = Callable[[BrokerObserver], Dict[str, Any]]
+
+# series store shared by all runs executed in a worker process
+_worker_series_store: Optional[SeriesStoreBase] = None
+
+
+class SweepResult:
+    """Parameters and observer summary of a single sweep run"""
+
+    def __init__(self, params: Mapping[str, Any], summary: Mapping[str, Any]):
+        self.params = dict(params)
+        self.summary = dict(summary)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.params}, {self.summary})'
+
+    def __eq__(self, other: 'SweepResult') -> bool:
+        return (
+            type(self) == type(other)
+            and self.params == other.params
+            and self.summary == other.summary
+        )
+
+
+def expand_param_grid(param_grid: Mapping[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Return all parameter combinations of a grid, e.g. {'a': [1, 2], 'b': [3]} -> [{'a': 1, 'b': 3}, ...]"""
+    keys = list(param_grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*param_grid.values())]
+
+
+def summarize_observer(observer: BrokerObserver) -> Dict[str, Any]:
+    """Default run summary: NAV statistics and the recent values of all portfolio series"""
+    summary: Dict[str, Any] = {'num_ticks': len(observer.times())}
+    stats = observer.stats
+    if stats.initial_nav is not None:
+        summary['initial_nav'] = stats.initial_nav
+        summary['final_nav'] = stats.last_nav
+        summary['max_drawdown'] = stats.max_drawdown
+    for key, value in observer.get_recent_observations().items():
+        if isinstance(key, tuple) and key[0] == PORTFOLIO_PREFIX:
+            summary['_'.join(key)] = value
+    return summary
+
+
+def _init_worker(series_store: Optional[SeriesStoreBase]) -> None:
+    global _worker_series_store
+    if series_store is not None:
+        _worker_series_store = series_store
+
+
+def _run_one(
+    strategy_factory: StrategyFactory,
+    params: Mapping[str, Any],
+    start_time: datetime.datetime,
+    max_iterations: int,
+    summarize: ObserverSummary,
+) -> SweepResult:
+    strategy = strategy_factory(_worker_series_store, params)
+    strategy.run(start_time, max_iterations)
+    return SweepResult(params, summarize(strategy.observer))
+
+
+def run_sweep(
+    series_store: SeriesStoreBase,
+    strategy_factory: StrategyFactory,
+    param_grid: Any,
+    start_time: datetime.datetime,
+    max_iterations: int,
+    max_workers: Optional[int] = None,
+    summarize: ObserverSummary = summarize_observer,
+    chunksize: int = 1,
+) -> List[SweepResult]:
+    """Run a strategy for every parameter set of a grid in a process pool
+
+    The series store is read-only and sent to every worker process once, not with every task. With the
+    'fork' start method it isn't pickled at all: the workers inherit it from the parent process.
+    Memory-mapped stores are reopened by the workers and share the page cache.
+
+    :param strategy_factory: Picklable (module level) function building a ready-to-run strategy
+    :param param_grid: Either a dict mapping parameter names to lists of values (expanded into the cartesian
+        product), or a sequence of parameter dicts
+    :param max_workers: Number of worker processes. With max_workers=1 all runs are executed in the
+        current process.
+    :returns: Results in the order of the parameter sets
+    """
+    global _worker_series_store
+    param_sets = (
+        expand_param_grid(param_grid) if isinstance(param_grid, Mapping) else list(param_grid)
+    )
+    args = (start_time, max_iterations, summarize)
+
+    if max_workers == 1:
+        previous_store, _worker_series_store = _worker_series_store, series_store
+        try:
+            return [_run_one(strategy_factory, params, *args) for params in param_sets]
+        finally:
+            _worker_series_store = previous_store
+
+    mp_context = multiprocessing.get_context()
+    inherit_store = mp_context.get_start_method() == 'fork'
+    previous_store = _worker_series_store
+    if inherit_store:
+        _worker_series_store = series_store
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(None if inherit_store else series_store,),
+        ) as executor:
+            logger.info(f'Running {len(param_sets)} sweep runs')
+            return list(
+                executor.map(
+                    _run_one,
+                    itertools.repeat(strategy_factory),
+                    param_sets,
+                    *(itertools.repeat(arg) for arg in args),
+                    chunksize=chunksize,
+                )
+            )
+    finally:
+        _worker_series_store = previous_store
@@ -0,0 +1,249 @@
+import datetime
+import logging
+import math
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from rhizopus.broker_simulator import SeriesStoreColumnar, TransactionCostFilter
+from rhizopus.orders import InterestOrder
+from rhizopus.primitives import (
+    EPS_FINANCIAL,
+    MIN_TIME,
+    NEGLIGIBLE_POSITIVE_PORTFOLIO_NAV,
+    checked_str_id,
+    time_to_ns,
+)
+
+logger = logging.getLogger(__name__)
+
+# don't trade below this value in the default numeraire (see Strategy._get_orders_for_allocation)
+MIN_ORDER_VALUE = 0.01
+
+
+class VectorizedBacktestResult:
+    """Series produced by `run_target_weights`
+
+    All arrays have one row per simulated tick. The columns of `account_navs` and `weights` correspond to
+    `accounts`. Unobserved values (e.g. weights of a portfolio with negligible NAV) are NaN.
+    """
+
+    def __init__(
+        self,
+        times: np.ndarray,
+        accounts: List[str],
+        nav: np.ndarray,
+        account_navs: np.ndarray,
+        weights: np.ndarray,
+        reallocation_mass: np.ndarray,
+        variables: Dict[str, np.ndarray],
+    ):
+        self.times = times
+        self.accounts = accounts
+        self.nav = nav
+        self.account_navs = account_navs
+        self.weights = weights
+        self.reallocation_mass = reallocation_mass
+        self.variables = variables
+
+
+def run_target_weights(
+    series_store: SeriesStoreColumnar,
+    default_numeraire: str,
+    assets: Sequence[str],
+    target_weights: Union[Sequence[float], np.ndarray],
+    initial_capital: float,
+    trading_start_time: datetime.datetime = MIN_TIME,
+    max_rel_alloc_deviation: float = 0.01,
+    transaction_cost_filter: Optional[TransactionCostFilter] = None,
+    interest_orders: Sequence[InterestOrder] = (),
+) -> VectorizedBacktestResult:
+    """Vectorized backtest of a target-weight strategy
+
+    This is a fast path for strategies that only rebalance a cash account to target weights of asset
+    accounts, like `ConstantMixStrategy` in `example.py`. It reproduces the NAV, account values and weights
+    recorded by `BrokerObserver` for the following setup:
+
+    * `BrokerSimulator(series_store, filters, default_numeraire)` with `filters` being
+      `[transaction_cost_filter]` or empty.
+    * One account per numeraire named after it: the cash account `default_numeraire` holding
+      `initial_capital` and one account per asset, created by the initial orders together with
+      `interest_orders`.
+    * `Strategy.run(trading_start_time, ...)` with `Strategy.get_target_allocation()` returning the row of
+      `target_weights` for the current tick (NaN rows mean no target allocation).
+
+    Orders are not objects here. Only the rebalancing decision depends on the path of the account units, so
+    it runs in a plain Python loop over floats: the amounts of one tick are executed at the prices of the
+    next tick, each followed by its fixed cost, and then the interest accrues. The interest year fractions
+    and the valuation of the recorded units at all ticks are calculated with numpy over the whole time axis.
+
+    :param series_store: Prices. Both edges (default_numeraire, asset) and (asset, default_numeraire) must
+        be observed at every time except the first one.
+    :param target_weights: Array of shape (len(series_store.times), len(assets)) with target weights per
+        time, or a vector of constant target weights.
+    """
+    num = checked_str_id(default_numeraire)
+    assets = [checked_str_id(asset) for asset in assets]
+    if num in assets:
+        raise ValueError(f'The default numeraire {num} must not be listed as an asset')
+    accounts = [num] + assets
+    account_index = {acc: i for i, acc in enumerate(accounts)}
+
+    edge_index = {edge: j for j, edge in enumerate(series_store.edge_list())}
+    missing = [edge for a in assets for edge in ((num, a), (a, num)) if edge not in edge_index]
+    if missing:
+        raise ValueError(f'Missing price series: {missing}')
+    times = series_store.times
+    # ask: price of an asset unit in num, bid: price of num in asset units
+    prices_ask = series_store.prices[:, [edge_index[(num, a)] for a in assets]]
+    prices_bid = series_store.prices[:, [edge_index[(a, num)] for a in assets]]
+    if np.isnan(prices_ask[1:]).any() or np.isnan(prices_bid[1:]).any():
+        raise ValueError('Prices of all assets must be observed at every time after the first one')
+
+    schedule = np.asarray(target_weights, dtype=np.float64)
+    if schedule.ndim == 1:
+        schedule = np.broadcast_to(schedule, (len(times), len(assets)))
+    if schedule.shape != (len(times), len(assets)):
+        raise ValueError(f'Wrong shape of the target weights: {schedule.shape}')
+
+    num_ticks = max(len(times) - 1, 0)
+    # the simulator starts with the second time of the grid, so row r of the inputs is tick k = r - 1
+    ask_rows = prices_ask[1:].tolist()
+    bid_rows = prices_bid[1:].tolist()
+    target_rows = schedule[1:].tolist()
+    is_trading_tick = (times[1:] >= time_to_ns(trading_start_time)).tolist()
+    has_target = (~np.isnan(schedule[1:]).any(axis=1)).tolist()
+
+    cost_account, cost, cost_var, cost_applies = None, 0.0, '', [False] * len(assets)
+    if transaction_cost_filter is not None:
+        cost_account = account_index[transaction_cost_filter.cost_account]
+        cost = transaction_cost_filter.cost
+        cost_var = transaction_cost_filter.cost_var
+        excluded = transaction_cost_filter.excluded_accounts
+        cost_applies = [not (num in excluded and a in excluded) for a in assets]
+    interest = [
+        (
+            account_index[o.account_name],
+            o.interest_rate,
+            o.value_lower_bound,
+            o.value_upper_bound,
+            o.internal_variable_key,
+        )
+        for o in interest_orders
+    ]
+    interest_saved = [o.internal_saved_value for o in interest_orders]
+    accrual_years = _get_accrual_years(times[1:], interest_orders)
+
+    units = [0.0] * len(accounts)
+    units[0] = float(initial_capital)
+    units_path = np.empty((num_ticks, len(accounts)))
+    reallocation_mass = np.full(num_ticks, np.nan)
+    variables: Dict[str, float] = {}
+    variable_series: Dict[str, np.ndarray] = {}
+    pending: List[Tuple[int, float]] = []
+    for k in range(num_ticks):
+        ask, bid = ask_rows[k], bid_rows[k]
+        # execute the orders of the previous tick like the filter chain: transfer, then its fixed cost
+        for j, v in pending:
+            a, b = ask[j], bid[j]
+            if v >= 0.0:
+                units[0] -= v / (a * b)
+                units[j + 1] += v / b
+            else:
+                units[0] -= v * b * a
+                units[j + 1] += v * a
+            if cost_account is not None and cost_applies[j]:
+                units[cost_account] -= cost
+                variables[cost_var] = variables.get(cost_var, 0.0) + cost
+        pending = []
+
+        years = accrual_years[k]
+        for i, (acc, rate, lower, upper, key) in enumerate(interest):
+            saved = interest_saved[i]
+            if not math.isnan(years[i]) and math.isfinite(saved) and lower <= saved <= upper:
+                accrued = saved * rate * years[i]
+                units[acc] += accrued
+                variables[key] = variables.get(key, 0.0) + accrued
+            interest_saved[i] = units[acc]
+
+        units_path[k] = units
+        for key, value in variables.items():
+            series = variable_series.get(key)
+            if series is None:
+                series = variable_series[key] = np.full(num_ticks, np.nan)
+            series[k] = value
+        if not is_trading_tick[k]:
+            continue
+        values = _get_values(units, ask, bid)
+        nav = sum(values)
+        if nav < NEGLIGIBLE_POSITIVE_PORTFOLIO_NAV:
+            continue
+        if not has_target[k]:
+            reallocation_mass[k] = 0.0
+            continue
+        deviations = [t - value / nav for t, value in zip(target_rows[k], values[1:])]
+        mass = sum(abs(d) for d in deviations)
+        if mass < max_rel_alloc_deviation:
+            reallocation_mass[k] = 0.0
+            continue
+        reallocation_mass[k] = mass
+        pending = [
+            (j, d * nav) for j, d in enumerate(deviations) if abs(d * nav) >= MIN_ORDER_VALUE
+        ]
+
+    account_navs = _get_values_path(units_path, prices_ask[1:], prices_bid[1:])
+    nav_series = account_navs.sum(axis=1)
+    weight_series = np.full_like(account_navs, np.nan)
+    valued = nav_series >= NEGLIGIBLE_POSITIVE_PORTFOLIO_NAV
+    weight_series[valued] = account_navs[valued] / nav_series[valued, np.newaxis]
+
+    return VectorizedBacktestResult(
+        times[1:],
+        accounts,
+        nav_series,
+        account_navs,
+        weight_series,
+        reallocation_mass,
+        variable_series,
+    )
+
+
+def _get_accrual_years(
+    times: np.ndarray, interest_orders: Sequence[InterestOrder]
+) -> List[List[float]]:
+    """Year fractions accrued by every interest order at every tick, NaN outside the accrual periods
+
+    The year fraction of a tick is measured from the previous tick, or from the time stamp saved in the
+    order for the first tick, with the rounding of `InterestOrder.execute`.
+    """
+    years = np.full((len(times), len(interest_orders)), np.nan)
+    if len(times) == 0:
+        return years.tolist()
+    for i, order in enumerate(interest_orders):
+        saved_ns = time_to_ns(order.internal_saved_value_time_stamp)
+        first = (int(times[0]) - saved_ns) // 1000 / 10**6 / order.SECONDS_IN_A_YEAR
+        elapsed_us = np.diff(times) // 1000
+        period = (times >= time_to_ns(order.accrual_start_time)) & (
+            times <= time_to_ns(order.accrual_end_time)
+        )
+        years[0, i] = first
+        years[1:, i] = elapsed_us / 10**6 / order.SECONDS_IN_A_YEAR
+        years[~period, i] = np.nan
+    return years.tolist()
+
+
+def _get_values(units: List[float], ask: List[float], bid: List[float]) -> List[float]:
+    """Account values in the default numeraire, long asset positions at bid and short ones at ask"""
+    values = [units[0]]
+    for u, a, b in zip(units[1:], ask, bid):
+        values.append(u / a if u < 0.0 else u * b)
+    return [0.0 if abs(u) < EPS_FINANCIAL else v for u, v in zip(units, values)]
+
+
+def _get_values_path(units: np.ndarray, ask: np.ndarray, bid: np.ndarray) -> np.ndarray:
+    """Vectorized `_get_values` over all ticks"""
+    values = units.copy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values[:, 1:] = np.where(units[:, 1:] < 0.0, units[:, 1:] / ask, units[:, 1:] * bid)
+    values[np.abs(units) < EPS_FINANCIAL] = 0.0
+    return values
@@ -0,0 +1,120 @@
+import asyncio
+import datetime
+import random
+
+import pytest
+
+from rhizopus.async_broker import AsyncBroker, AsyncBrokerConn, LocalExchange, LocalExchangeConn
+from rhizopus.broker import Broker, BrokerBase, BrokerState
+from rhizopus.broker_observer import BrokerObserver
+from rhizopus.broker_simulator import BrokerSimulator, SeriesStoreFromDict, TransactionCostFilter
+from rhizopus.orders import BackwardTransferOrder, CreateAccountOrder
+from rhizopus.profiling import PhaseProfiler
+
+START_TIME = datetime.datetime(2000, 1, 1)
+NUM_TICKS = 15
+
+
+def make_simulator() -> BrokerSimulator:
+    rng = random.Random(5)
+    series = {}
+    for key in [('EUR', 'USD'), ('EUR', 'JPY')]:
+        price = 1.0
+        series[key] = []
+        for t in range(NUM_TICKS):
+            price *= rng.lognormvariate(0.0, 0.02)
+            series[key].append((START_TIME + datetime.timedelta(days=t), price))
+    store = SeriesStoreFromDict(series)
+    store.add_inverse_series()
+    return BrokerSimulator(store, [TransactionCostFilter('EUR', 1.0, 'tc', [])], 'EUR')
+
+
+def make_initial_orders():
+    orders = [CreateAccountOrder(num, (0.0, num)) for num in ['USD', 'JPY']]
+    orders.append(CreateAccountOrder('EUR', (1000.0, 'EUR')))
+    return orders
+
+
+def make_orders(t: int):
+    return [
+        BackwardTransferOrder('EUR', 'USD', (10.0 + t, 'USD')),
+        BackwardTransferOrder('EUR', 'JPY', (5.0, 'EUR')),
+    ]
+
+
+def test_async_broker_matches_broker():
+    broker = Broker(make_simulator(), make_initial_orders())
+    for t in range(NUM_TICKS - 1):
+        broker.fill_orders(make_orders(t))
+        broker.next()
+
+    profiler = PhaseProfiler()
+
+    async def run() -> AsyncBroker:
+        exchange = LocalExchange(make_simulator(), latency=0.001)
+        conn = LocalExchangeConn(exchange)
+        async_broker = AsyncBroker(conn, make_initial_orders(), profiler=profiler)
+        observer = BrokerObserver(async_broker)
+        await async_broker.next()
+        for t in range(NUM_TICKS - 1):
+            await async_broker.fill_orders(make_orders(t))
+            await async_broker.next()
+            observer.update()
+        await async_broker.close()
+        await exchange.close()
+        return async_broker
+
+    async_broker = asyncio.run(run())
+    assert async_broker.get_time() == broker.get_time()
+    assert async_broker.state_to_json() == broker.state_to_json()
+    assert async_broker.get_value_portfolio() == broker.get_value_portfolio()
+    assert profiler.counts['broker.next'] == NUM_TICKS
+    assert profiler.counts['broker.fill_orders'] == NUM_TICKS - 1
+    # the coroutines do not override the synchronous methods of Broker
+    assert isinstance(async_broker, BrokerBase)
+    assert not isinstance(async_broker, Broker)
+
+
+def test_acknowledgements_overlap_with_prices():
+    async def run():
+        exchange = LocalExchange(make_simulator(), latency=0.005)
+        broker_state = BrokerState('EUR', executed_orders_window=100)
+        broker = AsyncBroker(LocalExchangeConn(exchange), make_initial_orders(), broker_state)
+        broker.start_price_stream()
+        updates = broker.subscribe_prices()
+
+        now = await broker.next()
+        fill = broker.submit_orders(make_orders(0))
+        next_tick = asyncio.ensure_future(broker.next())
+        received = []
+        async for update_time, prices in updates:
+            received.append((update_time, fill.done()))
+            if len(received) == 2:
+                break
+        assert await next_tick > now
+        assert fill.done()
+        # price updates are consumed while the acknowledgement is still pending
+        assert received[0] == (now, False)
+        assert broker.live_time == received[1][0]
+        assert broker.live_prices == dict(broker.get_current_prices())
+
+        while await broker.next() is not None:
+            pass
+        await broker.close()
+        await exchange.close()
+        return received, broker
+
+    received, broker = asyncio.run(run())
+    transfers = [o for o in broker.get_executed_orders() if type(o) == BackwardTransferOrder]
+    assert len(transfers) == 2
+    assert broker.get_accounts()['USD'][0] == pytest.approx(10.0)
+
+
+def test_conn_without_price_stream():
+    class Conn(AsyncBrokerConn):
+        def get_default_numeraire(self):
+            return 'EUR'
+
+    broker = AsyncBroker(Conn(), [])
+    with pytest.raises(ValueError):
+        broker.start_price_stream()
@@ -0,0 +1,140 @@
+import datetime
+import json
+import random
+import statistics
+from typing import Dict
+
+import numpy as np
+import pytest
+
+from rhizopus.broker import Broker
+from rhizopus.broker_observer import BrokerObserver, PortfolioStats
+from rhizopus.broker_simulator import BrokerSimulator, SeriesStoreFromDict, TransactionCostFilter
+from rhizopus.orders import CreateAccountOrder
+from rhizopus.strategy import Strategy
+
+START_TIME = datetime.datetime(2000, 1, 1)
+
+
+class ConstantMixStrategy(Strategy):
+    def __init__(self, broker, observer, target_alloc: Dict[str, float]):
+        super().__init__(broker, observer, 0.01)
+        self.target_alloc = target_alloc
+
+    def get_target_allocation(self) -> Dict[str, float]:
+        return self.target_alloc
+
+
+@pytest.fixture()
+def observer() -> BrokerObserver:
+    random.seed(11)
+    series = {}
+    for key in [('EUR', 'USD'), ('EUR', 'JPY')]:
+        price = 1.0
+        series[key] = []
+        for t in range(40):
+            price *= random.lognormvariate(0.0, 0.03)
+            series[key].append((START_TIME + datetime.timedelta(days=t), price))
+    store = SeriesStoreFromDict(series)
+    store.add_inverse_series()
+
+    market = BrokerSimulator(store, [TransactionCostFilter('EUR', 1.0, 'tc', [])], 'EUR')
+    orders = [CreateAccountOrder(num, (0.0, num)) for num in ['USD', 'JPY']]
+    orders.append(CreateAccountOrder('EUR', (1000.0, 'EUR')))
+    broker = Broker(market, orders)
+    observer = BrokerObserver(broker, volatility_window=5)
+    strategy = ConstantMixStrategy(broker, observer, {'USD': 0.5, 'JPY': 0.3})
+    strategy.run(START_TIME + datetime.timedelta(days=1), 100)
+    return observer
+
+
+def test_portfolio_stats(observer):
+    nav = observer.get_t_x(('portfolio', 'nav'))[1]
+    assert len(nav) > 10
+
+    max_nav = [max(nav[: i + 1]) for i in range(len(nav))]
+    drawdown = [1.0 - x / m for x, m in zip(nav, max_nav)]
+    returns = [nav[i] / nav[i - 1] - 1.0 for i in range(1, len(nav))]
+    volatility = [statistics.stdev(returns[max(0, i - 4) : i + 1]) for i in range(1, len(returns))]
+
+    assert observer.get_t_x(('portfolio', 'max_nav'))[1] == pytest.approx(max_nav)
+    assert observer.get_t_x(('portfolio', 'drawdown'))[1] == pytest.approx(drawdown)
+    assert observer.get_recent_observations()[('portfolio', 'max_drawdown')] == pytest.approx(
+        max(drawdown)
+    )
+    assert observer.get_t_x(('portfolio', 'volatility'))[1] == pytest.approx(volatility, abs=1e-12)
+    assert observer.get_t_x(('portfolio', 'total_return'))[1] == pytest.approx(
+        [x / nav[0] - 1.0 for x in nav[2:]]
+    )
+
+    turnover = observer.get_t_x(('portfolio', 'turnover'))[1]
+    assert len(turnover) == len(nav)
+    assert all(0.0 <= x <= 1.0 for x in turnover)
+    # the initial allocation moves 80% of the portfolio out of EUR
+    assert max(turnover) == pytest.approx(0.8, rel=1e-2)
+    # price moves without rebalancing are not turnover
+    assert 0.0 in turnover.tolist()
+
+
+def test_observer_json_settings(observer):
+    observer.rec_acc_navs = False
+    observer.rec_vars = False
+    observer1 = BrokerObserver.from_json(
+        observer.broker, json.loads(json.dumps(observer.to_json()))
+    )
+    assert observer1.rec_acc_weights
+    assert not observer1.rec_acc_navs
+    assert not observer1.rec_vars
+
+
+def test_portfolio_stats_volatility_precision():
+    # constant growth with tiny noise: the sums of returns and squared returns cancel catastrophically
+    rng = random.Random(3)
+    stats = PortfolioStats(window=20)
+    nav = 1.0
+    for _ in range(2000):
+        nav *= 1.01 + 1e-9 * rng.random()
+        stats.update_nav(nav)
+    assert stats.get_volatility() == pytest.approx(statistics.stdev(stats.returns), rel=1e-4)
+    assert stats.get_volatility() < 1e-9
+
+
+def test_portfolio_stats_json(observer):
+    stats = PortfolioStats.from_json(json.loads(json.dumps(observer.stats.to_json())))
+    assert stats.to_json() == observer.stats.to_json()
+    assert stats.get_volatility() == pytest.approx(observer.stats.get_volatility())
+    with pytest.raises(ValueError):
+        PortfolioStats(1)
+
+
+def test_arbitrage_cycles(caplog):
+    series = {('EUR', 'USD'): [], ('USD', 'JPY'): [], ('EUR', 'JPY'): []}
+    for t in range(10):
+        time = START_TIME + datetime.timedelta(days=t)
+        series[('EUR', 'USD')].append((time, 1.2))
+        series[('USD', 'JPY')].append((time, 100.0))
+        # EURJPY is too cheap on days 4 and 5
+        series[('EUR', 'JPY')].append((time, 114.0 if t in (4, 5) else 120.0))
+    store = SeriesStoreFromDict(series)
+    store.add_inverse_series()
+    broker = Broker(BrokerSimulator(store, [], 'EUR'), [CreateAccountOrder('EUR', (1.0, 'EUR'))])
+    observer = BrokerObserver(broker, detect_arbitrage=True)
+    with caplog.at_level('DEBUG', logger='rhizopus.broker_observer'):
+        for _ in range(9):
+            broker.next()
+            observer.update()
+            if broker.get_time() == START_TIME + datetime.timedelta(days=5):
+                cycles = observer.get_arbitrage_cycles()
+                assert [nums for nums, _ in cycles] == [('EUR', 'USD', 'JPY')]
+                assert cycles[0][1] == pytest.approx(120.0 / 114.0)
+
+    times, counts = observer.get_t_x(('price_graph', 'arbitrage_cycles'))
+    days = (times - np.datetime64(START_TIME, 'ns')) // np.timedelta64(1, 'D')
+    assert days[counts > 0].tolist() == [4, 5]
+    # the cycle persists for two days, but only its appearance is a warning
+    levels = [r.levelname for r in caplog.records if 'Arbitrage cycle' in r.getMessage()]
+    assert levels == ['WARNING', 'DEBUG']
+    assert max(observer.get_t_x(('price_graph', 'max_cycle_gain'))[1]) == pytest.approx(6.0 / 114.0)
+
+    observer1 = BrokerObserver.from_json(broker, json.loads(json.dumps(observer.to_json())))
+    assert observer1.arbitrage_detector is not None
@@ -1,10 +1,19 @@
+import collections
 import random
 import datetime
 
 import pytest
 
-from rhizopus.broker import Broker, BrokerState
-from rhizopus.broker_simulator import BrokerSimulator, TransactionCostFilter, SeriesStoreFromDict
+from rhizopus.broker import Broker, BrokerError, BrokerState
+from rhizopus.broker_simulator import (
+    BrokerSimulator,
+    Filter,
+    OrderChainView,
+    TransactionCostFilter,
+    SeriesStoreFromDict,
+    SeriesStoreColumnar,
+    SeriesStoreMemmap,
+)
 from rhizopus.orders import CreateAccountOrder, BackwardTransferOrder
 
 
@@ -157,3 +166,236 @@ def test_observer1():
     assert broker_state_copy != BrokerState.from_json(
         broker.state_to_json()
     )  # test broker state serialization
+
+
+def some_sparse_series(start_time: datetime.datetime, n: int = 50):
+    series = {}
+    for key in [('EUR', 'USD'), ('USD', 'JPY'), ('SPX', 'USD')]:
+        series[key] = [
+            (start_time + datetime.timedelta(hours=t), random.gammavariate(4.0, 1.0))
+            for t in range(n)
+            if random.uniform(0.0, 1.0) > 0.3
+        ]
+    return series
+
+
+def test_series_store_columnar():
+    start_time = datetime.datetime(2000, 1, 1)
+    series = some_sparse_series(start_time)
+    dict_store = SeriesStoreFromDict(series)
+    dict_store.add_inverse_series()
+    columnar_store = SeriesStoreColumnar.from_dict(series)
+    columnar_store.add_inverse_series()
+
+    assert columnar_store.edges() == dict_store.edges()
+    assert columnar_store.vertices() == dict_store.vertices()
+    assert columnar_store.get_min_time() == dict_store.get_min_time()
+    assert columnar_store.get_max_time() == dict_store.get_max_time()
+    for edge in dict_store.edges():
+        assert columnar_store[edge] == dict_store[edge]
+    assert columnar_store[('EUR', 'CHF')] is None
+
+    columnar_store[('EUR', 'CHF')] = [(start_time, 1.1)]
+    assert columnar_store[('EUR', 'CHF')] == [(start_time, 1.1)]
+    assert columnar_store[('EUR', 'USD')] == dict_store[('EUR', 'USD')]
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_columnar_simulator(columnar: bool):
+    start_time = datetime.datetime(2000, 1, 1)
+    series = some_sparse_series(start_time)
+    additional_times = [
+        start_time - datetime.timedelta(days=1),
+        start_time + datetime.timedelta(minutes=1),
+    ]
+
+    dict_store = SeriesStoreFromDict(series)
+    dict_store.add_inverse_series()
+    store = dict_store if columnar else SeriesStoreColumnar.from_series_store(dict_store)
+    market0 = BrokerSimulator(dict_store, [], 'EUR', additional_times=additional_times)
+    market1 = BrokerSimulator(
+        store, [], 'EUR', additional_times=additional_times, columnar=columnar
+    )
+
+    state0, state1 = BrokerState('EUR'), BrokerState('EUR')
+    while True:
+        now = market0.next(state0)
+        assert now == market1.next(state1)
+        if now is None:
+            break
+        assert state0.current_prices == state1.current_prices
+
+
+def test_series_store_memmap(tmp_path, monkeypatch):
+    start_time = datetime.datetime(2000, 1, 1)
+    series = some_sparse_series(start_time, 200)
+    dict_store = SeriesStoreFromDict(series)
+    monkeypatch.setattr(SeriesStoreMemmap, 'CHUNK_SIZE', 7)
+    store = SeriesStoreMemmap.create(str(tmp_path), dict_store)
+    store.add_inverse_series()
+    dict_store.add_inverse_series()
+
+    for s in [store, SeriesStoreMemmap(str(tmp_path))]:
+        assert s.edges() == dict_store.edges()
+        assert s.vertices() == dict_store.vertices()
+        assert s.get_min_time() == dict_store.get_min_time()
+        assert s.get_max_time() == dict_store.get_max_time()
+        for edge in dict_store.edges():
+            assert s[edge] == pytest.approx(dict_store[edge])
+        assert s[('EUR', 'CHF')] is None
+
+    t0, t1 = start_time + datetime.timedelta(hours=50), start_time + datetime.timedelta(hours=80)
+    edge = ('EUR', 'USD')
+    expected = [(t, x) for t, x in dict_store[edge] if t0 <= t <= t1]
+    times, prices = store.get_window(edge, t0, t1)
+    assert prices.tolist() == [x for _, x in expected]
+    assert list(store.iter_series(edge, t0)) == list(dict_store.iter_series(edge, t0))
+    assert list(store.iter_series(edge, t0))[: len(expected)] == expected
+
+    market0 = BrokerSimulator(dict_store, [], 'EUR')
+    market1 = BrokerSimulator(store, [], 'EUR')
+    state0, state1 = BrokerState('EUR'), BrokerState('EUR')
+    while market0.next(state0) is not None:
+        assert market1.next(state1) == state0.now
+        assert state0.current_prices == pytest.approx(state1.current_prices)
+
+
+@pytest.mark.parametrize('bounded', [False, True])
+def test_streaming_simulator(tmp_path, bounded: bool):
+    start_time = datetime.datetime(2000, 1, 1)
+    series = some_sparse_series(start_time, 100)
+    dict_store = SeriesStoreFromDict(series)
+    dict_store.add_inverse_series()
+    memmap_store = SeriesStoreMemmap.create(str(tmp_path), dict_store)
+    additional_times = [
+        start_time - datetime.timedelta(days=1),
+        start_time + datetime.timedelta(minutes=1),
+    ]
+    kwargs = {'additional_times': additional_times}
+    if bounded:
+        kwargs['start_time_not_before'] = start_time + datetime.timedelta(hours=10)
+        kwargs['end_time_not_after'] = start_time + datetime.timedelta(hours=60)
+
+    market0 = BrokerSimulator(dict_store, [], 'EUR', **kwargs)
+    markets = [
+        BrokerSimulator(dict_store, [], 'EUR', streaming=True, **kwargs),
+        BrokerSimulator(memmap_store, [], 'EUR', streaming=True, **kwargs),
+        BrokerSimulator(dict_store, [], 'EUR', columnar=True, **kwargs),
+    ]
+    state0, states = BrokerState('EUR'), [BrokerState('EUR') for _ in markets]
+    num_ticks = 0
+    while True:
+        now = market0.next(state0)
+        for market, state in zip(markets, states):
+            assert market.next(state) == now
+            assert state.current_prices == state0.current_prices
+            if now is not None:
+                assert state.time_index == state0.time_index
+        if now is None:
+            break
+        num_ticks += 1
+        if bounded:
+            assert kwargs['start_time_not_before'] < now <= kwargs['end_time_not_after']
+    assert num_ticks > 0
+    for market, state in zip(markets, states):
+        with pytest.raises(BrokerError):
+            market.next(state)
+
+
+@pytest.mark.parametrize('mode', ['dict', 'columnar', 'streaming'])
+def test_resume_from_cursor_state(mode: str):
+    start_time = datetime.datetime(2000, 1, 1)
+    series_store = SeriesStoreFromDict(some_sparse_series(start_time, 60))
+    series_store.add_inverse_series()
+    kwargs = {
+        'columnar': mode == 'columnar',
+        'streaming': mode == 'streaming',
+        'additional_times': [start_time - datetime.timedelta(days=1)],
+        'start_time_not_before': start_time + datetime.timedelta(hours=5),
+        'silent': True,
+    }
+    filters = [TransactionCostFilter('EUR', 1.0, 'tc', [])]
+
+    def run(broker: Broker, num_ticks: int):
+        times = []
+        for _ in range(num_ticks):
+            broker.fill_order(BackwardTransferOrder('EUR', 'USD', (1.0, 'USD')))
+            times.append(broker.next())
+        return times
+
+    initial_orders = [
+        CreateAccountOrder('EUR', (100.0, 'EUR')),
+        CreateAccountOrder('USD', (0.0, 'USD')),
+    ]
+    market = BrokerSimulator(series_store, filters, 'EUR', **kwargs)
+    broker = Broker(market, initial_orders, silent=True)
+    run(broker, 10)
+    cursor_state = market.get_cursor_state()
+    state_json = broker.state_to_json()
+    times = run(broker, 20)
+
+    market1 = BrokerSimulator(series_store, filters, 'EUR', cursor_state=cursor_state, **kwargs)
+    broker1 = Broker(market1, [], broker_state=BrokerState.from_json(state_json), silent=True)
+    assert market1.get_cursor_state() == cursor_state
+    assert run(broker1, 20) == times
+    assert broker1.state_to_json() == broker.state_to_json()
+    assert market1.get_cursor_state() == market.get_cursor_state()
+
+    cursor_state['time_index'] += 1
+    with pytest.raises(ValueError):
+        BrokerSimulator(series_store, filters, 'EUR', cursor_state=cursor_state, **kwargs)
+
+
+class QueueRecordingFilter(Filter):
+    def __init__(self):
+        self.queues = []
+
+    def __call__(self, broker_state, order):
+        assert isinstance(broker_state.active_orders, OrderChainView)
+        assert not hasattr(broker_state.active_orders, 'append')
+        view, queue = broker_state.active_orders, list(broker_state.active_orders)
+        self.queues.append(queue)
+        assert len(view) == len(queue)
+        # the OrderBook queries work on the whole chain
+        assert view.get_by_gid(order.gid) == [o for o in queue if o.gid == order.gid]
+        assert view.get_by_account('USD') == [o for o in queue if 'USD' in order_accounts(o)]
+        assert view.get_by_class('CreateAccountOrder') == [
+            o for o in queue if type(o) == CreateAccountOrder
+        ]
+        assert view.count_by_class() == collections.Counter(type(o).__name__ for o in queue)
+        assert [view[i] for i in range(len(queue))] == queue
+        assert view[-1:] == queue[-1:]
+        with pytest.raises(IndexError):
+            view[len(queue)]
+        return order
+
+
+def order_accounts(order) -> set:
+    return {getattr(order, attr, None) for attr in ('account_name', 'acc0', 'acc1')}
+
+
+def test_fill_orders_batch():
+    start_time = datetime.datetime(2000, 1, 1)
+    series_store = SeriesStoreFromDict(some_sparse_series(start_time))
+    series_store.add_inverse_series()
+    recording_filter = QueueRecordingFilter()
+    filters = [TransactionCostFilter('EUR', 1.0, 'tc', []), recording_filter]
+    market = BrokerSimulator(series_store, filters, 'EUR', silent=True)
+    broker_state = BrokerState('EUR')
+    market.next(broker_state)
+
+    resting_order = CreateAccountOrder('EUR', (100.0, 'EUR'))
+    market.fill_order(resting_order, broker_state)
+    orders = [BackwardTransferOrder('EUR', 'USD', (1.0, 'USD')) for _ in range(2)]
+    market.fill_orders(orders, broker_state)
+
+    assert [o.gid for o in [resting_order] + orders] == [1, 2, 3]
+    active_orders = list(broker_state.active_orders)
+    # each transfer is followed by two transaction cost orders
+    assert len(active_orders) == 7
+    assert active_orders[:2] == [resting_order, orders[0]]
+    assert recording_filter.queues[0] == []
+    assert len(recording_filter.queues) == 7
+    # the filter sees the resting order, the remaining inputs and its outputs so far
+    assert recording_filter.queues[1] == [resting_order] + active_orders[2:]
+    assert recording_filter.queues[2] == [resting_order] + active_orders[3:] + [orders[0]]
@@ -1,6 +1,16 @@
 import random
 import pytest
-from rhizopus.broker import BrokerState, BrokerStateError, NullBrokerConn, Broker
+from rhizopus.broker import (
+    BrokerState,
+    BrokerStateError,
+    NullBrokerConn,
+    Broker,
+    AgeOrderedOrderBook,
+    OrderBook,
+    OrderStatus,
+    ValidationLevel,
+)
+from rhizopus.orders import BackwardTransferOrder, CreateAccountOrder, InterestOrder
 
 
 @pytest.fixture()
@@ -31,6 +41,55 @@ def test_wrong_broker_state_time_index(sample_broker_state, time_index):
         broker_state.check()
 
 
+def test_validation_off(sample_broker_state):
+    broker_state: BrokerState = sample_broker_state()
+    broker_state.set_validation(ValidationLevel.OFF)
+    broker_state.default_numeraire = ''
+    broker_state.check()
+
+
+@pytest.mark.parametrize('level', [ValidationLevel.ROUND_TRIP, ValidationLevel.SAMPLED_ROUND_TRIP])
+def test_validation_round_trip(sample_broker_state, monkeypatch, level):
+    def round_trips(seed: int):
+        broker_state: BrokerState = sample_broker_state()
+        broker_state.set_validation(level, interval=4, seed=seed)
+        broker = Broker(NullBrokerConn(), [], broker_state)
+        calls = []
+        to_json = broker_state.to_json
+        monkeypatch.setattr(broker_state, 'to_json', lambda: calls.append(1) or to_json())
+        checks = []
+        for _ in range(100):
+            broker.next()
+            checks.append(len(calls))
+        return checks
+
+    checks = round_trips(1)
+    assert checks == round_trips(1)
+    assert 10 < checks[-1] < 40
+    if level == ValidationLevel.ROUND_TRIP:
+        assert checks[-1] == 25
+        assert checks == round_trips(2)
+
+
+@pytest.mark.parametrize('level', [ValidationLevel.INVARIANTS, ValidationLevel.ROUND_TRIP])
+def test_validation_invariants(sample_broker_state, level):
+    broker_state: BrokerState = sample_broker_state()
+    broker_state.set_validation(level, interval=1)
+    broker_state.time_index = -1
+    with pytest.raises(BrokerStateError):
+        broker_state.check()
+
+
+def test_validation_settings_are_persisted(sample_broker_state):
+    broker_state: BrokerState = sample_broker_state()
+    assert broker_state.validation_level == BrokerState.DEFAULT_VALIDATION_LEVEL
+    broker_state.set_validation(ValidationLevel.SAMPLED_ROUND_TRIP, interval=7, seed=3)
+    restored = BrokerState.from_json(broker_state.to_json())
+    assert restored.validation_level == ValidationLevel.SAMPLED_ROUND_TRIP
+    assert restored.validation_interval == 7
+    assert restored.validation_seed == 3
+
+
 def test_account_value_with_price_spread_short_position():
     """Test whether bid-ask spreads are correctly used when valuating short positions"""
 
@@ -52,3 +111,182 @@ def test_account_value_with_price_spread_short_position():
 
     assert value_long < abs(value_short)
     assert broker.get_value_portfolio() < 0.0
+
+
+def test_valuation_cache(monkeypatch):
+    accounts = {'EUR': (100.0, 'EUR'), 'USD': (10.0, 'USD')}
+    broker_state = BrokerState('EUR', accounts)
+    broker_state.recent_prices = {('USD', 'EUR'): 0.5, ('EUR', 'USD'): 2.0}
+    broker = Broker(NullBrokerConn(), [], broker_state)
+
+    calls = []
+    calc_value_account = broker._calc_value_account
+    monkeypatch.setattr(
+        broker, '_calc_value_account', lambda *args: calls.append(args) or calc_value_account(*args)
+    )
+
+    for _ in range(3):
+        assert broker.get_value_portfolio() == 105.0
+        assert broker.get_weight_all_accounts() == {'EUR': 100.0 / 105.0, 'USD': 5.0 / 105.0}
+        assert broker.get_value_all_accounts() == {'EUR': 100.0, 'USD': 5.0}
+        assert broker.get_value_account('USD') == 5.0
+    assert len(calls) == len(accounts)
+    assert broker.get_value_portfolio('USD') == 210.0
+    assert len(calls) == 2 * len(accounts)
+
+    broker_state.recent_prices[('USD', 'EUR')] = 1.0
+    broker.next()
+    # only the requested account is valued
+    assert broker.get_value_account('USD') == 10.0
+    assert len(calls) == 2 * len(accounts) + 1
+    assert broker.get_value_portfolio() == 110.0
+    assert len(calls) == 3 * len(accounts)
+
+    # filling orders drops the valuations, the price graph is kept until next()
+    graph = broker.get_price_graph()
+    broker.fill_orders([CreateAccountOrder('JPY', (0.0, 'JPY'))])
+    assert broker.get_price_graph() is graph
+    assert broker.get_value_portfolio() == 110.0
+    assert len(calls) == 4 * len(accounts)
+    broker.next()
+    assert broker.get_price_graph() is not graph
+
+
+def test_order_book():
+    orders = [
+        CreateAccountOrder('EUR', (1.0, 'EUR'), gid=1),
+        BackwardTransferOrder('EUR', 'USD', (1.0, 'USD'), gid=2),
+        BackwardTransferOrder('USD', 'JPY', (1.0, 'USD'), gid=2),
+        InterestOrder('JPY', 0.01, gid=3),
+    ]
+    book = OrderBook(orders, maxlen=4)
+    assert list(book) == orders
+    assert book.get_by_gid(2) == orders[1:3]
+    assert book.get_by_gid(4) == []
+    assert book.get_by_account('USD') == orders[1:3]
+    assert book.get_by_account('JPY') == orders[2:]
+    assert book.get_by_class('BackwardTransferOrder') == orders[1:3]
+    assert book.count_by_class() == {
+        'CreateAccountOrder': 1,
+        'BackwardTransferOrder': 2,
+        'InterestOrder': 1,
+    }
+    with pytest.raises(ValueError):
+        book.append(orders[0])
+
+    book.remove(orders[2])
+    assert orders[2] not in book
+    assert book.get_by_account('USD') == orders[1:2]
+    with pytest.raises(ValueError):
+        book.remove(orders[2])
+
+    # a full book drops the first appended order
+    book.extend(orders[2:3] + [CreateAccountOrder('GBP', (1.0, 'GBP'))])
+    assert len(book) == 4
+    assert orders[0] not in book
+    assert book.get_by_gid(1) == []
+    assert book.count_by_class()['CreateAccountOrder'] == 1
+
+    book.clear()
+    assert len(book) == 0 and book.count_by_class() == {}
+
+
+def test_order_book_changed_order():
+    order = BackwardTransferOrder('EUR', 'USD', (1.0, 'USD'), gid=1)
+    book = AgeOrderedOrderBook([order, InterestOrder('EUR', 0.01, gid=2)])
+    order.gid = 3
+    order.acc1 = 'JPY'
+    assert book.get_by_gid(1) == [order]
+    assert book.get_by_account('JPY') == []
+
+    book.remove(order)
+    assert order not in book
+    assert book.get_by_gid(1) == book.get_by_gid(3) == []
+    assert book.get_by_account('USD') == []
+    assert book.get_by_account('EUR') == book.get_by_gid(2)
+    assert book.count_by_class() == {'InterestOrder': 1}
+
+
+def test_age_ordered_order_book():
+    orders = [BackwardTransferOrder('EUR', 'USD', (1.0, 'USD'), age=age) for age in [3, 0, 5, 0]]
+    book = AgeOrderedOrderBook(orders)
+    assert list(book) == [orders[1], orders[3], orders[0], orders[2]]
+
+    book.remove(orders[0])
+    book.increment_ages()
+    assert [o.age for o in orders] == [3, 1, 6, 1]
+    new_order = InterestOrder('USD', 0.01)
+    book.append(new_order)
+    assert list(book) == [new_order, orders[1], orders[3], orders[2]]
+    assert list(book) == sorted(book, key=lambda o: o.age)
+
+    book.remove(orders[3])
+    book.remove(new_order)
+    book.increment_ages()
+    assert list(book) == [orders[1], orders[2]]
+    assert [o.age for o in book] == [2, 7]
+    book.clear()
+    assert list(book) == []
+
+
+def test_age_ordered_order_book_eviction(caplog):
+    orders = [BackwardTransferOrder('EUR', 'USD', (1.0, 'USD'), age=age) for age in [3, 0, 5]]
+    book = AgeOrderedOrderBook(orders, maxlen=3)
+    book.remove(orders[0])
+    book.append(orders[0])
+    new_orders = [InterestOrder('EUR', 0.01, age=age) for age in [9, 1]]
+    with caplog.at_level('WARNING', logger='rhizopus.broker'):
+        book.extend(new_orders)
+    # the first appended orders are dropped, not the youngest or the oldest ones
+    assert list(book) == [new_orders[1], orders[0], new_orders[0]]
+    assert book.get_by_account('USD') == [orders[0]]
+    assert len(caplog.records) == 2
+
+
+def test_find_and_cancel_active_orders():
+    broker = Broker(NullBrokerConn(), [], BrokerState('EUR'))
+    broker.next()
+    orders = [
+        BackwardTransferOrder('EUR', 'USD', (1.0, 'USD'), gid=1),
+        BackwardTransferOrder('USD', 'JPY', (1.0, 'USD'), gid=1),
+        InterestOrder('USD', 0.01, gid=2),
+    ]
+    broker._broker_state.active_orders.extend(orders)
+
+    assert broker.find_active_orders() == orders
+    assert broker.find_active_orders(gid=1) == orders[:2]
+    assert broker.find_active_orders(gid=1, account='JPY') == orders[1:2]
+    assert broker.find_active_orders(account='USD', class_name='InterestOrder') == orders[2:]
+    assert broker.find_active_orders(class_name='CreateAccountOrder') == []
+
+    assert broker.cancel_order(orders[0])
+    assert not broker.cancel_order(orders[0])
+    assert orders[0].status == OrderStatus.REJECTED
+    assert broker.get_active_orders() == orders[1:]
+    assert list(broker._broker_state.rejected_orders) == orders[:1]
+
+
+def test_fill_orders(caplog):
+    class RecordingBrokerConn(NullBrokerConn):
+        def __init__(self):
+            super().__init__()
+            self.filled = []
+
+        def fill_order(self, order, broker_state):
+            self.filled.append(order)
+
+    conn = RecordingBrokerConn()
+    broker = Broker(conn, [], BrokerState('EUR'))
+    broker.next()
+    orders = [
+        BackwardTransferOrder('EUR', 'USD', (1.0, 'USD')),
+        BackwardTransferOrder('USD', 'JPY', (1.0, 'USD')),
+        InterestOrder('USD', 0.01),
+    ]
+    with caplog.at_level('INFO'):
+        broker.fill_orders(orders)
+        broker.fill_orders([])
+    assert conn.filled == orders
+    assert all(o.status_time_stamp == broker.get_time() for o in orders)
+    assert len(caplog.records) == 1
+    assert 'BackwardTransferOrder:2 InterestOrder:1' in caplog.text
@@ -0,0 +1,105 @@
+import datetime
+import gc
+import math
+import os
+
+import numpy as np
+import pytest
+
+from rhizopus.broker import Broker, BrokerState, OrderStatus
+from rhizopus.broker_simulator import BrokerSimulator, SeriesStoreFromDict, TransactionCostFilter
+from rhizopus.ledger import NO_STRING_ID, ExecutionLedger
+from rhizopus.orders import BackwardTransferOrder, CreateAccountOrder
+
+START_TIME = datetime.datetime(2000, 1, 1)
+
+
+def run_broker(ledger: ExecutionLedger, executed_orders_window: int = 100) -> Broker:
+    series = {('EUR', 'USD'): [(START_TIME + datetime.timedelta(days=t), 1.2) for t in range(10)]}
+    series_store = SeriesStoreFromDict(series)
+    series_store.add_inverse_series()
+    market = BrokerSimulator(series_store, [TransactionCostFilter('EUR', 1.0, 'tc', [])], 'EUR')
+    orders = [CreateAccountOrder('EUR', (100.0, 'EUR')), CreateAccountOrder('USD', (0.0, 'USD'))]
+    broker_state = BrokerState('EUR', ledger=ledger, executed_orders_window=executed_orders_window)
+    broker = Broker(market, orders, broker_state=broker_state, silent=True)
+    broker.next()
+    for i in range(8):
+        broker.fill_orders([BackwardTransferOrder('EUR', 'USD', (1.0 + i, 'USD'))])
+        broker.fill_order(BackwardTransferOrder('EUR', 'GBP', (1.0, 'EUR')))
+        broker.next()
+    return broker
+
+
+def test_execution_ledger():
+    broker = run_broker(ExecutionLedger())
+    ledger = broker.get_execution_ledger()
+    executed = broker.get_executed_orders()
+    rejected_orders = list(broker._broker_state.rejected_orders)
+    columns = ledger.to_arrays()
+
+    assert len(rejected_orders) == 8
+    assert len(ledger) == len(executed) + len(rejected_orders)
+    assert all(len(column) == len(ledger) for column in columns.values())
+    is_executed = columns['status'] == OrderStatus.EXECUTED.value
+    assert is_executed.sum() == len(executed)
+    assert columns['gid'][is_executed].tolist() == [o.gid for o in executed]
+    assert np.all(np.diff(columns['time_index']) >= 0)
+
+    transfers = columns['class_id'] == ledger.strings.index('BackwardTransferOrder')
+    transfers &= is_executed
+    assert columns['amount'][transfers].tolist() == [1.0 + i for i in range(8)]
+    assert {ledger.strings[i] for i in columns['acc1_id'][transfers]} == {'USD'}
+    assert columns['rec_price_b'][transfers].tolist() == [1.0] * 8
+    rejected = ~is_executed
+    assert {ledger.strings[i] for i in columns['acc1_id'][rejected]} == {'GBP'}
+    assert all(ledger.strings[i].startswith('Unable') for i in columns['comment_id'][rejected])
+    assert (columns['comment_id'][is_executed] == NO_STRING_ID).all()
+    assert math.isnan(columns['rec_price_a'][columns['class_id'] == 0][0])
+
+
+def test_execution_ledger_spill(tmp_path):
+    columns = run_broker(ExecutionLedger()).get_execution_ledger().to_arrays()
+    ledger = run_broker(ExecutionLedger(str(tmp_path), chunk_size=5)).get_execution_ledger()
+    # rows of one tick go into the same chunk
+    assert 0 < len(list(tmp_path.glob('chunk_*.npz'))) <= len(ledger) // 5
+    for name, column in ledger.to_arrays().items():
+        assert np.array_equal(column, columns[name], equal_nan=True), name
+
+    ledger.flush()
+    ledger1 = ExecutionLedger.load(str(tmp_path))
+    assert len(ledger1) == len(ledger)
+    assert ledger1.strings == ledger.strings
+    for name, column in ledger1.to_arrays().items():
+        assert np.array_equal(column, columns[name], equal_nan=True), name
+
+    with pytest.raises(ValueError):
+        ExecutionLedger().flush()
+
+
+def test_execution_ledger_memory_budget():
+    columns = run_broker(ExecutionLedger()).get_execution_ledger().to_arrays()
+    broker = run_broker(ExecutionLedger(chunk_size=5, memory_budget=1000), executed_orders_window=0)
+    ledger = broker.get_execution_ledger()
+    assert broker.get_executed_orders() == []
+    assert len(ledger) == len(columns['gid'])
+
+    spill_dir = ledger.spill_dir
+    assert spill_dir is not None and os.path.isdir(spill_dir)
+    assert len(os.listdir(spill_dir)) > 1
+    for name, column in ledger.to_arrays().items():
+        assert np.array_equal(column, columns[name], equal_nan=True), name
+    del broker, ledger
+    gc.collect()
+    assert not os.path.exists(spill_dir)
+
+
+def test_executed_orders_of_old_checkpoint():
+    broker = run_broker(ExecutionLedger())
+    data = broker.state_to_json()
+    executed = data['executed_orders']
+    assert len(executed) > 0
+    # checkpoints written before the window was introduced keep their executed orders
+    del data['executed_orders_window']
+    broker_state = BrokerState.from_json(data)
+    assert broker_state.executed_orders_window == len(executed)
+    assert [o.to_json() for o in broker_state.executed_orders] == executed
@@ -1,3 +1,6 @@
+import json
+import sys
+
 import pytest
 from rhizopus.broker import BrokerState, OrderStatus, Order
 from rhizopus.orders import (
@@ -140,3 +143,15 @@ def test_order_serialization0(order):
     order_serialized = order.to_json()
     order_deserialized = Order.from_json(order_serialized)
     assert order == order_deserialized
+
+
+def test_order_slots_and_interned_ids():
+    order = BackwardTransferOrder(''.join(['EUR', '_CASH']), 'USD_CASH', (1.0, ''.join('XAU')))
+    assert not hasattr(order, '__dict__')
+    with pytest.raises(AttributeError):
+        order.some_attribute = 1.0
+    order_deserialized = Order.from_json(json.loads(json.dumps(order.to_json())))
+    assert json.dumps(order_deserialized.to_json()) == json.dumps(order.to_json())
+    assert order_deserialized.acc0 is order.acc0
+    assert order_deserialized.amount[1] is order.amount[1]
+    assert InterestOrder('EUR', 0.01).internal_variable_key is sys.intern('interest_EUR')
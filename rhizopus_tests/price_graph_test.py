@@ -1,5 +1,13 @@
+import math
+
 import pytest
-from rhizopus.price_graph import find_path, calc_path_price
+from rhizopus.price_graph import (
+    MAX_PATH_DEPTH,
+    ArbitrageDetector,
+    PriceGraph,
+    find_path,
+    calc_path_price,
+)
 
 
 def test_find_path1():
@@ -53,3 +61,114 @@ def test_one_way():
 
     assert calc_path_price(prices, 'EUR', 'XAU') == 1000.0
     assert calc_path_price(prices, 'XAU', 'EUR') is None
+
+
+def test_price_graph_matches_path_price():
+    spread = 0.95
+    prices = {
+        ('EUR', 'USD'): 1.2 * spread,
+        ('USD', 'EUR'): spread * 1.0 / 1.2,
+        ('XAU', 'USD'): spread * 1000.0 * 1.2,
+        ('USD', 'XAU'): spread * 1.0 / (1000.0 * 1.2),
+        ('USD', 'JPY'): 110.0,
+    }
+    graph = PriceGraph(prices)
+
+    assert len(graph) == 4
+    for num0 in graph.numeraires + ['ETH']:
+        for num1 in graph.numeraires + ['ETH']:
+            expected = calc_path_price(prices, num0, num1)
+            assert graph.get_price(num0, num1) == pytest.approx(expected)
+    assert graph.get_price(None, 'EUR') is None
+
+
+def test_price_graph_best_path():
+    prices = {
+        ('A', 'B'): 2.0,
+        ('B', 'D'): 2.0,
+        ('A', 'C'): 3.0,
+        ('C', 'D'): 3.0,
+        ('B', 'A'): 1.0,
+    }
+    graph = PriceGraph(prices)
+
+    assert graph.get_price('A', 'D') == 9.0
+    assert graph.get_price('B', 'D') == 2.0  # direct edges have precedence
+    assert graph.get_price('D', 'A') is None
+    # the depth-first search of calc_path_price takes the first path A -> B -> D
+    assert calc_path_price(prices, 'A', 'D') == 4.0
+
+
+def test_price_graph_inconsistent_quotes():
+    # A -> B -> A is a profitable cycle
+    prices = {('A', 'B'): 2.0, ('B', 'A'): 0.75, ('B', 'C'): 1.0, ('C', 'D'): 1.0}
+    graph = PriceGraph(prices)
+    assert graph.get_price('A', 'D') == 2.0
+    assert graph.get_price('B', 'D') == 1.0 == calc_path_price(prices, 'B', 'D')
+
+    # longer paths can run through the cycle
+    graph = PriceGraph(prices, max_depth=5)
+    assert graph.get_price('A', 'D') == 3.0
+    assert graph.get_price('B', 'D') == 1.5
+    assert graph.get_price('B', 'C') == 1.0  # direct edge
+    assert graph.get_price('D', 'A') is None
+
+
+def test_price_graph_is_lazy():
+    prices = {('EUR', 'USD'): 1.2, ('USD', 'JPY'): 110.0, ('JPY', 'CHF'): 0.01}
+    graph = PriceGraph(prices)
+    prices[('EUR', 'JPY')] = 1.0  # the graph keeps its own copy
+
+    assert graph.get_price('EUR', 'USD') == 1.2
+    assert graph._edge_src is None and graph._columns == {}
+    assert graph.get_price('EUR', 'JPY') == pytest.approx(132.0)
+    assert graph.get_price('USD', 'JPY') == 110.0
+    assert list(graph._columns) == [graph.index['JPY']]
+    assert graph.get_price('EUR', 'CHF') == pytest.approx(1.32)
+    assert len(graph._columns) == 2
+
+
+@pytest.mark.parametrize('chain_len', [2, 3, 5, 10])
+def test_price_graph_max_depth(chain_len: int):
+    prices = {}
+    for i in range(chain_len):
+        prices[(f'N{i}', f'N{i+1}')] = 2.0
+        prices[(f'N{i+1}', f'N{i}')] = 0.5
+    graph = PriceGraph(prices)
+
+    if chain_len <= MAX_PATH_DEPTH:
+        assert graph.get_price('N0', f'N{chain_len}') == 2.0**chain_len
+        assert graph.get_price(f'N{chain_len}', 'N0') == 0.5**chain_len
+    else:
+        assert graph.get_price('N0', f'N{chain_len}') is None
+        assert graph.get_price(f'N{chain_len}', 'N0') is None
+
+
+def test_arbitrage_detector():
+    spread = 0.99
+    rates = {'EUR': 1.0, 'USD': 1.2, 'JPY': 130.0, 'CHF': 0.95, 'XAU': 0.001}
+    prices = {}
+    for num0, rate0 in rates.items():
+        for num1, rate1 in rates.items():
+            if num0 != num1:
+                prices[(num0, num1)] = rate1 / rate0
+    detector = ArbitrageDetector()
+    # exact inverse quotes are only rounding errors away from 1.0
+    assert detector.find_cycles(prices) == []
+    prices = {key: price * spread for key, price in prices.items()}
+    assert detector.find_cycles(prices) == []
+
+    prices[('USD', 'JPY')] *= 1.05
+    cycles = detector.find_cycles(prices)
+    assert len(cycles) > 0
+    for nums, product in cycles:
+        assert 'USD' in nums and 'JPY' in nums
+        assert nums[0] == min(nums)
+        path = zip(nums, nums[1:] + nums[:1])
+        assert product == pytest.approx(math.prod(prices[edge] for edge in path))
+        assert product > 1.0
+
+    prices[('USD', 'JPY')] /= 1.05
+    prices[('GBP', 'EUR')] = 1.1
+    assert detector.find_cycles(prices) == []
+    assert 'GBP' in detector.index
@@ -1,3 +1,4 @@
+import datetime
 import sys
 
 import pytest
@@ -5,8 +6,17 @@ import math
 from rhizopus.primitives import (
     EPS_FINANCIAL,
     NEGLIGIBLE_POSITIVE_PORTFOLIO_NAV,
+    MIN_TIME,
+    MAX_TIME,
     float_almost_equal,
     float_seq_almost_equal,
+    time_to_ns,
+    ns_to_time,
+    is_trusted_validation,
+    raise_for_key,
+    raise_for_str_id,
+    raise_for_value,
+    trusted_validation,
 )
 
 
@@ -85,3 +95,67 @@ def test_float_array_almost_equal():
 
     assert not float_seq_almost_equal([1.0], [1.0, 0.0])
     assert not float_seq_almost_equal([1.0], [2.0])
+
+
+@pytest.mark.parametrize(
+    't', [MIN_TIME, MAX_TIME, datetime.datetime(2021, 9, 20, 13, 14, 15, 161718)]
+)
+def test_time_ns_round_trip(t):
+    assert ns_to_time(time_to_ns(t)) == t
+    assert time_to_ns(t + datetime.timedelta(microseconds=1)) == time_to_ns(t) + 1000
+
+
+def test_validation_cache():
+    for _ in range(2):
+        raise_for_key(('account', 'EUR', 'nav'))
+        raise_for_key('nav')
+        raise_for_str_id('EUR')
+    for key in [('account', 'EUR|USD'), ('account', 1), ('account', ['x']), ('x',), 'a|b', '']:
+        with pytest.raises((TypeError, ValueError)):
+            raise_for_key(key)
+    with pytest.raises(TypeError):
+        raise_for_str_id('')
+
+
+@pytest.mark.parametrize(
+    'value, min_allowed, max_allowed',
+    [
+        (1.0, -1e24, 1e24),
+        (7, -1e24, 1e24),
+        (0.7, 1.0, 10.0),
+        (11.0, 1.0, 10.0),
+        (math.nan, -1e24, 1e24),
+        (math.inf, -1e24, 1e24),
+        (-math.inf, -math.inf, 0.0),
+        (math.inf, 0.0, math.inf),
+        ('1.0', -1e24, 1e24),
+    ],
+)
+def test_raise_for_value(value, min_allowed, max_allowed):
+    valid = isinstance(value, (int, float)) and min_allowed <= value <= max_allowed
+    if not (math.isfinite(min_allowed) and math.isfinite(max_allowed)):
+        valid = valid and not math.isnan(value)
+    elif isinstance(value, float):
+        valid = valid and math.isfinite(value)
+    if valid:
+        raise_for_value('x', value, min_allowed, max_allowed)
+    else:
+        with pytest.raises((TypeError, ValueError)):
+            raise_for_value('x', value, min_allowed, max_allowed)
+    with trusted_validation():
+        raise_for_value('x', value, min_allowed, max_allowed)
+
+
+def test_trusted_validation():
+    assert not is_trusted_validation()
+    with trusted_validation():
+        assert is_trusted_validation()
+        raise_for_key(('account', 'EUR|USD'))
+        raise_for_str_id('')
+        with trusted_validation(False):
+            with pytest.raises(ValueError):
+                raise_for_key(('account', 'EUR|USD'))
+        assert is_trusted_validation()
+    assert not is_trusted_validation()
+    with pytest.raises(ValueError):
+        raise_for_key(('account', 'EUR|USD'))
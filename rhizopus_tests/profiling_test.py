@@ -0,0 +1,90 @@
+import datetime
+import logging
+import random
+
+import pytest
+
+from rhizopus.broker import Broker
+from rhizopus.broker_observer import BrokerObserver
+from rhizopus.broker_simulator import BrokerSimulator, SeriesStoreFromDict, TransactionCostFilter
+from rhizopus.orders import CreateAccountOrder
+from rhizopus.profiling import PhaseProfiler
+from rhizopus.strategy import Strategy
+
+START_TIME = datetime.datetime(2000, 1, 1)
+NUM_TICKS = 30
+
+
+class ConstantMixStrategy(Strategy):
+    def get_target_allocation(self):
+        return {'USD': 0.5, 'JPY': 0.3}
+
+
+def test_profiled_run(caplog):
+    random.seed(2)
+    series = {}
+    for key in [('EUR', 'USD'), ('EUR', 'JPY')]:
+        price = 1.0
+        series[key] = []
+        for t in range(NUM_TICKS):
+            price *= random.lognormvariate(0.0, 0.03)
+            series[key].append((START_TIME + datetime.timedelta(days=t), price))
+    store = SeriesStoreFromDict(series)
+    store.add_inverse_series()
+
+    profiler = PhaseProfiler()
+    durations = []
+    profiler.add_callback(lambda phase, elapsed_ns: durations.append((phase, elapsed_ns)))
+    filters = [TransactionCostFilter('EUR', 1.0, 'tc', [])]
+    market = BrokerSimulator(store, filters, 'EUR', silent=True, profiler=profiler)
+    orders = [CreateAccountOrder(num, (0.0, num)) for num in ['USD', 'JPY']]
+    orders.append(CreateAccountOrder('EUR', (1000.0, 'EUR')))
+    broker = Broker(market, orders, silent=True, profiler=profiler)
+    observer = BrokerObserver(broker, profiler=profiler)
+    strategy = ConstantMixStrategy(broker, observer, profiler=profiler)
+    with caplog.at_level(logging.INFO, logger='rhizopus.strategy'):
+        strategy.run(START_TIME + datetime.timedelta(days=1), 100)
+
+    summary = profiler.summary()
+    assert set(summary) == {
+        'broker.next',
+        'broker.check',
+        'broker.fill_orders',
+        'simulator.update_prices',
+        'simulator.process_orders',
+        'simulator.fill_orders',
+        'observer.update',
+        'strategy.get_orders',
+        'strategy.end_of_day',
+    }
+    assert summary['broker.next']['count'] == NUM_TICKS
+    assert summary['simulator.process_orders']['count'] == NUM_TICKS - 1
+    assert summary['observer.update']['count'] == NUM_TICKS - 1
+    assert summary['strategy.get_orders']['count'] == summary['strategy.end_of_day']['count'] > 0
+    for phase, stats in summary.items():
+        assert stats['total_s'] == pytest.approx(stats['count'] * stats['mean_us'] / 1e6)
+        assert 0.0 <= stats['p50_us'] <= stats['p90_us'] <= stats['p99_us'] <= stats['max_us']
+    assert len(durations) == sum(stats['count'] for stats in summary.values())
+    assert 'simulator.process_orders' in caplog.text
+
+    num_fills = profiler.counts['simulator.fill_orders']
+    broker.fill_order(CreateAccountOrder('CHF', (0.0, 'CHF')))
+    assert profiler.counts['broker.fill_order'] == 1
+    assert profiler.counts['simulator.fill_orders'] == num_fills + 1
+
+
+def test_profiler_samples():
+    profiler = PhaseProfiler(max_samples=10)
+    for i in range(1000):
+        profiler.record('x', i)
+    with profiler.phase('y'):
+        pass
+    assert profiler.counts == {'x': 1000, 'y': 1}
+    assert profiler.totals['x'] == sum(range(1000))
+    assert len(profiler.samples['x']) == 10
+    assert list(profiler.summary()) == ['x', 'y']
+    assert profiler.report().splitlines()[1].startswith('x')
+    profiler.reset()
+    assert profiler.summary() == {}
+    with pytest.raises(ValueError):
+        PhaseProfiler(max_samples=0)
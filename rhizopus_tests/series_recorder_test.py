@@ -1,6 +1,8 @@
 import datetime
 import math
 import random
+
+import numpy as np
 import pytest
 
 from rhizopus.series_recorder import SeriesRecorder
@@ -10,6 +12,13 @@ def d2s(series: dict):
     return [(t, series[t]) for t in sorted(set(series.keys()))]
 
 
+def t_x_lists(t_x):
+    """Convert the arrays returned by get_t_x() to a datetime list and a float list"""
+    t, x = t_x
+    assert t.dtype == np.dtype('datetime64[ns]') and x.dtype == np.float64
+    return t.astype('datetime64[us]').tolist(), x.tolist()
+
+
 def some_t_x(t0, n: int = 50):
     """Return datetime list t and float list x. The list t is increasing."""
     n = random.randint(n, 5 * n)
@@ -63,14 +72,72 @@ def test_simple1():
     assert rec.get_list_of_pairs('s3') == d2s(s3)
     assert min(dict(rec.get_list_of_pairs('s3', t0)).keys()) >= t0
 
-    assert rec.get_t_x('s0') == ([], [])
-    assert rec.get_t_x('s1') == ([x[0] for x in d2s(s1)], [x[1] for x in d2s(s1)])
-    assert rec.get_t_x('s2') == ([x[0] for x in d2s(s2)], [x[1] for x in d2s(s2)])
-    assert rec.get_t_x('s3') == ([x[0] for x in d2s(s3)], [x[1] for x in d2s(s3)])
-    assert min(rec.get_t_x('s1', t0)[0]) >= t0
+    assert t_x_lists(rec.get_t_x('s0')) == ([], [])
+    assert t_x_lists(rec.get_t_x('s1')) == ([x[0] for x in d2s(s1)], [x[1] for x in d2s(s1)])
+    assert t_x_lists(rec.get_t_x('s2')) == ([x[0] for x in d2s(s2)], [x[1] for x in d2s(s2)])
+    assert t_x_lists(rec.get_t_x('s3')) == ([x[0] for x in d2s(s3)], [x[1] for x in d2s(s3)])
+    assert min(t_x_lists(rec.get_t_x('s1', t0))[0]) >= t0
     assert rec == SeriesRecorder.from_json(rec.to_json())
 
 
+def test_save_order_independent():
+    t0 = datetime.datetime(2020, 1, 1)
+    t, x = some_t_x(t0)
+    pairs = list(zip(t, x))
+
+    rec_sorted = SeriesRecorder()
+    for ti, xi in pairs:
+        rec_sorted.save(ti, 's1', xi)
+        rec_sorted.save(ti, ('s2', 'nav'), 2.0 * xi)
+    rec_shuffled = SeriesRecorder()
+    random.shuffle(pairs)
+    for ti, xi in pairs:
+        rec_shuffled.save(ti, ('s2', 'nav'), 2.0 * xi)
+        rec_shuffled.save(ti, 's1', xi)
+
+    assert rec_sorted == rec_shuffled
+    assert rec_sorted.times() == t
+    assert t_x_lists(rec_shuffled.get_t_x('s1')) == (t, x)
+    assert rec_shuffled.get_len('s1') == len(t)
+    assert rec_shuffled.get_len('s0') == 0
+    assert rec_shuffled.get_first_observation('s1') == (t[0], x[0])
+    assert rec_shuffled.get_first_observation('s0') is None
+    assert rec_shuffled.get_recent_observations()['s1'] == x[-1]
+    assert t_x_lists(rec_shuffled.get_t_x('s1', t[0], t[2])) == (t[1:3], x[1:3])
+
+    rec_shuffled.save(t[-1], 's1', x[-1] + 1.0)
+    assert rec_shuffled.get_len('s1') == len(t)
+    assert rec_shuffled.get_recent_observations()['s1'] == x[-1] + 1.0
+    assert rec_sorted != rec_shuffled
+
+
+def test_to_arrays():
+    t0 = datetime.datetime(2020, 1, 1)
+    rec = SeriesRecorder()
+    for t, x in some_observation_pairs(t0):
+        rec.save(t, 's1', x)
+    for t, x in some_observation_pairs(t0):
+        rec.save(t, ('s2', 'nav'), x)
+
+    times, keys, values = rec.to_arrays()
+    assert keys == ['s1', ('s2', 'nav')]
+    assert values.shape == (len(rec.times()), 2)
+    assert times.dtype == np.dtype('datetime64[ns]')
+    assert [t.astype('datetime64[us]').item() for t in times] == rec.times()
+    for j, key in enumerate(keys):
+        t, x = t_x_lists(rec.get_t_x(key))
+        observed = ~np.isnan(values[:, j])
+        assert observed.sum() == len(t)
+        assert values[observed, j].tolist() == x
+
+    # recorder keeps growing after an export
+    rec.save(max(rec.times()) + datetime.timedelta(seconds=1), 's1', 1.0)
+    times, keys, values = rec.to_arrays(['s0', 's1'])
+    assert np.isnan(values[:, 0]).all()
+    assert values[-1, 1] == 1.0
+    assert SeriesRecorder().to_arrays()[2].shape == (0, 0)
+
+
 def test_tzinfo0():
     wrong_times = []
     t = datetime.datetime.utcnow()
@@ -0,0 +1,103 @@
+import datetime
+import io
+import json
+import math
+import random
+
+import pytest
+
+from rhizopus.broker import Broker, BrokerState, ValidationLevel
+from rhizopus.broker_observer import BrokerObserver
+from rhizopus.broker_simulator import BrokerSimulator, SeriesStoreFromDict, TransactionCostFilter
+from rhizopus.orders import BackwardTransferOrder, CreateAccountOrder, InterestOrder
+from rhizopus.snapshot import SnapshotReader, SnapshotWriter
+
+START_TIME = datetime.datetime(2000, 1, 1)
+
+
+@pytest.fixture()
+def broker_and_observer():
+    random.seed(3)
+    series = {}
+    for key in [('EUR', 'USD'), ('EUR', 'JPY')]:
+        price = 1.0
+        series[key] = []
+        for t in range(20):
+            price *= random.lognormvariate(0.0, 0.02)
+            series[key].append((START_TIME + datetime.timedelta(days=t), price))
+    store = SeriesStoreFromDict(series)
+    store.add_inverse_series()
+
+    market = BrokerSimulator(store, [TransactionCostFilter('EUR', 1.0, 'tc', [])], 'EUR')
+    orders = [CreateAccountOrder(num, (0.0, num)) for num in ['USD', 'JPY']]
+    orders.append(CreateAccountOrder('EUR', (1000.0, 'EUR')))
+    orders.append(InterestOrder('EUR', 0.02, accrual_end_time=START_TIME + datetime.timedelta(10)))
+    broker_state = BrokerState('EUR', executed_orders_window=100)
+    broker_state.set_validation(ValidationLevel.SAMPLED_ROUND_TRIP, interval=5, seed=1)
+    broker = Broker(market, orders, broker_state)
+    broker.next()
+    observer = BrokerObserver(broker)
+    for i in range(10):
+        observer.update()
+        broker.fill_order(BackwardTransferOrder('EUR', 'USD', (10.0 + i, 'USD')))
+        broker.fill_order(BackwardTransferOrder('EUR', 'JPY', (5.0, 'EUR')))
+        broker.next()
+    broker.fill_order(BackwardTransferOrder('EUR', 'GBP', (5.0, 'EUR')))
+    broker.next()
+    observer.update()
+    return broker, observer
+
+
+def test_snapshot_round_trip(broker_and_observer):
+    broker, observer = broker_and_observer
+    stream = io.BytesIO()
+    writer = SnapshotWriter(stream)
+    broker.state_to_snapshot(writer)
+    observer.to_snapshot(writer)
+
+    stream.seek(0)
+    reader = SnapshotReader(stream)
+    broker_state = BrokerState.from_snapshot(reader)
+    observer1 = BrokerObserver.from_snapshot(broker, reader)
+    assert stream.read() == b''
+
+    broker_state_json = broker.state_to_json()
+    broker_state_from_json = BrokerState.from_json(broker_state_json)
+    assert broker_state == broker_state_from_json
+    assert json.dumps(broker_state.to_json()) == json.dumps(broker_state_json)
+    assert len(broker_state.active_orders) == 1
+    assert len(broker_state.rejected_orders) == 1
+    assert len(broker_state.executed_orders) > 0
+    assert broker_state.executed_orders_window == 100
+    assert broker_state_from_json.executed_orders_window == 100
+    for restored in [broker_state, broker_state_from_json]:
+        assert restored.validation_level == ValidationLevel.SAMPLED_ROUND_TRIP
+        assert (restored.validation_interval, restored.validation_seed) == (5, 1)
+    for orders in ['active_orders', 'executed_orders', 'rejected_orders']:
+        assert list(getattr(broker_state, orders)) == list(getattr(broker_state_from_json, orders))
+
+    assert observer1.now == observer.now
+    assert observer1.recorder == observer.recorder
+    assert observer1.to_json() == observer.to_json()
+    assert observer1.stats.to_json() == observer.stats.to_json()
+
+    observer_json = json.dumps([broker_state_json, observer.to_json()]).encode()
+    assert len(stream.getvalue()) < len(observer_json) / 2
+
+
+def test_snapshot_values():
+    values = [None, True, False, -(2**40), math.inf, 'x', START_TIME, ['x', 1.5], {'x': {'y': []}}]
+    stream = io.BytesIO()
+    writer = SnapshotWriter(stream)
+    for value in values:
+        writer.write_value(value)
+    with pytest.raises(TypeError):
+        writer.write_value({1, 2})
+
+    stream.seek(0)
+    reader = SnapshotReader(stream)
+    assert [reader.read_value() for _ in values] == values
+    with pytest.raises(ValueError):
+        reader.read_value()
+    with pytest.raises(ValueError):
+        SnapshotReader(io.BytesIO(b'{"now": ""}'))
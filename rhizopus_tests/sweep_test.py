@@ -0,0 +1,91 @@
+import datetime
+import pickle
+import random
+from typing import Any, Dict, Mapping
+
+import pytest
+
+from rhizopus.broker import Broker
+from rhizopus.broker_observer import BrokerObserver
+from rhizopus.broker_simulator import (
+    BrokerSimulator,
+    SeriesStoreBase,
+    SeriesStoreFromDict,
+    SeriesStoreMemmap,
+    TransactionCostFilter,
+)
+from rhizopus.orders import CreateAccountOrder
+from rhizopus.strategy import Strategy
+from rhizopus.sweep import SweepResult, expand_param_grid, run_sweep
+
+START_TIME = datetime.datetime(2000, 1, 1)
+
+
+class ConstantMixStrategy(Strategy):
+    def __init__(self, broker, observer, target_alloc: Dict[str, float], max_rel_alloc_deviation):
+        super().__init__(broker, observer, max_rel_alloc_deviation)
+        self.target_alloc = target_alloc
+
+    def get_target_allocation(self) -> Dict[str, float]:
+        return self.target_alloc
+
+
+def constant_mix_factory(series_store: SeriesStoreBase, params: Mapping[str, Any]) -> Strategy:
+    market = BrokerSimulator(
+        series_store, [TransactionCostFilter('EUR', 1.0, 'tc', [])], 'EUR', silent=True
+    )
+    accounts = {num: (0.0, num) for num in series_store.vertices()}
+    accounts['EUR'] = (1000.0, 'EUR')
+    orders = [CreateAccountOrder(num, amount) for num, amount in accounts.items()]
+    broker = Broker(market, orders, silent=True)
+    target_alloc = {'USD': params['usd'], 'JPY': 1.0 - params['usd']}
+    return ConstantMixStrategy(
+        broker, BrokerObserver(broker), target_alloc, params['max_rel_alloc_deviation']
+    )
+
+
+@pytest.fixture()
+def series_store() -> SeriesStoreFromDict:
+    random.seed(7)
+    series = {}
+    for key in [('EUR', 'USD'), ('EUR', 'JPY')]:
+        price = 1.0
+        series[key] = []
+        for t in range(30):
+            price *= random.lognormvariate(0.0, 0.02)
+            series[key].append((START_TIME + datetime.timedelta(days=t), price))
+    store = SeriesStoreFromDict(series)
+    store.add_inverse_series()
+    return store
+
+
+def test_expand_param_grid():
+    assert expand_param_grid({'a': [1, 2], 'b': ['x']}) == [{'a': 1, 'b': 'x'}, {'a': 2, 'b': 'x'}]
+    assert expand_param_grid({}) == [{}]
+
+
+def test_run_sweep(series_store):
+    param_grid = {'usd': [0.2, 0.5, 0.8], 'max_rel_alloc_deviation': [0.01, 0.2]}
+    start_time = START_TIME + datetime.timedelta(days=1)
+    results = run_sweep(
+        series_store, constant_mix_factory, param_grid, start_time, 100, max_workers=2
+    )
+    results_inline = run_sweep(
+        series_store, constant_mix_factory, param_grid, start_time, 100, max_workers=1
+    )
+
+    assert results == results_inline
+    assert [r.params for r in results] == expand_param_grid(param_grid)
+    for result in results:
+        assert isinstance(result, SweepResult)
+        assert result.summary['num_ticks'] == 29
+        assert result.summary['initial_nav'] == 1000.0
+        assert 0.0 <= result.summary['max_drawdown'] < 1.0
+    assert len(set(r.summary['final_nav'] for r in results)) == len(results)
+
+
+def test_memmap_store_pickle(series_store, tmp_path):
+    store = SeriesStoreMemmap.create(str(tmp_path), series_store)
+    assert store[('EUR', 'USD')] == series_store[('EUR', 'USD')]
+    store_copy = pickle.loads(pickle.dumps(store))
+    assert store_copy[('EUR', 'USD')] == series_store[('EUR', 'USD')]
@@ -0,0 +1,119 @@
+import datetime
+import math
+import random
+from typing import Dict, Optional
+
+import numpy as np
+import pytest
+
+from rhizopus.broker import Broker
+from rhizopus.broker_observer import BrokerObserver
+from rhizopus.broker_simulator import BrokerSimulator, SeriesStoreColumnar, TransactionCostFilter
+from rhizopus.orders import CreateAccountOrder, InterestOrder
+from rhizopus.strategy import Strategy
+from rhizopus.vectorized import run_target_weights
+
+START_TIME = datetime.datetime(2000, 1, 1)
+ASSETS = ['USD', 'JPY', 'HUF']
+
+
+class ScheduleStrategy(Strategy):
+    def __init__(self, broker, observer, schedule: np.ndarray, max_rel_alloc_deviation: float):
+        super().__init__(broker, observer, max_rel_alloc_deviation)
+        self.schedule = schedule
+
+    def get_target_allocation(self) -> Optional[Dict[str, float]]:
+        target = self.schedule[self.broker.time_index]
+        if np.isnan(target).any():
+            return None
+        return dict(zip(ASSETS, target.tolist()))
+
+
+def get_series_store(num_days: int, spread: float) -> SeriesStoreColumnar:
+    random.seed(11)
+    series = {}
+    for asset, price in zip(ASSETS, [1.2, 130.0, 350.0]):
+        series[('EUR', asset)] = []
+        series[(asset, 'EUR')] = []
+        for t in range(num_days):
+            price *= random.lognormvariate(0.0, 0.01)
+            series[('EUR', asset)].append((START_TIME + datetime.timedelta(days=t), price * spread))
+            series[(asset, 'EUR')].append((START_TIME + datetime.timedelta(days=t), spread / price))
+    return SeriesStoreColumnar.from_dict(series)
+
+
+def get_interest_orders():
+    return [
+        InterestOrder('EUR', 0.05, value_lower_bound=0.0),
+        InterestOrder(
+            'EUR',
+            0.1,
+            value_upper_bound=0.0,
+            accrual_start_time=START_TIME + datetime.timedelta(days=10),
+            accrual_end_time=START_TIME + datetime.timedelta(days=30),
+        ),
+    ]
+
+
+@pytest.mark.parametrize('spread', [1.0, 0.995])
+@pytest.mark.parametrize('max_rel_alloc_deviation', [0.001, 0.05])
+def test_vectorized_engine_matches_observer(spread: float, max_rel_alloc_deviation: float):
+    num_days = 40
+    store = get_series_store(num_days, spread)
+    schedule = np.tile([0.5, 0.3, 0.1], (num_days, 1))
+    schedule[15:25] = [0.2, 0.2, 0.7]  # leveraged: negative cash
+    schedule[30:33] = np.nan
+    trading_start_time = START_TIME + datetime.timedelta(days=3)
+    cost_filter = TransactionCostFilter('EUR', 5.0, 'tc', [])
+
+    market = BrokerSimulator(store, [cost_filter], 'EUR', silent=True)
+    accounts = {num: (0.0, num) for num in ASSETS}
+    accounts['EUR'] = (1.0e5, 'EUR')
+    orders = [CreateAccountOrder(num, amount) for num, amount in accounts.items()]
+    broker = Broker(market, orders + get_interest_orders(), silent=True)
+    observer = BrokerObserver(broker)
+    ScheduleStrategy(broker, observer, schedule, max_rel_alloc_deviation).run(
+        trading_start_time, 1000
+    )
+
+    result = run_target_weights(
+        store,
+        'EUR',
+        ASSETS,
+        schedule,
+        1.0e5,
+        trading_start_time,
+        max_rel_alloc_deviation,
+        cost_filter,
+        get_interest_orders(),
+    )
+
+    assert len(result.nav) == num_days - 1
+    assert observer.times() == [START_TIME + datetime.timedelta(days=t) for t in range(1, num_days)]
+    assert result.nav.tolist() == pytest.approx(observer.get_t_x(('portfolio', 'nav'))[1])
+    for j, acc in enumerate(result.accounts):
+        assert result.weights[:, j].tolist() == pytest.approx(
+            observer.get_t_x(('account', acc, 'weight'))[1]
+        )
+        assert result.account_navs[:, j].tolist() == pytest.approx(
+            observer.get_t_x(('account', acc, 'nav'))[1]
+        )
+    assert result.reallocation_mass[~np.isnan(result.reallocation_mass)].tolist() == pytest.approx(
+        observer.get_t_x(('portfolio', 'reallocation_mass'))[1]
+    )
+    assert set(result.variables) == {'tc', 'interest_EUR'}
+    for key, values in result.variables.items():
+        assert values[~np.isnan(values)].tolist() == pytest.approx(
+            observer.get_t_x(('var', key))[1]
+        )
+    assert result.variables['tc'][-1] > 0.0
+    assert np.nanmin(result.account_navs[:, 0]) < 0.0
+
+
+def test_vectorized_engine_missing_prices():
+    store = get_series_store(5, 1.0)
+    with pytest.raises(ValueError):
+        run_target_weights(store, 'EUR', ['USD', 'CHF'], [0.5, 0.5], 100.0)
+    store.prices[2, 0] = math.nan
+    with pytest.raises(ValueError):
+        run_target_weights(store, 'EUR', ASSETS, [0.5, 0.3, 0.1], 100.0)
@@ -16,7 +16,7 @@ setup(
         'rhizopus',
     ],
     url='https://github.com/jwergieluk/rhizopus',
-    install_requires=[],
+    install_requires=['numpy'],
     description='Trading simulation framework',
     classifiers=[
         "Programming Language :: Python :: 3",